@@ -90,6 +90,7 @@ except ImportError:
     GPG_PRESENT = False
 
 from src.lib.selection import Selection
+from src.lib.spatial_index import get_bounds
 from src.lib.fileio import AOpen, Bz2AOpen
 
 from src.actions._main_window_actions import Actions
@@ -210,7 +211,7 @@ class FileActions(Actions):
         self.code_array.safe_mode = False
 
         # Clear result cache
-        self.code_array.result_cache.clear()
+        self.code_array.clear_results()
 
         # Execute macros
         self.main_window.actions.execute_macros()
@@ -252,7 +253,7 @@ class FileActions(Actions):
         self.code_array.reload_modules()
 
         # Clear result cache
-        self.code_array.result_cache.clear()
+        self.code_array.clear_results()
 
     def _get_file_version(self, infile):
         """Returns infile version string."""
@@ -306,7 +307,8 @@ class FileActions(Actions):
         self.code_array.macros = ""
 
         # Clear caches
-        self.code_array.result_cache.clear()
+        self.code_array.clear_results()
+        self.code_array.dependencies.clear()
 
         # Clear globals
         self.code_array.clear_globals()
@@ -540,7 +542,7 @@ class FileActions(Actions):
         try:
             with Bz2AOpen(filepath, "wb",
                           main_window=self.main_window) as outfile:
-                interface = Pys(self.grid.code_array, outfile)
+                interface = Pys(self.grid.code_array.get_snapshot(), outfile)
                 interface.from_code_array()
 
         except (IOError, ValueError), err:
@@ -568,7 +570,7 @@ class FileActions(Actions):
         try:
             with AOpen(filepath, "wb",
                        main_window=self.main_window) as outfile:
-                interface = Pys(self.grid.code_array, outfile)
+                interface = Pys(self.grid.code_array.get_snapshot(), outfile)
                 interface.from_code_array()
 
         except (IOError, ValueError), err:
@@ -1019,7 +1021,7 @@ class TableActions(TableRowActionsMixin, TableColumnActionsMixin,
         self.grid.GetTable().ResetView()
 
         # Clear caches
-        self.code_array.result_cache.clear()
+        self.code_array.clear_results()
 
     def replace_cells(self, key, sorted_row_idxs):
         """Replaces cells in current selection so that they are sorted"""
@@ -1031,10 +1033,19 @@ class TableActions(TableRowActionsMixin, TableColumnActionsMixin,
 
         selection = self.grid.actions.get_selection()
 
+        if not selection:
+            # Whole rows are reordered by the row map without moving cells
+            if sorted_row_idxs != range(len(sorted_row_idxs)):
+                post_command_event(self.main_window, self.ContentChangedMsg)
+                self.grid.code_array.permute(sorted_row_idxs, 0, tab)
+            return
+
+        new_rows = dict((old_row, new_row) for new_row, old_row
+                        in enumerate(sorted_row_idxs))
+
         for __row, __col, __tab in self.grid.code_array:
-            if __tab == tab and \
-               (not selection or (__row, __col) in selection):
-                new_row = sorted_row_idxs.index(__row)
+            if __tab == tab and (__row, __col) in selection:
+                new_row = new_rows[__row]
                 if __row != new_row:
                     new_keys[(new_row, __col, __tab)] = \
                         self.grid.code_array((__row, __col, __tab))
@@ -1216,17 +1227,8 @@ class GridActions(Actions):
         default_row_height = self.grid.code_array.cell_attributes.\
             default_cell_attributes["row-height"]
 
-        non_standard_row_heights = []
-        __row_heights = self.grid.code_array.row_heights
-        for __row, __tab in __row_heights:
-            if __tab == tab:
-                non_standard_row_heights.append(__row_heights[(__row, __tab)])
-
-        rows_height = sum(non_standard_row_heights)
-        rows_height += \
-            (no_rows - len(non_standard_row_heights)) * default_row_height
-
-        return rows_height
+        return self.grid.code_array.row_heights.get_sum(
+            0, no_rows, tab, default=default_row_height)
 
     def _get_cols_width(self):
         """Returns the total width of all grid cols"""
@@ -1236,17 +1238,8 @@ class GridActions(Actions):
         default_col_width = self.grid.code_array.cell_attributes.\
             default_cell_attributes["column-width"]
 
-        non_standard_col_widths = []
-        __col_widths = self.grid.code_array.col_widths
-        for __col, __tab in __col_widths:
-            if __tab == tab:
-                non_standard_col_widths.append(__col_widths[(__col, __tab)])
-
-        cols_width = sum(non_standard_col_widths)
-        cols_width += \
-            (no_cols - len(non_standard_col_widths)) * default_col_width
-
-        return cols_width
+        return self.grid.code_array.col_widths.get_sum(
+            0, no_cols, tab, default=default_col_width)
 
     def zoom_fit(self):
         """Zooms the rid to fit the window.
@@ -1523,6 +1516,23 @@ class SelectionActions(Actions):
                 for col in xrange(col_slc.start, col_slc.stop, col_slc.step):
                     self.select_cell(row, col, add_to_selected=True)
 
+    def _get_selected_keys(self, selection, tab):
+        """Returns list of keys of non-empty cells in selection in table tab
+
+        Only the chunks of dict_grid that overlap the selection are searched.
+
+        """
+
+        bounds = get_bounds(selection)
+        if bounds is None:
+            return []
+
+        top, left, bottom, right = bounds
+        keys = self.grid.code_array.dict_grid.get_keys(tab, top, left,
+                                                       bottom, right)
+
+        return [key for key in keys if key[:2] in selection]
+
     def delete_selection(self, selection=None):
         """Deletes selection, marks content as changed
 
@@ -1544,11 +1554,10 @@ class SelectionActions(Actions):
 
         current_table = self.grid.current_table
 
-        for row, col, tab in self.grid.code_array.dict_grid.keys():
-            if tab == current_table and (row, col) in selection:
-                self.grid.actions.delete_cell((row, col, tab))
+        for key in self._get_selected_keys(selection, current_table):
+            self.grid.actions.delete_cell(key)
 
-        self.grid.code_array.result_cache.clear()
+        self.grid.code_array.clear_results()
 
     def delete(self):
         """Deletes a selection if any else deletes the cursor cell
@@ -1574,11 +1583,10 @@ class SelectionActions(Actions):
 
         selection = self.get_selection()
         current_table = self.grid.current_table
-        for row, col, tab in self.grid.code_array.dict_grid.keys():
-            if tab == current_table and (row, col) in selection:
-                self.grid.actions.quote_code((row, col, tab))
+        for key in self._get_selected_keys(selection, current_table):
+            self.grid.actions.quote_code(key)
 
-        self.grid.code_array.result_cache.clear()
+        self.grid.code_array.clear_results()
 
     def copy_selection_access_string(self):
         """Copys access_string to selection to the clipboard
@@ -86,7 +86,7 @@ class CellActions(Actions):
         except KeyError:
             pass
 
-        self.grid.code_array.result_cache.clear()
+        self.grid.code_array.clear_results()
 
     def _get_absolute_reference(self, ref_key):
         """Returns absolute reference code for key."""
@@ -204,7 +204,11 @@ class CellActions(Actions):
         post_command_event(self.main_window, self.ContentChangedMsg)
 
         if selection is not None:
-            self.code_array.cell_attributes.append((selection, table, attr))
+            cell_attributes = self.code_array.cell_attributes
+            cell_attributes.append((selection, table, attr))
+
+            if cell_attributes.is_compaction_due():
+                cell_attributes.compact()
 
     def set_attr(self, attr, value, selection=None):
         """Sets attr of current selection to value"""
@@ -323,14 +327,16 @@ class CellActions(Actions):
             # We have an frozen cell that has to be unfrozen
 
             # Delete frozen cache content
-            self.grid.code_array.frozen_cache.pop(repr(cursor))
+            with self.grid.code_array.cache_lock:
+                self.grid.code_array.frozen_cache.pop(cursor, None)
 
         else:
             # We have an non-frozen cell that has to be frozen
 
             # Add frozen cache content
             res_obj = self.grid.code_array[cursor]
-            self.grid.code_array.frozen_cache[repr(cursor)] = res_obj
+            with self.grid.code_array.cache_lock:
+                self.grid.code_array.frozen_cache[cursor] = res_obj
 
         # Set the new frozen state / code
         selection = Selection([], [], [], [], [cursor[:2]])
@@ -362,7 +368,7 @@ class CellActions(Actions):
         for row in xrange(top, bottom + 1):
             for col in xrange(left, right + 1):
                 key = row, col, tab
-                if self.code_array.cell_attributes[key]["merge_area"]:
+                if self.code_array.cell_attributes.get_merge_area(key):
                     post_command_event(self.main_window, self.StatusBarMsg,
                                        text=error_msg.format(str(key)))
                     return
@@ -402,7 +408,7 @@ class CellActions(Actions):
 
         # Check if top-left cell is already merged
         cell_attributes = self.grid.code_array.cell_attributes
-        tl_merge_area = cell_attributes[(bb_top, bb_left, tab)]["merge_area"]
+        tl_merge_area = cell_attributes.get_merge_area((bb_top, bb_left, tab))
 
         if tl_merge_area is not None and tl_merge_area[:2] == merge_area[:2]:
             self.unmerge(tl_merge_area, tab)
@@ -481,7 +487,8 @@ class CellActions(Actions):
 
         code = self.grid.code_array(key)
         result = self.grid.code_array._eval_cell(key, code)
-        self.grid.code_array.frozen_cache[repr(key)] = result
+        with self.grid.code_array.cache_lock:
+            self.grid.code_array.frozen_cache[key] = result
 
     def refresh_selected_frozen_cells(self, selection=None):
         """Refreshes content of frozen cells that are currently selected
@@ -507,17 +514,57 @@ class CellActions(Actions):
 
         refreshed_keys = []
 
-        for attr_selection, tab, attr_dict in cell_attributes:
-            if tab == self.grid.actions.cursor[2] and \
-               "frozen" in attr_dict and attr_dict["frozen"]:
-                # Only single cells are allowed for freezing
-                skey = attr_selection.cells[0]
-                if skey in selection:
-                    key = tuple(list(skey) + [tab])
-                    if key not in refreshed_keys and \
-                       cell_attributes[key]["frozen"]:
-                        self.refresh_frozen_cell(key)
-                        refreshed_keys.append(key)
-
-        cell_attributes._attr_cache.clear()
-        cell_attributes._table_cache.clear()
+        with self.grid.code_array.watchdog.batch():
+            for attr_selection, tab, attr_dict in cell_attributes:
+                if tab == self.grid.actions.cursor[2] and \
+                   "frozen" in attr_dict and attr_dict["frozen"]:
+                    # Only single cells are allowed for freezing
+                    skey = attr_selection.cells[0]
+                    if skey in selection:
+                        key = tuple(list(skey) + [tab])
+                        if key not in refreshed_keys and \
+                           cell_attributes[key]["frozen"]:
+                            self.refresh_frozen_cell(key)
+                            refreshed_keys.append(key)
+
+        cell_attributes.invalidate(selection, self.grid.actions.cursor[2])
+
+    def recalculate_all(self):
+        """Recalculates all non-frozen cells in worker processes"""
+
+        statustext = _("Recalculating all cells...")
+        post_command_event(self.main_window, self.StatusBarMsg,
+                           text=statustext)
+
+        wx.BeginBusyCursor()
+
+        try:
+            self.grid.code_array.recalculate_all()
+
+        finally:
+            wx.EndBusyCursor()
+
+        statustext = _("All cells recalculated.")
+        post_command_event(self.main_window, self.StatusBarMsg,
+                           text=statustext)
+
+    def compact_format(self):
+        """Removes overridden and redundant cell attribute entries
+
+        The format of all cells remains unchanged.
+
+        """
+
+        cell_attributes = self.grid.code_array.cell_attributes
+        old_len = len(cell_attributes)
+
+        cell_attributes.compact()
+
+        if len(cell_attributes) < old_len:
+            # Mark content as changed
+            post_command_event(self.main_window, self.ContentChangedMsg)
+
+        statustext = _("Format entries compacted from {old} to {new}.")
+        statustext = statustext.format(old=old_len, new=len(cell_attributes))
+        post_command_event(self.main_window, self.StatusBarMsg,
+                           text=statustext)
@@ -409,7 +409,7 @@ class ClipboardActions(Actions):
         """
 
         data = self.grid.code_array(key)
-        self.grid.code_array.result_cache.clear()
+        self.grid.code_array.clear_results()
 
         return data
 
@@ -97,6 +97,38 @@ class DefaultConfig(object):
         # Maximum result length in a cell in characters
         self.max_result_length = "100000"
 
+        # Maximum number of compiled cell codes in the code cache
+        self.code_cache_size = "10000"
+
+        # Memory budget of result cache in MB
+        self.result_cache_size = "256"
+
+        # Number of results that exceed the result cache budget and are
+        # kept anyway, so that they are displayed without re-evaluation
+        self.pinned_results = "1000"
+
+        # Rows and columns around the visible area that are evaluated in
+        # idle time if background evaluation is enabled
+        self.prefetch_rows = "50"
+        self.prefetch_cols = "10"
+
+        # Number of worker processes for recalculating all cells
+        # 0 uses the number of CPUs
+        self.recalculation_processes = "0"
+
+        # Cell attribute entries, above which formatting compacts the
+        # attribute list, see CellAttributes.is_compaction_due
+        self.attribute_compaction_threshold = "1000"
+
+        # Store cell keys as integers and cell code in a string arena,
+        # which saves memory for large grids, see model.CompactDictGrid
+        self.compact_storage = "False"
+
+        # Keep cell code in a temporary SQLite database instead of memory.
+        # Pages of 64 rows of a table are cached, see model.DiskDictGrid
+        self.disk_storage = "False"
+        self.disk_cache_pages = "256"
+
         # Colors
         self.grid_color = repr(wx.SYS_COLOUR_GRAYTEXT)
         self.selection_color = repr(wx.SYS_COLOUR_HIGHLIGHT)
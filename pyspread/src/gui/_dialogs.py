@@ -39,6 +39,7 @@ Provides:
   - GPGParamsDialog
   - PasteAsDialog
   - DependencyDialog
+  - HotCellsDialog
 
 """
 
@@ -52,6 +53,7 @@ import wx
 import wx.grid
 from wx.lib.wordwrap import wordwrap
 import wx.lib.masked
+import wx.lib.mixins.listctrl as listmix
 import wx.stc as stc
 
 import src.lib.i18n as i18n
@@ -1258,6 +1260,34 @@ class PreferencesDialog(wx.Dialog):
             "widget_kwargs": {"min": 0, "allow_long": True},
             "prepocessor": int,
         }),
+        ("result_cache_size", {
+            "label": _(u"Result cache size"),
+            "tooltip": _(u"Memory budget in MB for cached cell results"),
+            "widget": wx.lib.intctrl.IntCtrl,
+            "widget_args": [],
+            "widget_kwargs": {"min": 0, "allow_long": True},
+            "prepocessor": int,
+        }),
+        ("prefetch_rows", {
+            "label": _(u"Prefetch rows"),
+            "tooltip": _(u"Rows above and below the visible area that are "
+                         u"evaluated in idle time in background evaluation "
+                         u"mode"),
+            "widget": wx.lib.intctrl.IntCtrl,
+            "widget_args": [],
+            "widget_kwargs": {"min": 0, "allow_long": True},
+            "prepocessor": int,
+        }),
+        ("prefetch_cols", {
+            "label": _(u"Prefetch columns"),
+            "tooltip": _(u"Columns left and right of the visible area that "
+                         u"are evaluated in idle time in background "
+                         u"evaluation mode"),
+            "widget": wx.lib.intctrl.IntCtrl,
+            "widget_args": [],
+            "widget_kwargs": {"min": 0, "allow_long": True},
+            "prepocessor": int,
+        }),
         ("timer_interval", {
             "label": _(u"Timer interval"),
             "tooltip": _(u"Interval for periodic updating of timed cells."),
@@ -1367,6 +1397,8 @@ class PreferencesDialog(wx.Dialog):
                                 wx.EXPAND | wx.ALL | wx.ALIGN_CENTER_VERTICAL,
                                 2)
 
+        self._add_cache_stats()
+
         self.ok_button = wx.Button(self, wx.ID_OK)
         self.cancel_button = wx.Button(self, wx.ID_CANCEL)
         self.grid_sizer.Add(self.ok_button, 0,
@@ -1386,6 +1418,35 @@ class PreferencesDialog(wx.Dialog):
 
         self.SetSize((300, -1))
 
+    def _add_cache_stats(self):
+        """Adds read-only cache statistics of the current grid"""
+
+        try:
+            cache_stats = self.GetParent().grid.code_array.get_cache_stats()
+
+        except AttributeError:
+            # No grid present
+            return
+
+        labels = [
+            ("result_cache", _(u"Result cache")),
+        ]
+
+        for cache_name, label in labels:
+            stats = cache_stats[cache_name]
+            lookups = stats["hits"] + stats["misses"]
+            hit_rate = 100.0 * stats["hits"] / lookups if lookups else 0.0
+
+            text = _(u"{entries} entries, {mbytes:.1f} MB, "
+                     u"{hit_rate:.0f} % hits, {evictions} evictions").format(
+                entries=stats["entries"], mbytes=stats["bytes"] / 2.0 ** 20,
+                hit_rate=hit_rate, evictions=stats["evictions"])
+
+            self.grid_sizer.Add(wx.StaticText(self, -1, label), 0,
+                                wx.ALL | wx.ALIGN_CENTER_VERTICAL, 2)
+            self.grid_sizer.Add(wx.StaticText(self, -1, text), 0,
+                                wx.ALL | wx.ALIGN_CENTER_VERTICAL, 2)
+
 # end of class PreferencesDialog
 
 
@@ -1536,4 +1597,131 @@ class DependencyDialog(wx.Dialog):
             item_list = [
                 d["name"], d["min_version"], d["version"], d["description"]
             ]
-            self.list_ctrl.Append(item_list)
\ No newline at end of file
+            self.list_ctrl.Append(item_list)
+
+
+class HotCellsDialog(wx.Dialog, listmix.ColumnSorterMixin, GridEventMixin):
+    """Displays cells with the largest evaluation times
+
+    Columns are sorted by clicking on the column header.
+    Activating a row moves the grid cursor to the cell.
+
+    Parameters
+    ----------
+    parent: wx.Window
+    \tThe main window
+    profiler: EvalProfiler
+    \tProfiler that has recorded the evaluations
+
+    """
+
+    columns = [
+        (_(u"Cell"), 100),
+        (_(u"Calls"), 70),
+        (_(u"Hits"), 70),
+        (_(u"Misses"), 70),
+        (_(u"Total time [s]"), 110),
+        (_(u"Self time [s]"), 110),
+    ]
+
+    def __init__(self, parent, profiler, *args, **kwargs):
+        kwargs["title"] = _(u"Hot cells")
+        kwargs["style"] = wx.DEFAULT_DIALOG_STYLE | wx.RESIZE_BORDER
+        wx.Dialog.__init__(self, parent, *args, **kwargs)
+
+        self.parent = parent
+        self.profiler = profiler
+
+        self.list_ctrl = wx.ListCtrl(self, style=wx.LC_REPORT |
+                                     wx.LC_SINGLE_SEL | wx.BORDER_SUNKEN)
+
+        for col, (label, width) in enumerate(self.columns):
+            self.list_ctrl.InsertColumn(col, label, width=width)
+
+        # Maps item data to row values for ColumnSorterMixin
+        self.itemDataMap = {}
+
+        self._populate()
+
+        listmix.ColumnSorterMixin.__init__(self, len(self.columns))
+        self.SortListItems(4, False)
+
+        export_button = wx.Button(self, wx.ID_SAVE, _(u"Export CSV..."))
+        reset_button = wx.Button(self, wx.ID_CLEAR, _(u"Reset"))
+        close_button = wx.Button(self, wx.ID_CLOSE)
+
+        button_sizer = wx.BoxSizer(wx.HORIZONTAL)
+        button_sizer.Add(export_button, 0, wx.ALL, 5)
+        button_sizer.Add(reset_button, 0, wx.ALL, 5)
+        button_sizer.AddStretchSpacer()
+        button_sizer.Add(close_button, 0, wx.ALL, 5)
+
+        sizer = wx.BoxSizer(wx.VERTICAL)
+        sizer.Add(self.list_ctrl, 1, wx.ALL | wx.EXPAND, 5)
+        sizer.Add(button_sizer, 0, wx.EXPAND)
+        self.SetSizer(sizer)
+
+        self.SetSize((560, 400))
+        self.Layout()
+
+        self.Bind(wx.EVT_BUTTON, self.OnExport, export_button)
+        self.Bind(wx.EVT_BUTTON, self.OnReset, reset_button)
+        self.Bind(wx.EVT_BUTTON, self.OnClose, close_button)
+        self.list_ctrl.Bind(wx.EVT_LIST_ITEM_ACTIVATED, self.OnItemActivated)
+
+    def GetListCtrl(self):
+        """Returns list control for ColumnSorterMixin"""
+
+        return self.list_ctrl
+
+    def _populate(self):
+        """Fills list control from the profiler report"""
+
+        self.list_ctrl.DeleteAllItems()
+        self.itemDataMap.clear()
+
+        for index, row in enumerate(self.profiler.get_report()):
+            key, calls, hits, misses, total_time, self_time = row
+
+            item_list = [u", ".join(map(unicode, key)), unicode(calls),
+                         unicode(hits), unicode(misses),
+                         u"{:.4f}".format(total_time),
+                         u"{:.4f}".format(self_time)]
+
+            self.list_ctrl.Append(item_list)
+            self.list_ctrl.SetItemData(index, index)
+            self.itemDataMap[index] = row
+
+    def OnExport(self, event):
+        """Writes report to a CSV file"""
+
+        dlg = wx.FileDialog(self, message=_(u"Export hot cells"),
+                            wildcard=_(u"CSV file") + u" (*.csv)|*.csv",
+                            style=wx.SAVE | wx.OVERWRITE_PROMPT,
+                            defaultDir=os.getcwd(), defaultFile="")
+
+        if dlg.ShowModal() == wx.ID_OK:
+            with open(dlg.GetPath(), "wb") as csvfile:
+                self.profiler.write_csv(csvfile)
+
+        dlg.Destroy()
+
+    def OnReset(self, event):
+        """Removes all records"""
+
+        self.profiler.clear()
+        self._populate()
+
+    def OnClose(self, event):
+        """Closes dialog"""
+
+        self.EndModal(wx.ID_CLOSE)
+
+    def OnItemActivated(self, event):
+        """Moves grid cursor to the activated cell"""
+
+        key = self.itemDataMap[event.GetData()][0]
+
+        post_command_event(self.parent, self.GotoCellMsg, key=key)
+
+# end of class HotCellsDialog
@@ -77,6 +77,7 @@ class MainWindowEventMixin(object):
 
     CopyFormatMsg, EVT_CMD_COPY_FORMAT = new_command_event()
     PasteFormatMsg, EVT_CMD_PASTE_FORMAT = new_command_event()
+    CompactFormatMsg, EVT_CMD_COMPACT_FORMAT = new_command_event()
 
     FontDialogMsg, EVT_CMD_FONTDIALOG = new_command_event()
     TextColorDialogMsg, EVT_CMD_TEXTCOLORDIALOG = new_command_event()
@@ -199,7 +200,12 @@ class GridEventMixin(object):
 
     ViewFrozenMsg, EVT_CMD_VIEW_FROZEN = new_command_event()
     RefreshSelectionMsg, EVT_CMD_REFRESH_SELECTION = new_command_event()
+    RecalculateAllMsg, EVT_CMD_RECALCULATE_ALL = new_command_event()
+    ProfileToggleMsg, EVT_CMD_PROFILE_TOGGLE = new_command_event()
+    HotCellsMsg, EVT_CMD_HOT_CELLS = new_command_event()
     TimerToggleMsg, EVT_CMD_TIMER_TOGGLE = new_command_event()
+    BackgroundEvaluationToggleMsg, EVT_CMD_BACKGROUND_EVALUATION_TOGGLE = \
+        new_command_event()
     DisplayGotoCellDialogMsg, EVT_CMD_DISPLAY_GOTO_CELL_DIALOG = \
         new_command_event()
     GotoCellMsg, EVT_CMD_GOTO_CELL = new_command_event()
@@ -43,15 +43,18 @@ from _events import post_command_event, EventMixin, GridActionEventMixin
 
 from _grid_table import GridTable
 from _grid_renderer import GridRenderer, RowLabelRenderer, ColLabelRenderer
+from _grid_evaluator import GridEvaluator
 from _gui_interfaces import GuiInterfaces
 from _menubars import ContextMenu
 from _chart_dialog import ChartDialog
+from _dialogs import HotCellsDialog
 
 import src.lib.i18n as i18n
 from src.sysvars import is_gtk, get_color
 from src.config import config
 
 from src.lib.selection import Selection
+from src.lib.profiler import EvalProfiler
 import src.lib.undo as undo
 from src.model.model import CodeArray
 
@@ -108,6 +111,9 @@ class Grid(wx.grid.Grid, glr.GridWithLabelRenderersMixin, EventMixin):
         self.SetDefaultRowLabelRenderer(RowLabelRenderer())
         self.SetDefaultColLabelRenderer(ColLabelRenderer())
 
+        # Evaluates cells in a background thread if enabled
+        self.evaluator = GridEvaluator(self)
+
         # Context menu for quick access of important functions
         self.contextmenu = ContextMenu(parent=self)
 
@@ -181,6 +187,7 @@ class Grid(wx.grid.Grid, glr.GridWithLabelRenderersMixin, EventMixin):
 
         self.Bind(wx.EVT_MOUSEWHEEL, handlers.OnMouseWheel)
         self.Bind(wx.EVT_KEY_DOWN, handlers.OnKey)
+        self.Bind(wx.EVT_IDLE, handlers.OnIdle)
 
         # Grid events
 
@@ -205,6 +212,8 @@ class Grid(wx.grid.Grid, glr.GridWithLabelRenderersMixin, EventMixin):
 
         main_window.Bind(self.EVT_CMD_COPY_FORMAT, c_handlers.OnCopyFormat)
         main_window.Bind(self.EVT_CMD_PASTE_FORMAT, c_handlers.OnPasteFormat)
+        main_window.Bind(self.EVT_CMD_COMPACT_FORMAT,
+                         c_handlers.OnCompactFormat)
 
         main_window.Bind(self.EVT_CMD_FONT, c_handlers.OnCellFont)
         main_window.Bind(self.EVT_CMD_FONTSIZE, c_handlers.OnCellFontSize)
@@ -257,8 +266,14 @@ class Grid(wx.grid.Grid, glr.GridWithLabelRenderersMixin, EventMixin):
         main_window.Bind(self.EVT_CMD_VIEW_FROZEN, handlers.OnViewFrozen)
         main_window.Bind(self.EVT_CMD_REFRESH_SELECTION,
                          handlers.OnRefreshSelectedCells)
+        main_window.Bind(self.EVT_CMD_RECALCULATE_ALL,
+                         handlers.OnRecalculateAll)
+        main_window.Bind(self.EVT_CMD_PROFILE_TOGGLE, handlers.OnProfileToggle)
+        main_window.Bind(self.EVT_CMD_HOT_CELLS, handlers.OnHotCells)
         main_window.Bind(self.EVT_CMD_TIMER_TOGGLE,
                          handlers.OnTimerToggle)
+        main_window.Bind(self.EVT_CMD_BACKGROUND_EVALUATION_TOGGLE,
+                         handlers.OnBackgroundEvaluationToggle)
         self.Bind(wx.EVT_TIMER, handlers.OnTimer)
         main_window.Bind(self.EVT_CMD_DISPLAY_GOTO_CELL_DIALOG,
                          handlers.OnDisplayGoToCellDialog)
@@ -424,6 +439,9 @@ class Grid(wx.grid.Grid, glr.GridWithLabelRenderersMixin, EventMixin):
 
         wx.grid.Grid.ForceRefresh(self, *args, **kwargs)
 
+        # Results may have changed, so prefetch is scheduled again on idle
+        self.evaluator.viewport = None
+
         for video_cell_key in self.grid_renderer.video_cells:
             if video_cell_key[2] == self.current_table:
                 video_cell = self.grid_renderer.video_cells[video_cell_key]
@@ -592,6 +610,14 @@ class GridCellEventHandlers(object):
         self.grid.update_attribute_toolbar()
         self.grid.actions.zoom()
 
+    def OnCompactFormat(self, event):
+        """Compact format event handler"""
+
+        with undo.group(_("Compact format")):
+            self.grid.actions.compact_format()
+
+        event.Skip()
+
     def OnCellFont(self, event):
         """Cell font event handler"""
 
@@ -943,7 +969,7 @@ class GridEventHandlers(GridActionEventMixin):
 
         key = row, col, tab
 
-        merge_area = self.grid.code_array.cell_attributes[key]["merge_area"]
+        merge_area = self.grid.code_array.cell_attributes.get_merge_area(key)
         if merge_area is not None:
             top, left, bottom, right = merge_area
             row, col = top, left
@@ -1089,6 +1115,64 @@ class GridEventHandlers(GridActionEventMixin):
 
         event.Skip()
 
+    def OnRecalculateAll(self, event):
+        """Event handler for recalculating all cells via menu"""
+
+        self.grid.actions.recalculate_all()
+        self.grid.ForceRefresh()
+
+        event.Skip()
+
+    def OnProfileToggle(self, event):
+        """Toggles recording of cell evaluation times"""
+
+        code_array = self.grid.code_array
+
+        if code_array.profiler is None:
+            code_array.profiler = EvalProfiler()
+        else:
+            code_array.profiler = None
+
+        event.Skip()
+
+    def OnHotCells(self, event):
+        """Displays hot cells dialog with the recorded evaluation times"""
+
+        profiler = self.grid.code_array.profiler
+
+        if profiler is None:
+            statustext = _("Enable cell evaluation profiling first.")
+            post_command_event(self.grid.main_window, self.grid.StatusBarMsg,
+                               text=statustext)
+            return
+
+        dlg = HotCellsDialog(self.grid.main_window, profiler)
+        dlg.ShowModal()
+        dlg.Destroy()
+
+        event.Skip()
+
+    def OnIdle(self, event):
+        """Schedules background evaluation of visible and nearby cells"""
+
+        self.grid.evaluator.update_viewport()
+
+        event.Skip()
+
+    def OnBackgroundEvaluationToggle(self, event):
+        """Toggles evaluation of cells in a background thread"""
+
+        evaluator = self.grid.evaluator
+
+        evaluator.enabled = not evaluator.enabled
+
+        if not evaluator.enabled:
+            evaluator.stop()
+
+        self.grid.ForceRefresh()
+
+        event.Skip()
+
     def OnTimerToggle(self, event):
         """Toggles the timer for updating frozen cells"""
 
@@ -1595,7 +1679,7 @@ class GridEventHandlers(GridActionEventMixin):
             # The main window does not exist any more
             pass
 
-        self.grid.code_array.result_cache.clear()
+        self.grid.code_array.clear_results()
 
         post_command_event(self.grid.main_window, self.grid.TableChangedMsg,
                            updated_cell=True)
@@ -1632,7 +1716,7 @@ class GridEventHandlers(GridActionEventMixin):
             # The main window does not exist any more
             pass
 
-        self.grid.code_array.result_cache.clear()
+        self.grid.code_array.clear_results()
 
         post_command_event(self.grid.main_window, self.grid.TableChangedMsg,
                            updated_cell=True)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+_grid_evaluator
+===============
+
+Provides
+--------
+
+1) GridEvaluator: Evaluates cells of the grid in a background thread
+
+"""
+
+from itertools import count, product
+import Queue
+import re
+import threading
+
+import wx
+
+from src.config import config
+
+# Priorities of queued keys, lower values are evaluated first
+VISIBLE, PREFETCH = 0, 1
+
+# Code that uses these names may create wx objects, e.g. chart bitmaps
+GUI_NAMES_RE = re.compile(r"\b(wx|charts|fig2bmp|vlcpanel_factory)\b")
+
+
+class GridEvaluator(object):
+    """Evaluates cells in a background thread and redraws them when done
+
+    The grid renderer requests cells that are not cached instead of
+    evaluating them in the GUI thread. Results are stored in the result
+    cache of the code array. Finished cells are redrawn via wx.CallAfter.
+
+    Cells in the visible area are evaluated first. In idle time, cells in
+    a margin around the visible area are prefetched. Queued keys of an
+    earlier viewport are skipped when the user scrolls elsewhere.
+
+    wx objects must only be created in the GUI thread. Therefore, panel
+    cells and cells whose code uses wx or charts are not queued. They are
+    evaluated by the renderer in the GUI thread.
+
+    Parameters
+    ----------
+    grid: wx.grid.Grid
+    \tThe main grid of pyspread
+
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+
+        # If False then cells are evaluated in the GUI thread
+        self.enabled = False
+
+        # Maps queued keys to priority, only accessed in the GUI thread
+        self.pending = {}
+
+        # Visible area and table, for which keys have been scheduled
+        self.viewport = None
+
+        # Incremented on viewport changes, queued keys of older
+        # generations are skipped
+        self.generation = 0
+
+        self._queue = Queue.PriorityQueue()
+        self._counter = count()
+        self._thread = None
+
+    def start(self):
+        """Starts background thread if it is not running"""
+
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run,
+                                            name="GridEvaluator")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stops background thread after the current evaluation"""
+
+        if self._thread is not None:
+            self._queue.put((-1, 0, None, None))
+            self._thread = None
+
+        self.generation += 1
+        self.pending.clear()
+        self.viewport = None
+
+    def is_gui_cell(self, key):
+        """Returns True if cell key must be evaluated in the GUI thread
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of cell
+
+        """
+
+        code_array = self.grid.code_array
+        code = code_array(key)
+
+        if code is None:
+            return False
+
+        return GUI_NAMES_RE.search(code) is not None or \
+            code_array.cell_attributes.get(key, "panel_cell")
+
+    def request(self, key, priority=VISIBLE):
+        """Queues key for evaluation unless it is already pending
+
+        Returns False if the cell is not queued because it must be
+        evaluated in the GUI thread, see is_gui_cell.
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of cell that shall be evaluated
+        priority: VISIBLE or PREFETCH, defaults to VISIBLE
+        \tKeys with lower priority value are evaluated first
+
+        """
+
+        if key in self.pending:
+            if self.pending[key] > priority:
+                self._put(key, priority)
+
+        elif self.is_gui_cell(key):
+            return False
+
+        else:
+            self._put(key, priority)
+
+        return True
+
+    def _put(self, key, priority):
+        """Queues key with priority and starts the background thread"""
+
+        self.start()
+        self.pending[key] = priority
+        self._queue.put((priority, next(self._counter), self.generation, key))
+
+    def update_viewport(self):
+        """Schedules visible and prefetch keys if the viewport has changed
+
+        This is called in idle time. Keys of the former viewport that are
+        not evaluated yet are cancelled.
+
+        """
+
+        if not self.enabled:
+            return
+
+        grid = self.grid
+        viewport = grid.actions.get_visible_area(), grid.current_table
+
+        if viewport == self.viewport:
+            return
+
+        self.viewport = viewport
+        self.generation += 1
+        self.pending.clear()
+
+        code_array = grid.code_array
+        is_cached = code_array.is_cached
+
+        ((top, left), (bottom, right)), tab = viewport
+        no_rows, no_cols = code_array.shape[:2]
+
+        # Visible cells may have been drawn as placeholders before
+        for row, col in product(xrange(max(0, top), min(bottom + 1, no_rows)),
+                                xrange(max(0, left),
+                                       min(right + 1, no_cols))):
+            key = row, col, tab
+            if not is_cached(key):
+                self.request(key, VISIBLE)
+
+        # Prefetch margin, nearest cells first
+        margin_rows = config["prefetch_rows"]
+        margin_cols = config["prefetch_cols"]
+
+        rows = xrange(max(0, top - margin_rows),
+                      min(bottom + margin_rows + 1, no_rows))
+        cols = xrange(max(0, left - margin_cols),
+                      min(right + margin_cols + 1, no_cols))
+
+        def get_distance(key):
+            row, col, __ = key
+            return max(0, top - row, row - bottom) + \
+                max(0, left - col, col - right)
+
+        prefetch_keys = []
+
+        for row, col in product(rows, cols):
+            if top <= row <= bottom and left <= col <= right:
+                continue
+            key = row, col, tab
+            if not is_cached(key):
+                prefetch_keys.append(key)
+
+        for key in sorted(prefetch_keys, key=get_distance):
+            self.request(key, PREFETCH)
+
+    def _run(self):
+        """Evaluation loop of the background thread"""
+
+        # The thread evaluates cells in one watchdog batch
+        with self.grid.code_array.watchdog.batch():
+            while True:
+                priority, __, generation, key = self._queue.get()
+
+                if key is None:
+                    return
+
+                if generation != self.generation:
+                    # Cancelled by a viewport change
+                    continue
+
+                try:
+                    # Stores the result in the result cache
+                    self.grid.code_array[key]
+
+                except Exception:
+                    # Evaluation errors are stored as results, so this is
+                    # unexpected. The cell is evaluated on the next draw.
+                    pass
+
+                wx.CallAfter(self._on_evaluated, key, priority, generation)
+
+    def _on_evaluated(self, key, priority, generation):
+        """Redraws the cell key in the GUI thread
+
+        Cells of an outdated generation are dropped. They have been
+        rescheduled if they are still visible.
+
+        """
+
+        if generation != self.generation:
+            return
+
+        if self.pending.get(key) == priority:
+            del self.pending[key]
+
+        grid = self.grid
+
+        # The grid may have been destroyed
+        if priority != VISIBLE or not grid or key[2] != grid.current_table:
+            return
+
+        row, col, tab = key
+
+        rect = grid.CellToRect(row, col)
+        rect = grid.grid_renderer.get_merged_rect(grid, key, rect)
+        if rect is None:
+            return
+
+        rect.x, rect.y = grid.CalcScrolledPosition(rect.x, rect.y)
+        grid.GetGridWindow().RefreshRect(rect, eraseBackground=False)
+
+# end of class GridEvaluator
@@ -179,7 +179,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer, EventMixin):
 
         # Check if cell is merged:
         cell_attributes = grid.code_array.cell_attributes
-        merge_area = cell_attributes[(row, col, tab)]["merge_area"]
+        merge_area = cell_attributes.get_merge_area((row, col, tab))
 
         if merge_area is None:
             return rect
@@ -231,7 +231,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer, EventMixin):
         zoomed_height = drawn_rect.height / self.zoom
 
         # Button cells shall not be executed for preview
-        if grid.code_array.cell_attributes[key]["button_cell"]:
+        if grid.code_array.cell_attributes.get(key, "button_cell"):
             cell_preview = repr(grid.code_array(key))[:100]
             __id = id(grid.code_array(key))
         else:
@@ -298,26 +298,58 @@ class GridRenderer(wx.grid.PyGridCellRenderer, EventMixin):
 
         return bmp
 
+    def _draw_placeholder(self, dc, rect):
+        """Draws placeholder for a cell that is evaluated in the background"""
+
+        dc.SetClippingRect(rect)
+
+        dc.SetPen(wx.TRANSPARENT_PEN)
+        dc.SetBrush(wx.Brush(get_color(config["background_color"])))
+        dc.DrawRectangleRect(rect)
+
+        font = wx.SystemSettings.GetFont(wx.SYS_DEFAULT_GUI_FONT)
+        font.SetStyle(wx.FONTSTYLE_ITALIC)
+        dc.SetFont(font)
+        dc.SetTextForeground(get_color(config["grid_color"]))
+        dc.DrawText(_(u"calculating\u2026"), rect.x + 2, rect.y + 2)
+
+        dc.DestroyClippingRegion()
+
     def Draw(self, grid, attr, dc, rect, row, col, isSelected):
         """Draws the cell border and content using pycairo"""
 
         key = row, col, grid.current_table
 
         # If cell is merge draw the merging cell if invisibile
-        if grid.code_array.cell_attributes[key]["merge_area"]:
+        if grid.code_array.cell_attributes.get_merge_area(key):
             key = self.get_merging_cell(grid, key)
 
         drawn_rect = self._get_drawn_rect(grid, key, rect)
         if drawn_rect is None:
             return
 
+        # Cells that are not cached are evaluated in the background.
+        # Results that exceed the result cache budget are pinned in the
+        # cache, so that the delivered result is displayed afterwards.
+        # Cells that create wx objects are not requested and evaluated
+        # below in the GUI thread.
+        if grid.evaluator.enabled and \
+           not grid.code_array.is_cached(key) and \
+           grid.evaluator.request(key):
+            self._draw_placeholder(dc, drawn_rect)
+
+            if grid.actions.cursor[:2] == (row, col):
+                self.update_cursor(dc, grid, row, col)
+
+            return
+
         cell_cache_key = self._get_draw_cache_key(grid, key, drawn_rect,
                                                   isSelected)
 
         mdc = wx.MemoryDC()
 
         if vlc is not None and key in self.video_cells and \
-           grid.code_array.cell_attributes[key]["panel_cell"]:
+           grid.code_array.cell_attributes.get(key, "panel_cell"):
             # Update video position of previously created video panel
             self.video_cells[key].SetClientRect(drawn_rect)
 
@@ -327,7 +359,7 @@ class GridRenderer(wx.grid.PyGridCellRenderer, EventMixin):
         else:
             code = grid.code_array(key)
             if vlc is not None and code is not None and \
-               grid.code_array.cell_attributes[key]["panel_cell"]:
+               grid.code_array.cell_attributes.get(key, "panel_cell"):
                 try:
                     # A panel is to be displayed
                     panel_cls = grid.code_array[key]
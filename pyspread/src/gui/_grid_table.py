@@ -79,6 +79,13 @@ class GridTable(wx.grid.PyGridTableBase):
         else:
             return value
 
+    def IsEmptyCell(self, row, col):
+        """Returns True if the cell has no code, e.g. for Ctrl + arrow jumps"""
+
+        key = row, col, self.grid.current_table
+
+        return key not in self.code_array.dict_grid
+
     def GetValue(self, row, col, table=None):
         """Return the result value of a cell, line split if too much data"""
 
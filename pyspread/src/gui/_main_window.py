@@ -557,6 +557,10 @@ class MainWindowEventHandlers(EventMixin):
                 # User wants to save content
                 post_command_event(self.main_window, self.main_window.SaveMsg)
 
+        # Stop background evaluation
+
+        self.main_window.grid.evaluator.stop()
+
         # Save the AUI state
 
         config["window_layout"] = repr(self.main_window._mgr.SavePerspective())
@@ -608,6 +612,7 @@ class MainWindowEventHandlers(EventMixin):
                 else:
                     config[key] = ast.literal_eval(preferences[key])
 
+        self.main_window.grid.code_array.update_cache_sizes()
         self.main_window.grid.grid_renderer.cell_cache.clear()
         self.main_window.grid.ForceRefresh()
 
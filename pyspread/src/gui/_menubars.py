@@ -346,10 +346,25 @@ class MainMenu(_filledMenu, EventMixin):
                         _("Refresh selected cells") + "\tF5",
                         _("Refresh selected cells even when frozen"),
                         wx.ID_REFRESH]],
+                [item, [self.RecalculateAllMsg,
+                        _("Recalculate all cells") + "\tShift+F5",
+                        _("Recalculates all non-frozen cells in parallel "
+                          "worker processes")]],
+                [item, [self.ProfileToggleMsg,
+                        _("Profile cell evaluation"),
+                        _("Records evaluation time and cache hits per cell")],
+                 wx.ITEM_CHECK],
+                [item, [self.HotCellsMsg, _("Hot cells..."),
+                        _("Shows the cells that take most evaluation time")]],
                 [item, [self.TimerToggleMsg,
                         _("Toggle periodic updates"),
                         _("Toggles periodic cell updates for frozen cells")],
                  wx.ITEM_CHECK],
+                [item, [self.BackgroundEvaluationToggleMsg,
+                        _("Background evaluation"),
+                        _("Evaluates cells in a background thread and shows "
+                          "a placeholder until results are available")],
+                 wx.ITEM_CHECK],
                 ["Separator"],
                 [item, [self.ViewFrozenMsg, _("Show Frozen"),
                         _("Shows which cells are currently frozen in a "
@@ -360,6 +375,9 @@ class MainMenu(_filledMenu, EventMixin):
                         _("Copy format of selection to the clipboard")]],
                 [item, [self.PasteFormatMsg, _("Paste format") + "\tAlt+Ctrl+V",
                         _("Paste format of selection to the clipboard")]],
+                [item, [self.CompactFormatMsg, _("Compact format"),
+                        _("Removes overridden format entries without "
+                          "changing any cell format")]],
                 ["Separator"],
                 [item, [self.FontDialogMsg, _("Font..."),
                         _("Launch font dialog.")]],
@@ -181,16 +181,9 @@ class Pys(object):
 
         """
 
-        # Remove doublettes
-        purged_cell_attributes = []
-        purged_cell_attributes_keys = []
-        for selection, tab, attr_dict in self.code_array.cell_attributes:
-            if purged_cell_attributes_keys and \
-               (selection, tab) == purged_cell_attributes_keys[-1]:
-                purged_cell_attributes[-1][2].update(attr_dict)
-            else:
-                purged_cell_attributes_keys.append((selection, tab))
-                purged_cell_attributes.append([selection, tab, attr_dict])
+        # Remove overridden attributes and doublettes
+        cell_attributes = self.code_array.cell_attributes
+        purged_cell_attributes = cell_attributes.get_compacted()
 
         for selection, tab, attr_dict in purged_cell_attributes:
             sel_list = [selection.block_tl, selection.block_br,
@@ -137,13 +137,8 @@ class GridCairoRenderer(object):
 
         merge_area = self._get_merge_area((row, col, tab))
 
-        for __row in xrange(top_row, row):
-            __row_height = self.code_array.get_row_height(__row, tab)
-            pos_y += __row_height
-
-        for __col in xrange(left_col, col):
-            __col_width = self.code_array.get_col_width(__col, tab)
-            pos_x += __col_width
+        pos_y += self.code_array.get_rows_height(top_row, row, tab)
+        pos_x += self.code_array.get_cols_width(left_col, col, tab)
 
         if merge_area is None:
             height = self.code_array.get_row_height(row, tab)
@@ -154,12 +149,9 @@ class GridCairoRenderer(object):
             # Are we drawing the top left cell?
             if top == row and left == col:
                 # Set rect to merge area
-                heights = (self.code_array.get_row_height(__row, tab)
-                           for __row in xrange(top, bottom+1))
-                widths = (self.code_array.get_col_width(__col, tab)
-                          for __col in xrange(left, right+1))
-                height = sum(heights)
-                width = sum(widths)
+                height = self.code_array.get_rows_height(top, bottom + 1,
+                                                         tab)
+                width = self.code_array.get_cols_width(left, right + 1, tab)
             else:
                 # Do not draw the cell because it is hidden
                 return
@@ -173,8 +165,7 @@ class GridCairoRenderer(object):
 
         """
 
-        cell_attributes = self.code_array.cell_attributes[key]
-        return cell_attributes["merge_area"]
+        return self.code_array.cell_attributes.get_merge_area(key)
 
     def draw(self):
         """Draws slice to context"""
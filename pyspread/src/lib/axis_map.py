@@ -0,0 +1,261 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+axis_map
+========
+
+Mapping of logical rows or columns to physical rows or columns
+
+Provides
+--------
+
+ * AxisMap: Maps logical indices of one grid axis to physical indices
+
+"""
+
+from bisect import bisect_right
+
+INF = float("inf")
+
+
+class AxisMap(object):
+    """Maps logical indices of one grid axis to physical indices
+
+    The map consists of runs of consecutive logical indices that are
+    mapped to consecutive physical indices. Inserting, deleting and
+    reordering logical indices only changes the runs. Inserted indices are
+    mapped to fresh physical indices, which have never been used before.
+
+    Logical indices beyond the runs map to physical indices beyond all
+    used physical indices. Negative indices are not mapped.
+
+    Parameters
+    ----------
+    length: Integer, defaults to 0
+    \tNumber of logical indices that are initially mapped to themselves
+
+    """
+
+    def __init__(self, length=0):
+        # Logical start indices and physical start indices of runs
+        self.starts = []
+        self.offsets = []
+
+        # Number of mapped logical indices
+        self.length = 0
+
+        # First physical index that has never been used
+        self.free = 0
+
+        # Runs sorted by physical start, created on demand
+        self._inverse = None
+
+        self.resize(length)
+
+    def copy(self):
+        """Returns independent copy of self"""
+
+        axis_map = AxisMap()
+        axis_map._set_runs(self._get_runs())
+        axis_map.length = self.length
+        axis_map.free = self.free
+
+        return axis_map
+
+    def _get_runs(self):
+        """Returns list of runs (logical start, physical start, length)"""
+
+        stops = self.starts[1:] + [self.length]
+
+        return [(start, offset, stop - start) for start, offset, stop
+                in zip(self.starts, self.offsets, stops)]
+
+    def _set_runs(self, runs):
+        """Sets runs from list of (logical start, physical start, length)
+
+        The runs must cover the logical indices without gaps. Adjacent runs
+        that continue each other are merged.
+
+        """
+
+        starts = []
+        offsets = []
+
+        for start, offset, length in sorted(runs):
+            # Skip empty runs and runs that continue the previous run
+            if length > 0 and \
+               not (starts and offsets[-1] + start - starts[-1] == offset):
+                starts.append(start)
+                offsets.append(offset)
+
+        self.starts = starts
+        self.offsets = offsets
+        self._inverse = None
+
+    def get_physical(self, index):
+        """Returns physical index of logical index"""
+
+        if index < 0:
+            return index
+
+        if index >= self.length:
+            return self.free + index - self.length
+
+        run = bisect_right(self.starts, index) - 1
+
+        return self.offsets[run] + index - self.starts[run]
+
+    def get_logical(self, index):
+        """Returns logical index of physical index or None if unused"""
+
+        if index < 0:
+            return index
+
+        if index >= self.free:
+            return self.length + index - self.free
+
+        if self._inverse is None:
+            self._inverse = sorted((offset, start, length) for start, offset,
+                                   length in self._get_runs())
+            self._inverse_offsets = [run[0] for run in self._inverse]
+
+        run = bisect_right(self._inverse_offsets, index) - 1
+        if run < 0:
+            return
+
+        offset, start, length = self._inverse[run]
+        if index < offset + length:
+            return start + index - offset
+
+    def get_physical_ranges(self, first, last):
+        """Returns list of physical (first, last) ranges of logical range
+
+        Parameters
+        ----------
+        first: Integer
+        \tFirst logical index of the range
+        last: Integer or INF
+        \tLast logical index of the range (inclusive)
+
+        """
+
+        ranges = []
+
+        if first < 0:
+            ranges.append((first, min(last, -1)))
+            first = 0
+
+        for start, offset, length in self._get_runs():
+            run_first = max(first, start)
+            run_last = min(last, start + length - 1)
+            if run_first <= run_last:
+                ranges.append((offset + run_first - start,
+                               offset + run_last - start))
+
+        if last >= self.length:
+            ranges.append((self.get_physical(max(first, self.length)),
+                           INF if last == INF else self.get_physical(last)))
+
+        return ranges
+
+    def resize(self, length):
+        """Extends the runs so that at least length indices are mapped
+
+        The mapping does not change.
+
+        """
+
+        if length > self.length:
+            runs = self._get_runs()
+            runs.append((self.length, self.free, length - self.length))
+            self.free += length - self.length
+            self.length = length
+            self._set_runs(runs)
+
+    def insert(self, point, number):
+        """Inserts number fresh logical indices before logical index point"""
+
+        point = max(0, min(point, self.length))
+
+        runs = []
+        for start, offset, length in self._get_runs():
+            if start + length <= point:
+                runs.append((start, offset, length))
+            elif start >= point:
+                runs.append((start + number, offset, length))
+            else:
+                head = point - start
+                runs.append((start, offset, head))
+                runs.append((point + number, offset + head, length - head))
+
+        runs.append((point, self.free, number))
+
+        self.free += number
+        self.length += number
+        self._set_runs(runs)
+
+    def delete(self, point, number):
+        """Removes number logical indices starting with logical index point"""
+
+        point = max(0, point)
+        stop = min(point + number, self.length)
+
+        if point >= stop:
+            return
+
+        runs = []
+        for start, offset, length in self._get_runs():
+            if start < point:
+                runs.append((start, offset, min(length, point - start)))
+            if start + length > stop:
+                cut = max(0, stop - start)
+                runs.append((max(start, stop) - (stop - point), offset + cut,
+                             length - cut))
+
+        self.length -= stop - point
+        self._set_runs(runs)
+
+    def permute(self, order):
+        """Reorders logical indices so that new index i is old order[i]
+
+        Parameters
+        ----------
+        order: List of Integer
+        \tPermutation of range(len(order))
+
+        """
+
+        self.resize(len(order))
+
+        runs = [(i, self.get_physical(old), 1) for i, old in enumerate(order)]
+        runs += [(start, offset, length) for start, offset, length
+                 in self._get_runs() if start >= len(order)]
+
+        for start, offset, length in self._get_runs():
+            # Keep the part of a run that crosses the end of order
+            if start < len(order) < start + length:
+                head = len(order) - start
+                runs.append((len(order), offset + head, length - head))
+
+        self._set_runs(runs)
+
+# End of class AxisMap
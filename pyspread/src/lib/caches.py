@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+caches
+======
+
+Bounded caches for the model
+
+Provides
+--------
+
+ * LRUCache: Dict-like cache with a maximum number of entries
+ * MemoryCache: Dict-like cache with a memory budget
+ * get_cache_key: Returns hashable cache key for a cell or range key
+ * is_range_key: Returns True if a cache key represents a cell range
+ * get_size: Returns estimated memory size of an object
+
+"""
+
+from collections import OrderedDict
+from itertools import chain
+import sys
+import threading
+from types import SliceType
+
+
+def get_cache_key(key):
+    """Returns hashable cache key for key
+
+    Cell keys are returned as tuple. Slices in range keys are replaced by
+    (start, stop, step) tuples because slices are not hashable.
+
+    Parameters
+    ----------
+    key: 3-tuple of Integer or slice
+    \tCell or range key
+
+    """
+
+    for key_ele in key:
+        if type(key_ele) is SliceType:
+            return tuple((k.start, k.stop, k.step)
+                         if type(k) is SliceType else k for k in key)
+
+    return tuple(key)
+
+
+def is_range_key(cache_key):
+    """Returns True if cache_key from get_cache_key represents a range"""
+
+    return any(type(key_ele) is tuple for key_ele in cache_key)
+
+
+def get_size(obj):
+    """Returns estimated memory size of obj in bytes
+
+    The size of numpy arrays and other buffers is taken from nbytes.
+    Otherwise, sys.getsizeof is used, which does not include the sizes of
+    referenced objects.
+
+    """
+
+    size = sys.getsizeof(obj, 64)
+
+    try:
+        nbytes = obj.nbytes
+
+    except Exception:
+        return size
+
+    try:
+        return max(size, int(nbytes))
+
+    except (TypeError, ValueError):
+        return size
+
+
+class LRUCache(object):
+    """Dict-like cache that discards the least recently used entries
+
+    Lookups via __getitem__ are counted as hits or misses. The cache may
+    be accessed from more than one thread.
+
+    Parameters
+    ----------
+    maxsize: Integer
+    \tMaximum number of entries
+
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+
+        self._data = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __getitem__(self, key):
+        """Returns value of key and marks it as most recently used"""
+
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+
+            except KeyError:
+                self.misses += 1
+                raise
+
+            self._data[key] = value
+            self.hits += 1
+
+            return value
+
+    def __setitem__(self, key, value):
+        """Stores value and discards least recently used entries if full"""
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        """Removes all entries and resets hit and miss counters"""
+
+        with self._lock:
+            self._data.clear()
+
+            self.hits = 0
+            self.misses = 0
+
+# End of class LRUCache
+
+
+class MemoryCache(object):
+    """Dict-like cache that discards least recently used entries if the
+    estimated memory size of all values exceeds a budget
+
+    Values that are larger than the budget are not counted against it.
+    The most recently stored of these values are pinned, i.e. they are kept
+    outside of the budget so that e.g. a displayed result is not evaluated
+    again on each lookup. In contrast to LRUCache, clear keeps the
+    statistics. The cache may be accessed from more than one thread.
+
+    Parameters
+    ----------
+    maxbytes: Integer
+    \tMemory budget in bytes
+    maxpinned: Integer, defaults to 0
+    \tMaximum number of pinned values that exceed the budget
+
+    """
+
+    def __init__(self, maxbytes, maxpinned=0):
+        self.maxbytes = maxbytes
+        self.maxpinned = maxpinned
+
+        # Maps key to (value, size)
+        self._data = OrderedDict()
+
+        # Maps key to value for values that exceed the budget
+        self._pinned = OrderedDict()
+
+        self._lock = threading.RLock()
+
+        self.bytes = 0
+
+        self.reset_stats()
+
+    def __len__(self):
+        return len(self._data) + len(self._pinned)
+
+    def __contains__(self, key):
+        return key in self._data or key in self._pinned
+
+    def __iter__(self):
+        """Iterates over a snapshot of the keys"""
+
+        with self._lock:
+            return iter(list(chain(self._data, self._pinned)))
+
+    def __getitem__(self, key):
+        """Returns value of key and marks it as most recently used"""
+
+        with self._lock:
+            try:
+                item = self._data.pop(key)
+
+            except KeyError:
+                try:
+                    value = self._pinned.pop(key)
+
+                except KeyError:
+                    self.misses += 1
+                    raise
+
+                self._pinned[key] = value
+                self.hits += 1
+
+                return value
+
+            self._data[key] = item
+            self.hits += 1
+
+            return item[0]
+
+    def __setitem__(self, key, value):
+        """Stores value and discards least recently used entries if full"""
+
+        # The size estimate may be slow, so it is computed without the lock
+        size = get_size(value)
+
+        with self._lock:
+            self._remove(key)
+
+            if size > self.maxbytes:
+                self.evictions += 1
+                self._pin(key, value)
+                return
+
+            self._data[key] = value, size
+            self.bytes += size
+
+            self._evict()
+
+    def _pin(self, key, value):
+        """Stores value outside of the budget, discards oldest if full"""
+
+        if self.maxpinned <= 0:
+            return
+
+        self._pinned[key] = value
+
+        while len(self._pinned) > self.maxpinned:
+            self._pinned.popitem(last=False)
+
+    def _remove(self, key):
+        """Removes key if present and returns (value, size) or None"""
+
+        try:
+            item = self._data.pop(key)
+
+        except KeyError:
+            try:
+                return self._pinned.pop(key), 0
+
+            except KeyError:
+                return
+
+        self.bytes -= item[1]
+
+        return item
+
+    def _evict(self):
+        """Discards least recently used entries until budget is met"""
+
+        while self.bytes > self.maxbytes:
+            __, (__, size) = self._data.popitem(last=False)
+            self.bytes -= size
+            self.evictions += 1
+
+    def pop(self, key, *default):
+        """Removes key and returns its value like dict.pop"""
+
+        with self._lock:
+            item = self._remove(key)
+
+        if item is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+
+        return item[0]
+
+    def clear(self):
+        """Removes all entries"""
+
+        with self._lock:
+            self._data.clear()
+            self._pinned.clear()
+            self.bytes = 0
+
+    def resize(self, maxbytes):
+        """Sets new memory budget and discards entries that exceed it"""
+
+        with self._lock:
+            self.maxbytes = maxbytes
+            self._evict()
+
+    def reset_stats(self):
+        """Resets hit, miss and eviction counters"""
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_stats(self):
+        """Returns dict with cache statistics"""
+
+        with self._lock:
+            return {
+                "entries": len(self._data),
+                "pinned": len(self._pinned),
+                "bytes": self.bytes,
+                "maxbytes": self.maxbytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+# End of class MemoryCache
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+chunk_index
+===========
+
+Index of grid cell keys that groups keys by table and by blocks of rows and
+columns
+
+Provides
+--------
+
+ * ChunkIndex: Finds the keys of a table or of a region of a table
+
+"""
+
+INF = float("inf")
+
+
+class ChunkIndex(object):
+    """Groups (row, col, tab) keys by table and fixed size chunks
+
+    A chunk contains the keys of chunk_rows x chunk_cols cells. Region
+    queries only visit the chunks of the table that overlap the region.
+
+    Subclasses may index other key types by overriding split_key.
+
+    Parameters
+    ----------
+    keys: Iterable of 3-tuples, defaults to ()
+    \tInitial (row, col, tab) keys
+
+    """
+
+    chunk_rows = 256
+    chunk_cols = 64
+
+    @staticmethod
+    def split_key(key):
+        """Returns (row, col, tab) of an indexed key"""
+
+        return key
+
+    def __init__(self, keys=()):
+        # Maps tab to dict that maps (row chunk, col chunk) to set of keys
+        self.tables = {}
+
+        for key in keys:
+            self.add(key)
+
+    def __len__(self):
+        return sum(len(chunk) for chunks in self.tables.itervalues()
+                   for chunk in chunks.itervalues())
+
+    def _get_chunk_key(self, row, col):
+        """Returns (row chunk, col chunk) of cell"""
+
+        return row // self.chunk_rows, col // self.chunk_cols
+
+    def add(self, key):
+        """Adds key (row, col, tab) to the index"""
+
+        row, col, tab = self.split_key(key)
+        chunks = self.tables.setdefault(tab, {})
+        chunks.setdefault(self._get_chunk_key(row, col), set()).add(key)
+
+    def discard(self, key):
+        """Removes key (row, col, tab) from the index if present"""
+
+        row, col, tab = self.split_key(key)
+
+        try:
+            chunks = self.tables[tab]
+            chunk_key = self._get_chunk_key(row, col)
+            chunk = chunks[chunk_key]
+        except KeyError:
+            return
+
+        chunk.discard(key)
+
+        if not chunk:
+            del chunks[chunk_key]
+            if not chunks:
+                del self.tables[tab]
+
+    def clear(self):
+        """Removes all keys"""
+
+        self.tables.clear()
+
+    def get_tables(self):
+        """Returns sorted list of tables that contain keys"""
+
+        return sorted(self.tables)
+
+    def get_keys(self, tab=None, top=0, left=0, bottom=INF, right=INF):
+        """Generator of keys in a region of one or all tables
+
+        The keys are yielded in arbitrary order. Keys must not be added or
+        removed while the generator is running.
+
+        Parameters
+        ----------
+        tab: Integer, defaults to None
+        \tTable of the keys, all tables if None
+        top: Integer, defaults to 0
+        \tTop row of the region
+        left: Integer, defaults to 0
+        \tLeft column of the region
+        bottom: Integer, defaults to INF
+        \tBottom row of the region (inclusive)
+        right: Integer, defaults to INF
+        \tRight column of the region (inclusive)
+
+        """
+
+        if tab is None:
+            tables = self.tables.values()
+        elif tab in self.tables:
+            tables = [self.tables[tab]]
+        else:
+            return
+
+        is_open = top <= 0 and left <= 0 and bottom == right == INF
+
+        top_chunk, left_chunk = self._get_chunk_key(top, left)
+        if bottom == INF:
+            bottom_chunk = INF
+        else:
+            bottom_chunk = bottom // self.chunk_rows
+        if right == INF:
+            right_chunk = INF
+        else:
+            right_chunk = right // self.chunk_cols
+
+        for chunks in tables:
+            for (row_chunk, col_chunk), chunk in chunks.iteritems():
+                if is_open:
+                    for key in chunk:
+                        yield key
+
+                elif top_chunk <= row_chunk <= bottom_chunk and \
+                        left_chunk <= col_chunk <= right_chunk:
+                    # Chunks inside of the region need no key checks
+                    if top_chunk < row_chunk < bottom_chunk and \
+                       left_chunk < col_chunk < right_chunk:
+                        for key in chunk:
+                            yield key
+                    else:
+                        for key in chunk:
+                            row, col, __ = self.split_key(key)
+                            if top <= row <= bottom and left <= col <= right:
+                                yield key
+
+# End of class ChunkIndex
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+compact_storage
+===============
+
+Compact representations of grid keys and cell code
+
+Provides
+--------
+
+ * pack_key: Packs a (row, col, tab) key into one integer
+ * unpack_key: Returns the (row, col, tab) key of a packed key
+ * StringArena: Stores strings in one bytearray
+ * PackedChunkIndex: ChunkIndex of packed keys
+
+"""
+
+from src.lib.chunk_index import ChunkIndex
+
+# Bits of the packed key components, rows get the remaining bits
+TAB_BITS = 12
+COL_BITS = 20
+ROW_BITS = 31
+
+TAB_MASK = (1 << TAB_BITS) - 1
+COL_MASK = (1 << COL_BITS) - 1
+
+MAX_ROW = 1 << ROW_BITS
+MAX_COL = 1 << COL_BITS
+MAX_TAB = 1 << TAB_BITS
+
+
+def pack_key(key):
+    """Returns 64 bit integer for key (row, col, tab)
+
+    Keys with negative or too large components are returned unchanged.
+
+    Parameters
+    ----------
+    key: 3-tuple of Integer
+    \tKey that is packed
+
+    """
+
+    row, col, tab = key
+
+    if 0 <= row < MAX_ROW and 0 <= col < MAX_COL and 0 <= tab < MAX_TAB:
+        return (((row << COL_BITS) | col) << TAB_BITS) | tab
+
+    return tuple(key)
+
+
+def unpack_key(packed_key):
+    """Returns key (row, col, tab) of a key from pack_key"""
+
+    if type(packed_key) is tuple:
+        return packed_key
+
+    return (packed_key >> (COL_BITS + TAB_BITS),
+            (packed_key >> TAB_BITS) & COL_MASK,
+            packed_key & TAB_MASK)
+
+
+class StringArena(object):
+    """Stores str and unicode strings in one bytearray
+
+    A string is referenced by an integer handle. Removed strings leave
+    garbage in the arena until it is compacted.
+
+    """
+
+    # Strings with more bytes are not stored in the arena
+    max_length = (1 << 24) - 1
+
+    def __init__(self):
+        self.data = bytearray()
+
+        # Number of bytes of removed strings
+        self.garbage = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    @classmethod
+    def is_storable(cls, value):
+        """Returns True if value can be stored in an arena"""
+
+        if type(value) is unicode:
+            return len(value) * 4 <= cls.max_length
+
+        return type(value) is str and len(value) <= cls.max_length
+
+    def add(self, value):
+        """Stores string value and returns its integer handle"""
+
+        is_unicode = type(value) is unicode
+        if is_unicode:
+            value = value.encode("utf-8")
+
+        offset = len(self.data)
+        self.data.extend(value)
+
+        return (offset << 25) | (len(value) << 1) | is_unicode
+
+    def get(self, handle):
+        """Returns string of handle"""
+
+        offset = handle >> 25
+        length = (handle >> 1) & self.max_length
+
+        value = str(self.data[offset:offset + length])
+
+        if handle & 1:
+            return value.decode("utf-8")
+
+        return value
+
+    def discard(self, handle):
+        """Marks the bytes of handle as garbage"""
+
+        self.garbage += (handle >> 1) & self.max_length
+
+    def is_compaction_due(self):
+        """Returns True if more than half of the arena is garbage"""
+
+        return self.garbage > max(1 << 16, len(self.data) // 2)
+
+# End of class StringArena
+
+
+class PackedChunkIndex(ChunkIndex):
+    """ChunkIndex of keys from pack_key"""
+
+    split_key = staticmethod(unpack_key)
+
+# End of class PackedChunkIndex
@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+dependencies
+============
+
+Cell dependency tracking for incremental recalculation
+
+Provides
+--------
+
+ * DependencyGraph: Directed graph of cell read dependencies
+
+"""
+
+
+class DependencyGraph(object):
+    """Directed graph that stores which keys are read by which keys
+
+    A node is any hashable object, typically a cell key.
+    An edge from precedent to dependent means that the dependent
+    has read the precedent when it was last evaluated.
+
+    """
+
+    def __init__(self):
+        # Maps dependent node to set of nodes that it reads
+        self._precedents = {}
+
+        # Maps precedent node to set of nodes that read it
+        self._dependents = {}
+
+    def __len__(self):
+        """Returns number of nodes that have precedents"""
+
+        return len(self._precedents)
+
+    def __contains__(self, node):
+        """Returns True iif node has precedents or dependents"""
+
+        return node in self._precedents or node in self._dependents
+
+    def add(self, dependent, precedent):
+        """Records that dependent reads precedent
+
+        Parameters
+        ----------
+        dependent: Hashable
+        \tNode that reads precedent
+        precedent: Hashable
+        \tNode that is read by dependent
+
+        """
+
+        try:
+            self._precedents[dependent].add(precedent)
+        except KeyError:
+            self._precedents[dependent] = set([precedent])
+
+        try:
+            self._dependents[precedent].add(dependent)
+        except KeyError:
+            self._dependents[precedent] = set([dependent])
+
+    def remove_precedents(self, dependent):
+        """Removes all edges to the precedents of dependent
+
+        This is called before a node is re-evaluated because the new
+        evaluation may read other nodes than the last one.
+
+        """
+
+        precedents = self._precedents.pop(dependent, ())
+
+        for precedent in precedents:
+            dependents = self._dependents[precedent]
+            dependents.discard(dependent)
+            if not dependents:
+                del self._dependents[precedent]
+
+    def get_precedents(self, node):
+        """Returns set of nodes that are directly read by node"""
+
+        return set(self._precedents.get(node, ()))
+
+    def get_dependents(self, node):
+        """Returns set of nodes that directly read node"""
+
+        return set(self._dependents.get(node, ()))
+
+    def get_transitive_dependents(self, node):
+        """Returns set of all nodes that depend directly or indirectly on node
+
+        node itself is only contained if it is part of a cycle.
+
+        """
+
+        result = set()
+        stack = list(self._dependents.get(node, ()))
+
+        while stack:
+            dependent = stack.pop()
+            if dependent not in result:
+                result.add(dependent)
+                stack.extend(self._dependents.get(dependent, ()))
+
+        return result
+
+    def clear(self):
+        """Removes all nodes and edges"""
+
+        self._precedents.clear()
+        self._dependents.clear()
+
+# End of class DependencyGraph
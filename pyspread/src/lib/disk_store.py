@@ -0,0 +1,425 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+disk_store
+==========
+
+Out-of-core storage of cell code
+
+Provides
+--------
+
+ * DiskStore: Maps (row, col, tab) keys to values in an SQLite database
+
+"""
+
+import cPickle as pickle
+from functools import wraps
+import sqlite3
+import threading
+
+from src.lib.caches import LRUCache
+from src.lib.chunk_index import INF
+
+# Kinds of stored values
+UNICODE, STRING, PICKLE = range(3)
+
+
+def synchronized(method):
+    """Decorator that calls method while the lock of the store is held"""
+
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+class DiskStore(object):
+    """Maps (row, col, tab) keys to values in a temporary SQLite database
+
+    Reads are answered from an LRU cache of pages, i.e. of blocks of
+    page_rows rows of one table. Writes go straight to the database and
+    update cached pages. Besides the cache, only the number of keys per
+    table is kept in memory.
+
+    DiskStore also provides the region queries of ChunkIndex and queries
+    for the first and last filled rows and columns. Keys are streamed from
+    the database in batches. The store may be read from other threads, e.g.
+    via snapshots.
+
+    Parameters
+    ----------
+    cache_pages: Integer, defaults to 256
+    \tMaximum number of pages in the cache
+
+    """
+
+    page_rows = 64
+
+    # Number of writes, after which the database is committed
+    commit_interval = 10000
+
+    # Number of rows that iteration fetches per query
+    fetch_size = 1000
+
+    def __init__(self, cache_pages=256):
+        self.cache_pages = cache_pages
+
+        # An empty filename opens a private temporary database on disk,
+        # which SQLite removes when the connection is closed.
+        # Its content is transient, i.e. journaling is not needed.
+        self.connection = sqlite3.connect("", check_same_thread=False)
+        self.lock = threading.RLock()
+        self.connection.execute("PRAGMA journal_mode=OFF")
+        self.connection.execute("PRAGMA synchronous=OFF")
+        self.connection.execute(
+            "CREATE TABLE cells (tab INTEGER, row INTEGER, col INTEGER, "
+            "kind INTEGER, code BLOB, PRIMARY KEY (tab, row, col))")
+
+        # Index for column lookups, rows are looked up via the primary key
+        self.connection.execute(
+            "CREATE INDEX cells_col ON cells (tab, col, row)")
+
+        self.pages = LRUCache(maxsize=cache_pages)
+
+        # Maps tab to number of keys
+        self.table_counts = {}
+
+        self._writes = 0
+
+    def __len__(self):
+        return sum(self.table_counts.itervalues())
+
+    def __contains__(self, key):
+        return key in self._get_page(key)
+
+    def __copy__(self):
+        """Returns an empty store, into which copies re-add their cells"""
+
+        return self.__class__(self.cache_pages)
+
+    def __deepcopy__(self, memo):
+        return self.__copy__()
+
+    # Value encoding
+
+    @staticmethod
+    def _encode(value):
+        """Returns (kind, code) of value for the database"""
+
+        if type(value) is unicode:
+            return UNICODE, value
+
+        elif type(value) is str:
+            return STRING, buffer(value)
+
+        return PICKLE, buffer(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+    @staticmethod
+    def _decode(kind, code):
+        """Returns value from _encode result (kind, code)"""
+
+        if kind == UNICODE:
+            return code
+
+        elif kind == STRING:
+            return str(code)
+
+        return pickle.loads(str(code))
+
+    # Pages
+
+    @synchronized
+    def _get_page(self, key):
+        """Returns dict of the keys and values in the page of key"""
+
+        row, __, tab = key
+        page_key = tab, row // self.page_rows
+
+        try:
+            return self.pages[page_key]
+
+        except KeyError:
+            pass
+
+        top = page_key[1] * self.page_rows
+        cursor = self.connection.execute(
+            "SELECT row, col, kind, code FROM cells "
+            "WHERE tab = ? AND row BETWEEN ? AND ?",
+            (tab, top, top + self.page_rows - 1))
+
+        page = self.pages[page_key] = \
+            dict(((row, col, tab), self._decode(kind, code))
+                 for row, col, kind, code in cursor)
+
+        return page
+
+    def _get_cached_page(self, key):
+        """Returns page of key if it is cached, else None"""
+
+        page_key = key[2], key[0] // self.page_rows
+
+        if page_key in self.pages:
+            return self.pages[page_key]
+
+    def _count_write(self):
+        """Commits after commit_interval writes"""
+
+        self._writes += 1
+
+        if self._writes >= self.commit_interval:
+            self.connection.commit()
+            self._writes = 0
+
+    def _change_count(self, tab, delta):
+        """Adds delta to the number of keys of table tab"""
+
+        count = self.table_counts.get(tab, 0) + delta
+
+        if count:
+            self.table_counts[tab] = count
+        else:
+            self.table_counts.pop(tab, None)
+
+    # Dict access
+
+    def get(self, key, default=None):
+        """Returns value of key (row, col, tab) or default"""
+
+        return self._get_page(key).get(key, default)
+
+    @synchronized
+    def set(self, key, value):
+        """Stores value under key (row, col, tab)"""
+
+        row, col, tab = key
+        kind, code = self._encode(value)
+
+        cursor = self.connection.execute(
+            "UPDATE cells SET kind = ?, code = ? "
+            "WHERE tab = ? AND row = ? AND col = ?",
+            (kind, code, tab, row, col))
+
+        if not cursor.rowcount:
+            self.connection.execute(
+                "INSERT INTO cells VALUES (?, ?, ?, ?, ?)",
+                (tab, row, col, kind, code))
+            self._change_count(tab, 1)
+
+        page = self._get_cached_page(key)
+        if page is not None:
+            page[key] = value
+
+        self._count_write()
+
+    @synchronized
+    def pop(self, key, *args):
+        """Removes key and returns its value like dict.pop"""
+
+        page = self._get_page(key)
+
+        if key not in page:
+            if args:
+                return args[0]
+            raise KeyError(key)
+
+        row, col, tab = key
+        self.connection.execute(
+            "DELETE FROM cells WHERE tab = ? AND row = ? AND col = ?",
+            (tab, row, col))
+        self._change_count(tab, -1)
+        self._count_write()
+
+        return page.pop(key)
+
+    @synchronized
+    def clear(self):
+        """Removes all keys"""
+
+        self.connection.execute("DELETE FROM cells")
+        self.connection.commit()
+
+        self.pages.clear()
+        self.table_counts.clear()
+        self._writes = 0
+
+    def _iter_rows(self, columns, conditions=(), args=()):
+        """Generator of database rows in key order
+
+        Rows are fetched in batches so that keys may be changed while
+        iterating. The first three columns of each row are tab, row, col.
+
+        Parameters
+        ----------
+        columns: String
+        \tComma separated columns after tab, row, col, may be empty
+        conditions: Iterable of String, defaults to ()
+        \tSQL conditions that all rows fulfill
+        args: Iterable, defaults to ()
+        \tArguments of the conditions
+
+        """
+
+        query = "SELECT tab, row, col{columns} FROM cells WHERE {conditions}" \
+            "(tab > ? OR (tab = ? AND (row > ? OR (row = ? AND col > ?)))) " \
+            "ORDER BY tab, row, col LIMIT ?"
+        query = query.format(
+            columns=", " + columns if columns else "",
+            conditions="".join(condition + " AND "
+                               for condition in conditions))
+
+        args = list(args)
+        last = -1, -1, -1
+
+        while True:
+            tab, row, col = last
+
+            with self.lock:
+                cursor = self.connection.execute(
+                    query, args + [tab, tab, row, row, col, self.fetch_size])
+
+                rows = cursor.fetchall()
+
+            for db_row in rows:
+                yield db_row
+
+            if len(rows) < self.fetch_size:
+                return
+
+            last = rows[-1][:3]
+
+    def iteritems(self):
+        """Generator of (key, value) items in key order"""
+
+        for tab, row, col, kind, code in self._iter_rows("kind, code"):
+            yield (row, col, tab), self._decode(kind, code)
+
+    def iterkeys(self):
+        """Generator of keys in key order, values are not fetched"""
+
+        for tab, row, col in self._iter_rows(""):
+            yield row, col, tab
+
+    # ChunkIndex interface
+
+    def get_tables(self):
+        """Returns sorted list of tables that contain keys"""
+
+        return sorted(self.table_counts)
+
+    def get_keys(self, tab=None, top=0, left=0, bottom=INF, right=INF):
+        """Generator of keys in a region of one or all tables in key order
+
+        Parameters
+        ----------
+        tab: Integer, defaults to None
+        \tTable of the keys, all tables if None
+        top: Integer, defaults to 0
+        \tTop row of the region
+        left: Integer, defaults to 0
+        \tLeft column of the region
+        bottom: Integer, defaults to INF
+        \tBottom row of the region (inclusive)
+        right: Integer, defaults to INF
+        \tRight column of the region (inclusive)
+
+        """
+
+        conditions = ["row >= ?", "col >= ?"]
+        args = [top, left]
+
+        for condition, arg in [("tab = ?", tab), ("row <= ?", bottom),
+                               ("col <= ?", right)]:
+            if arg is not None and arg != INF:
+                conditions.append(condition)
+                args.append(arg)
+
+        for tab, row, col in self._iter_rows("", conditions, args):
+            yield row, col, tab
+
+    @synchronized
+    def get_first_index(self, tab, axis, first=0, last=INF, line=None,
+                        reverse=False):
+        """Returns first filled row or column in a range or None if empty
+
+        The query is answered from the primary key for rows and from the
+        column index for columns.
+
+        Parameters
+        ----------
+        tab: Integer
+        \tTable that is searched
+        axis: Integer in (0, 1)
+        \tRows are searched if 0, columns if 1
+        first: Integer, defaults to 0
+        \tFirst row or column of the range
+        last: Integer, defaults to INF
+        \tLast row or column of the range (inclusive)
+        line: Integer, defaults to None
+        \tColumn or row, to which the search is restricted, all if None
+        reverse: Bool, defaults to False
+        \tReturns the last filled row or column if True
+
+        """
+
+        index_column, line_column = ("row", "col") if axis == 0 else \
+            ("col", "row")
+
+        conditions = ["tab = ?", index_column + " >= ?"]
+        args = [tab, first]
+
+        if last != INF:
+            conditions.append(index_column + " <= ?")
+            args.append(last)
+
+        if line is not None:
+            conditions.append(line_column + " = ?")
+            args.append(line)
+
+        # Single MIN or MAX aggregates are answered by an index lookup
+        cursor = self.connection.execute(
+            "SELECT {function}({column}) FROM cells WHERE {conditions}".format(
+                function="MAX" if reverse else "MIN", column=index_column,
+                conditions=" AND ".join(conditions)), args)
+
+        return cursor.fetchone()[0]
+
+    @synchronized
+    def get_bbox(self, tab):
+        """Returns (bottom, right) of the keys of table tab or None if empty
+
+        Parameters
+        ----------
+        tab: Integer
+        \tTable that is inspected
+
+        """
+
+        if tab not in self.table_counts:
+            return
+
+        return self.get_first_index(tab, 0, reverse=True), \
+            self.get_first_index(tab, 1, reverse=True)
+
+# End of class DiskStore
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+occupancy
+=========
+
+Occupancy of the rows and columns of a table
+
+Provides
+--------
+
+ * Occupancy: Sorted filled rows, columns and cells of one table
+
+"""
+
+from bisect import bisect_left, bisect_right, insort
+
+
+class Occupancy(object):
+    """Sorted filled rows, columns and cells of one table
+
+    Each filled row has a sorted list of its filled columns and each
+    filled column has a sorted list of its filled rows. Lookups use
+    binary search.
+
+    Parameters
+    ----------
+    cells: Iterable of 2-tuples, defaults to ()
+    \tInitial (row, col) of filled cells
+
+    """
+
+    def __init__(self, cells=()):
+        # Maps filled row to sorted list of its filled columns
+        self.row_cells = {}
+
+        # Maps filled column to sorted list of its filled rows
+        self.col_cells = {}
+
+        for row, col in cells:
+            self.row_cells.setdefault(row, []).append(col)
+            self.col_cells.setdefault(col, []).append(row)
+
+        for cells in self.row_cells.itervalues():
+            cells.sort()
+
+        for cells in self.col_cells.itervalues():
+            cells.sort()
+
+        # Sorted filled rows and columns
+        self.rows = sorted(self.row_cells)
+        self.cols = sorted(self.col_cells)
+
+        # Number of filled cells
+        self.count = sum(len(cells) for cells in self.row_cells.itervalues())
+
+    def __len__(self):
+        return self.count
+
+    def add(self, row, col):
+        """Marks the cell (row, col), which must be empty, as filled"""
+
+        if row not in self.row_cells:
+            self.row_cells[row] = []
+            insort(self.rows, row)
+
+        if col not in self.col_cells:
+            self.col_cells[col] = []
+            insort(self.cols, col)
+
+        insort(self.row_cells[row], col)
+        insort(self.col_cells[col], row)
+
+        self.count += 1
+
+    @staticmethod
+    def _remove(cells, index, lines, line):
+        """Removes index from sorted cells of line
+
+        Returns True if line has become empty, which is then removed from
+        the sorted lines.
+
+        """
+
+        del cells[bisect_left(cells, index)]
+
+        if not cells:
+            del lines[bisect_left(lines, line)]
+            return True
+
+        return False
+
+    def remove(self, row, col):
+        """Marks the cell (row, col), which must be filled, as empty"""
+
+        if self._remove(self.row_cells[row], col, self.rows, row):
+            del self.row_cells[row]
+
+        if self._remove(self.col_cells[col], row, self.cols, col):
+            del self.col_cells[col]
+
+        self.count -= 1
+
+    def get_bbox(self):
+        """Returns (top, left, bottom, right) of filled cells or None"""
+
+        if self.count:
+            return self.rows[0], self.cols[0], self.rows[-1], self.cols[-1]
+
+    def get_row_count(self, row):
+        """Returns number of filled cells in row"""
+
+        return len(self.row_cells.get(row, ()))
+
+    def get_col_count(self, col):
+        """Returns number of filled cells in col"""
+
+        return len(self.col_cells.get(col, ()))
+
+    @staticmethod
+    def _get_next(cells, index, reverse):
+        """Returns next element of sorted cells after index or None"""
+
+        if reverse:
+            i = bisect_left(cells, index) - 1
+            if i >= 0:
+                return cells[i]
+
+        else:
+            i = bisect_right(cells, index)
+            if i < len(cells):
+                return cells[i]
+
+    def get_next_in_row(self, row, col, reverse=False):
+        """Returns column of next filled cell in row right of col or None
+
+        Parameters
+        ----------
+        row: Integer
+        \tRow that is searched
+        col: Integer
+        \tColumn, behind which the search starts
+        reverse: Bool, defaults to False
+        \tSearch to the left if True
+
+        """
+
+        return self._get_next(self.row_cells.get(row, ()), col, reverse)
+
+    def get_next_in_col(self, col, row, reverse=False):
+        """Returns row of next filled cell in col below row or None
+
+        Parameters
+        ----------
+        col: Integer
+        \tColumn that is searched
+        row: Integer
+        \tRow, behind which the search starts
+        reverse: Bool, defaults to False
+        \tSearch upwards if True
+
+        """
+
+        return self._get_next(self.col_cells.get(col, ()), row, reverse)
+
+    def get_next_row(self, row, reverse=False):
+        """Returns next filled row below row or None, above if reverse"""
+
+        return self._get_next(self.rows, row, reverse)
+
+    def get_next_col(self, col, reverse=False):
+        """Returns next filled column right of col or None, left if reverse"""
+
+        return self._get_next(self.cols, col, reverse)
+
+    def iter_cells(self):
+        """Generator of (row, col) of filled cells in row major order"""
+
+        for row in self.rows:
+            for col in self.row_cells[row]:
+                yield row, col
+
+# End of class Occupancy
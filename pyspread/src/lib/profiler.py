@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+profiler
+========
+
+Per cell evaluation profiling
+
+Provides
+--------
+
+ * EvalProfiler: Records evaluation times and cache hits per cell
+
+"""
+
+import csv
+import threading
+from timeit import default_timer
+
+
+class EvalProfiler(object):
+    """Records evaluation wall time, evaluations and cache hits per cell
+
+    Cache misses are the evaluations of a cell. The total time of a cell
+    includes the evaluation of cells that it reads. The self time excludes
+    it.
+
+    """
+
+    report_header = ["Row", "Column", "Table", "Calls", "Hits", "Misses",
+                     "Total time", "Self time"]
+
+    def __init__(self):
+        # Maps key to [hits, misses, total time, self time]
+        self.stats = {}
+
+        # Thread local stack of [start time, time of nested evaluations]
+        # of running evaluations, see _running
+        self._local = threading.local()
+
+    def _get_entry(self, key):
+        """Returns stats entry of key and creates it if it is missing"""
+
+        try:
+            return self.stats[key]
+
+        except KeyError:
+            entry = self.stats[key] = [0, 0, 0.0, 0.0]
+            return entry
+
+    def _get_running(self):
+        """Returns stack of running evaluations of the current thread"""
+
+        try:
+            return self._local.running
+
+        except AttributeError:
+            self._local.running = []
+            return self._local.running
+
+    _running = property(_get_running)
+
+    def add_hit(self, key):
+        """Records a cache hit of key"""
+
+        self._get_entry(key)[0] += 1
+
+    def start(self):
+        """Records the start of an evaluation"""
+
+        self._running.append([default_timer(), 0.0])
+
+    def stop(self, key):
+        """Records the end of the evaluation of key that has been started last
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of the cell that has been evaluated
+
+        """
+
+        running = self._running
+
+        start_time, nested_time = running.pop()
+        elapsed = default_timer() - start_time
+
+        entry = self._get_entry(key)
+        entry[1] += 1
+        entry[2] += elapsed
+        entry[3] += elapsed - nested_time
+
+        if running:
+            running[-1][1] += elapsed
+
+    def clear(self):
+        """Removes all records"""
+
+        self.stats.clear()
+
+    def get_report(self):
+        """Returns list of (key, calls, hits, misses, total time, self time)
+
+        The list is sorted by descending total time.
+
+        """
+
+        report = [(key, hits + misses, hits, misses, total_time, self_time)
+                  for key, (hits, misses, total_time, self_time)
+                  in self.stats.iteritems()]
+
+        report.sort(key=lambda row: row[4], reverse=True)
+
+        return report
+
+    def write_csv(self, csvfile):
+        """Writes report with header to file-like object csvfile"""
+
+        writer = csv.writer(csvfile)
+        writer.writerow(self.report_header)
+
+        for key, calls, hits, misses, total_time, self_time in \
+                self.get_report():
+            writer.writerow(list(key) + [calls, hits, misses,
+                                         repr(total_time), repr(self_time)])
+
+# End of class EvalProfiler
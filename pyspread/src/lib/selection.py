@@ -27,7 +27,84 @@ Grid selection representation
 
 """
 
-from itertools import izip
+from bisect import bisect_right
+from itertools import islice, izip
+
+INF = float("inf")
+
+
+class CompiledSelection(object):
+    """Frozen form of a selection with hashed membership tests
+
+    Rows, columns and cells are stored in sets. Blocks are sorted by their
+    top row, so that only blocks that start above a cell are tested.
+
+    Parameters
+    ----------
+    parameters: 5-tuple of List
+    \tblock_tl, block_br, rows, cols and cells of the compiled selection
+
+    """
+
+    def __init__(self, parameters):
+        # The lists are referenced, so that their ids remain unique
+        self.parameters = parameters
+        self.lengths = map(len, parameters)
+
+        block_tl, block_br, rows, cols, cells = parameters
+
+        blocks = []
+        for (top, left), (bottom, right) in izip(block_tl, block_br):
+            # None boundaries are open, see Selection.__contains__
+            blocks.append((0 if top is None else top,
+                           INF if bottom is None else bottom,
+                           0 if left is None else left,
+                           INF if right is None else right))
+        blocks.sort()
+
+        self.blocks = blocks
+        self.block_tops = [block[0] for block in blocks]
+
+        self.rows = frozenset(rows)
+        self.cols = frozenset(cols)
+        self.cells = frozenset(tuple(cell) if isinstance(cell, list) else cell
+                               for cell in cells)
+
+    def is_valid(self, parameters):
+        """Returns False if the selection parameters have been changed
+
+        Parameters
+        ----------
+        parameters: 5-tuple of List
+        \tCurrent parameters of the selection
+
+        """
+
+        for old, new, length in izip(self.parameters, parameters,
+                                     self.lengths):
+            if old is not new or len(new) != length:
+                return False
+
+        return True
+
+    def __contains__(self, cell):
+        """Returns True iif cell is in the compiled selection"""
+
+        cell_row, cell_col = cell
+
+        if cell_row in self.rows or cell_col in self.cols or \
+           tuple(cell) in self.cells:
+            return True
+
+        no_blocks = bisect_right(self.block_tops, cell_row)
+
+        for __, bottom, left, right in islice(self.blocks, no_blocks):
+            if cell_row <= bottom and left <= cell_col <= right:
+                return True
+
+        return False
+
+# End of class CompiledSelection
 
 
 class Selection(object):
@@ -56,6 +133,17 @@ class Selection(object):
         self.cols = cols
         self.cells = cells
 
+        # CompiledSelection for __contains__, created on demand
+        self._compiled = None
+
+    def __getstate__(self):
+        """Returns state for pickling and copying without compiled form"""
+
+        state = self.__dict__.copy()
+        state["_compiled"] = None
+
+        return state
+
     def __nonzero__(self):
         """Returns True iif any attribute is non-empty"""
 
@@ -83,6 +171,10 @@ class Selection(object):
     def __contains__(self, cell):
         """Returns True iif cell is in selection
 
+        Membership is tested with a compiled form of the selection, which
+        is rebuilt if the selection parameters have been replaced or if
+        elements have been added or removed.
+
         Parameters
         ----------
 
@@ -93,38 +185,18 @@ class Selection(object):
 
         assert len(cell) == 2
 
-        cell_row, cell_col = cell
+        return cell in self.get_compiled()
 
-        # Block selections
-        for top_left, bottom_right in izip(self.block_tl, self.block_br):
-            top, left = top_left
-            bottom, right = bottom_right
-
-            if top is None:
-                top = 0
+    def get_compiled(self):
+        """Returns CompiledSelection of self, which is cached until changed"""
 
-            if left is None:
-                left = 0
+        parameters = self.parameters
+        compiled = getattr(self, "_compiled", None)
 
-            if bottom is None:
-                bottom = cell_row
+        if compiled is None or not compiled.is_valid(parameters):
+            compiled = self._compiled = CompiledSelection(parameters)
 
-            if right is None:
-                right = cell_col
-
-            if top <= cell_row <= bottom and left <= cell_col <= right:
-                return True
-
-        # Row and column selections
-
-        if cell_row in self.rows or cell_col in self.cols:
-            return True
-
-        # Cell selections
-        if cell in self.cells:
-            return True
-
-        return False
+        return compiled
 
     def __add__(self, value):
         """Shifts selection down and / or right
@@ -166,8 +238,46 @@ class Selection(object):
 
         return Selection(block_tl, block_br, rows, cols, cells)
 
-    def __and__(self, other):
-        """Returns intersection selection of self and other"""
+    def get_rects(self):
+        """Returns list of (top, left, bottom, right) of all primitives
+
+        Blocks, rows, columns and cells are returned in this order as
+        closed rectangles. Open boundaries are 0 or INF.
+
+        """
+
+        rects = []
+
+        for (top, left), (bottom, right) in izip(self.block_tl, self.block_br):
+            # None boundaries are open, see Selection.__contains__
+            rect = (0 if top is None else top,
+                    0 if left is None else left,
+                    INF if bottom is None else bottom,
+                    INF if right is None else right)
+
+            if rect[0] <= rect[2] and rect[1] <= rect[3]:
+                rects.append(rect)
+
+        rects += [(row, 0, row, INF) for row in self.rows]
+        rects += [(0, col, INF, col) for col in self.cols]
+        rects += [(row, col, row, col) for row, col in self.cells]
+
+        return rects
+
+    @classmethod
+    def from_rects(cls, rects):
+        """Returns Selection that consists of closed rectangles
+
+        Rectangles that cover a single cell, a whole row or a whole column
+        become cells, rows and columns. Duplicates are omitted.
+
+        Parameters
+        ----------
+
+        rects: Iterable of 4-tuples
+        \tRectangles (top, left, bottom, right), open boundaries are 0 or INF
+
+        """
 
         block_tl = []
         block_br = []
@@ -175,69 +285,143 @@ class Selection(object):
         cols = []
         cells = []
 
-        # Blocks
-        # Check cells in block: If all are in other, add block else add cells
+        seen = set()
 
-        for block in zip(self.block_tl, self.block_br):
-            if block[0] in other.block_tl and block[1] in other.block_br:
-                block_tl.append(block[0])
-                block_br.append(block[1])
-            else:
-                block_cells = []
-                for row in xrange(block[0][0], block[1][0] + 1):
-                    for col in xrange(block[0][1], block[1][1] + 1):
-                        cell = row, col
-                        if cell in other:
-                            block_cells.append(cell)
-
-                if len(block_cells) == (block[1][0] + 1 - block[0][0]) * \
-                                       (block[1][1] + 1 - block[0][1]):
-                    block_tl.append(block[0])
-                    block_br.append(block[1])
-                else:
-                    cells.extend(block_cells)
-
-        # Rows
-        # If a row/col is selected in self and other then add it.
-        # Otherwise, add all cells in the respective row/col that are in other.
+        for rect in rects:
+            if rect in seen:
+                continue
+            seen.add(rect)
 
-        for row in self.rows:
-            if row in other.rows:
-                rows.append(row)
+            top, left, bottom, right = rect
+
+            if top == bottom and left == right:
+                cells.append((top, left))
+            elif top == bottom and left == 0 and right == INF:
+                rows.append(top)
+            elif left == right and top == 0 and bottom == INF:
+                cols.append(left)
             else:
-                for block in zip(other.block_tl, other.block_br):
-                    if block[0][0] <= row <= block[1][0]:
-                        block_tl.append((row, block[0][1]))
-                        block_br.append((row, block[1][1]))
+                block_tl.append((top, left))
+                block_br.append((None if bottom == INF else bottom,
+                                 None if right == INF else right))
 
-                for cell in other.cells:
-                    if cell[0] == row and cell not in cells:
-                        cells.append(cell)
+        return cls(block_tl, block_br, rows, cols, cells)
 
-        # Columns
+    def __and__(self, other):
+        """Returns intersection selection of self and other
 
-        for col in self.cols:
-            if col in other.cols:
-                cols.append(col)
-            else:
-                for block in zip(other.block_tl, other.block_br):
-                    if block[0][1] <= col <= block[1][1]:
-                        block_tl.append((block[0][0], col))
-                        block_br.append((block[1][0], col))
+        The primitives of both selections are intersected pairwise, i. e.
+        the cost does not depend on the number of selected cells.
 
-                for cell in other.cells:
-                    if cell[1] == col and cell not in cells:
-                        cells.append(cell)
+        """
 
-        # Cells
+        other_rects = other.get_rects()
 
-        for cell in self.cells:
-            if cell in other and cell not in cells:
-                cells.append(cell)
+        rects = []
 
-        cells = list(set(cells))
+        for top, left, bottom, right in self.get_rects():
+            for o_top, o_left, o_bottom, o_right in other_rects:
+                rect = (max(top, o_top), max(left, o_left),
+                        min(bottom, o_bottom), min(right, o_right))
 
-        return Selection(block_tl, block_br, rows, cols, cells)
+                if rect[0] <= rect[2] and rect[1] <= rect[3]:
+                    rects.append(rect)
+
+        return self.from_rects(rects)
+
+    def __or__(self, other):
+        """Returns union selection of self and other"""
+
+        return self.from_rects(self.get_rects() + other.get_rects())
+
+    def __sub__(self, other):
+        """Returns selection of cells that are in self but not in other
+
+        Each rectangle of self is split into at most four rectangles that
+        remain when a rectangle of other is cut out.
+
+        """
+
+        rects = self.get_rects()
+
+        for o_top, o_left, o_bottom, o_right in other.get_rects():
+            remaining = []
+
+            for rect in rects:
+                top, left, bottom, right = rect
+
+                if o_top > bottom or o_bottom < top or \
+                   o_left > right or o_right < left:
+                    # Disjoint
+                    remaining.append(rect)
+                    continue
+
+                if top < o_top:
+                    remaining.append((top, left, o_top - 1, right))
+                if o_bottom < bottom:
+                    remaining.append((o_bottom + 1, left, bottom, right))
+
+                mid_top = max(top, o_top)
+                mid_bottom = min(bottom, o_bottom)
+
+                if left < o_left:
+                    remaining.append((mid_top, left, mid_bottom, o_left - 1))
+                if o_right < right:
+                    remaining.append((mid_top, o_right + 1, mid_bottom, right))
+
+            rects = remaining
+
+        return self.from_rects(rects)
+
+    def get_cell_count(self, shape=None):
+        """Returns number of distinct cells in selection
+
+        Overlapping primitives are counted once. The count is computed by
+        sweeping over the column boundaries of the rectangles.
+
+        Parameters
+        ----------
+
+        shape: 3-tuple of Integer, defaults to None
+        \tGrid shape that limits open boundaries, INF may be returned if None
+
+        """
+
+        rects = self.get_rects()
+
+        if shape is not None:
+            max_row, max_col = shape[0] - 1, shape[1] - 1
+            rects = [(top, left, min(bottom, max_row), min(right, max_col))
+                     for top, left, bottom, right in rects
+                     if top <= max_row and left <= max_col]
+
+        if not rects:
+            return 0
+
+        if any(INF in (bottom, right) for __, __, bottom, right in rects):
+            return INF
+
+        xs = sorted(set([left for __, left, __, __ in rects] +
+                        [right + 1 for __, __, __, right in rects]))
+
+        count = 0
+
+        for x_start, x_stop in izip(xs, xs[1:]):
+            intervals = sorted((top, bottom)
+                               for top, left, bottom, right in rects
+                               if left <= x_start and right >= x_stop - 1)
+
+            height = 0
+            last = -1
+
+            for top, bottom in intervals:
+                if bottom > last:
+                    height += bottom - max(top, last + 1) + 1
+                    last = bottom
+
+            count += height * (x_stop - x_start)
+
+        return count
 
     # Parameter access
 
@@ -315,7 +499,7 @@ class Selection(object):
                 bb_left = left
             if bb_bottom is None or bb_bottom < bottom:
                 bb_bottom = bottom
-            if bb_right is None or bb_right > right:
+            if bb_right is None or bb_right < right:
                 bb_right = right
 
         # Row and column selections
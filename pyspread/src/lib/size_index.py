@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+size_index
+==========
+
+Prefix sums of row heights and column widths
+
+Provides
+--------
+
+ * SizeIndex: Fenwick trees of the sizes of rows or columns
+
+"""
+
+
+class SizeIndex(object):
+    """Fenwick trees of the sizes of rows or columns that have a size
+
+    Rows or columns without size have a default size that is passed to the
+    queries. Therefore, sizes are summed together with their number.
+    Sums of index ranges take O(log n) time. The trees are built on the
+    first query and updated when sizes change.
+
+    Parameters
+    ----------
+    sizes: Dict, defaults to None
+    \tMaps row or column index to its size
+
+    """
+
+    def __init__(self, sizes=None):
+        # Maps index to size
+        self.sizes = {}
+
+        if sizes is not None:
+            self.sizes.update(sizes)
+
+        # Fenwick trees of sizes and of their number, None if outdated
+        self._sums = None
+        self._counts = None
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def _build(self):
+        """Builds the Fenwick trees in O(n)"""
+
+        length = max(self.sizes) + 1 if self.sizes else 0
+
+        sums = [0.0] * (length + 1)
+        counts = [0] * (length + 1)
+
+        for index, size in self.sizes.iteritems():
+            sums[index + 1] = size
+            counts[index + 1] = 1
+
+        for i in xrange(1, length + 1):
+            parent = i + (i & -i)
+            if parent <= length:
+                sums[parent] += sums[i]
+                counts[parent] += counts[i]
+
+        self._sums = sums
+        self._counts = counts
+
+    def _add(self, index, size, count):
+        """Adds size and count to the trees at index"""
+
+        sums = self._sums
+        counts = self._counts
+        length = len(sums) - 1
+
+        i = index + 1
+        while i <= length:
+            sums[i] += size
+            counts[i] += count
+            i += i & -i
+
+    def _get_prefix(self, index):
+        """Returns (sum, number) of the sizes of all indices < index"""
+
+        if self._sums is None:
+            self._build()
+
+        sums = self._sums
+        counts = self._counts
+
+        total = 0.0
+        count = 0
+
+        i = min(index, len(sums) - 1)
+        while i > 0:
+            total += sums[i]
+            count += counts[i]
+            i -= i & -i
+
+        return total, count
+
+    def get(self, index, default=None):
+        """Returns size of index or default"""
+
+        return self.sizes.get(index, default)
+
+    def set(self, index, size):
+        """Sets size of index, None removes the size
+
+        Parameters
+        ----------
+        index: Integer >= 0
+        \tRow or column
+        size: Number or None
+        \tNew size
+
+        """
+
+        old_size = self.sizes.pop(index, None)
+
+        if size is not None:
+            self.sizes[index] = size
+
+        if self._sums is None:
+            return
+
+        if index >= len(self._sums) - 1:
+            # The trees are too short and are rebuilt on the next query
+            self._sums = self._counts = None
+            return
+
+        if old_size is not None:
+            self._add(index, -old_size, -1)
+
+        if size is not None:
+            self._add(index, size, 1)
+
+    def get_sum(self, first, last, default):
+        """Returns sum of the sizes of all indices first <= index < last
+
+        Parameters
+        ----------
+        first: Integer >= 0
+        \tFirst index of the range
+        last: Integer >= 0
+        \tIndex after the range
+        default: Number
+        \tSize of indices without size
+
+        """
+
+        if last <= first:
+            return 0
+
+        last_sum, last_count = self._get_prefix(last)
+        first_sum, first_count = self._get_prefix(first)
+
+        default_count = last - first - last_count + first_count
+
+        return last_sum - first_sum + default_count * default
+
+# End of class SizeIndex
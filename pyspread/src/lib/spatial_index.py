@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+spatial_index
+=============
+
+Indices for finding the selections that contain a cell
+
+Provides
+--------
+
+ * get_bounds: Returns the bounding box of a selection
+ * IntervalTree: Static interval tree of closed intervals
+ * SelectionIndex: Finds all selections of a list that contain a cell
+
+"""
+
+from itertools import izip
+
+INF = float("inf")
+
+
+def get_bounds(selection):
+    """Returns (top, left, bottom, right) of cells that selection contains
+
+    Unlike Selection.get_bbox, open boundaries of blocks, rows and
+    columns are 0 or INF. Returns None for an empty selection.
+
+    Parameters
+    ----------
+    selection: Selection
+    \tSelection, for which the bounds are returned
+
+    """
+
+    tops, lefts, bottoms, rights = [], [], [], []
+
+    for (top, left), (bottom, right) in izip(selection.block_tl,
+                                             selection.block_br):
+        tops.append(0 if top is None else top)
+        lefts.append(0 if left is None else left)
+        bottoms.append(INF if bottom is None else bottom)
+        rights.append(INF if right is None else right)
+
+    if selection.rows:
+        tops.append(min(selection.rows))
+        bottoms.append(max(selection.rows))
+        lefts.append(0)
+        rights.append(INF)
+
+    if selection.cols:
+        lefts.append(min(selection.cols))
+        rights.append(max(selection.cols))
+        tops.append(0)
+        bottoms.append(INF)
+
+    for row, col in selection.cells:
+        tops.append(row)
+        bottoms.append(row)
+        lefts.append(col)
+        rights.append(col)
+
+    if not tops:
+        return
+
+    return min(tops), min(lefts), max(bottoms), max(rights)
+
+
+class IntervalTree(object):
+    """Static centered interval tree of closed intervals
+
+    Parameters
+    ----------
+    intervals: Iterable of 3-tuples
+    \tIntervals (low, high, value), where low <= high
+
+    """
+
+    def __init__(self, intervals):
+        self._root = self._build(list(intervals))
+
+    def _build(self, intervals):
+        """Returns root node of tree for intervals or None if empty
+
+        A node is a list [center, intervals sorted by ascending low,
+        intervals sorted by descending high, left node, right node].
+
+        """
+
+        if not intervals:
+            return None
+
+        lows = sorted(low for low, __, __ in intervals)
+        center = lows[len(lows) // 2]
+
+        left = []
+        right = []
+        overlapping = []
+
+        for interval in intervals:
+            low, high, __ = interval
+            if high < center:
+                left.append(interval)
+            elif low > center:
+                right.append(interval)
+            else:
+                overlapping.append(interval)
+
+        by_low = sorted(overlapping, key=lambda interval: interval[0])
+        by_high = sorted(overlapping, key=lambda interval: interval[1],
+                         reverse=True)
+
+        return [center, by_low, by_high, self._build(left),
+                self._build(right)]
+
+    def find(self, point):
+        """Generator of values of all intervals that contain point"""
+
+        node = self._root
+
+        while node is not None:
+            center, by_low, by_high, left, right = node
+
+            if point < center:
+                for low, __, value in by_low:
+                    if low > point:
+                        break
+                    yield value
+                node = left
+
+            elif point > center:
+                for __, high, value in by_high:
+                    if high < point:
+                        break
+                    yield value
+                node = right
+
+            else:
+                for __, __, value in by_low:
+                    yield value
+                return
+
+# End of class IntervalTree
+
+
+class SelectionIndex(object):
+    """Finds all selections of a list that contain a cell
+
+    Rows, columns and single cells are hashed. Blocks are stored in an
+    interval tree over their rows. A lookup only visits the blocks that
+    cover the row of the cell and the blocks that have been appended since
+    the tree has been built. The tree is rebuilt when too many blocks have
+    been appended.
+
+    The index does not track changes of the selections.
+
+    Parameters
+    ----------
+    selections: Iterable of Selection, defaults to ()
+    \tSelections in the order of their precedence
+
+    """
+
+    # Blocks with at most this many cells are checked cell by cell
+    max_cell_checks = 256
+
+    def __init__(self, selections=()):
+        self.rows = {}
+        self.cols = {}
+        self.cells = {}
+
+        # Number of indexed selections
+        self.length = 0
+
+        # Intervals (top, bottom, (top, bottom, left, right, index)) of blocks
+        self._blocks = []
+        self._unindexed_blocks = []
+
+        for selection in selections:
+            self.append(selection)
+
+        self._build_tree()
+
+    def _build_tree(self):
+        """Builds interval tree of all blocks"""
+
+        self._tree = IntervalTree(self._blocks)
+        self._unindexed_blocks = []
+
+    def append(self, selection):
+        """Adds selection with the highest precedence to the index"""
+
+        i = self.length
+        self.length += 1
+
+        for (top, left), (bottom, right) in izip(selection.block_tl,
+                                                 selection.block_br):
+            # None boundaries are open, see Selection.__contains__
+            if top is None:
+                top = 0
+            if left is None:
+                left = 0
+            if bottom is None:
+                bottom = INF
+            if right is None:
+                right = INF
+
+            if top <= bottom and left <= right:
+                block = top, bottom, (top, bottom, left, right, i)
+                self._blocks.append(block)
+                self._unindexed_blocks.append(block)
+
+        for row in selection.rows:
+            self.rows.setdefault(row, []).append(i)
+
+        for col in selection.cols:
+            self.cols.setdefault(col, []).append(i)
+
+        for cell in selection.cells:
+            self.cells.setdefault(tuple(cell), []).append(i)
+
+    def _find_blocks(self, row):
+        """Generator of (top, bottom, left, right, index) of blocks in row"""
+
+        if len(self._unindexed_blocks) > max(64, len(self._blocks) // 8):
+            self._build_tree()
+
+        for top, bottom, block in self._unindexed_blocks:
+            if top <= row <= bottom:
+                yield block
+
+        for block in self._tree.find(row):
+            yield block
+
+    def get_indices(self, row, col):
+        """Returns sorted list of indices of selections that contain cell
+
+        Parameters
+        ----------
+        row: Integer
+        \tRow of the cell
+        col: Integer
+        \tColumn of the cell
+
+        """
+
+        indices = set(i for __, __, left, right, i in self._find_blocks(row)
+                      if left <= col <= right)
+
+        indices.update(self.rows.get(row, ()))
+        indices.update(self.cols.get(col, ()))
+        indices.update(self.cells.get((row, col), ()))
+
+        return sorted(indices)
+
+    def _contains_cell(self, row, col):
+        """Returns True if any indexed selection contains the cell"""
+
+        if (row, col) in self.cells or row in self.rows or col in self.cols:
+            return True
+
+        return any(left <= col <= right
+                   for __, __, left, right, __ in self._find_blocks(row))
+
+    def _contains_block(self, top, left, bottom, right):
+        """Returns True if the indexed selections contain the block"""
+
+        if bottom != INF and right != INF and \
+           (bottom - top + 1) * (right - left + 1) <= self.max_cell_checks:
+            return all(self._contains_cell(row, col)
+                       for row in xrange(top, bottom + 1)
+                       for col in xrange(left, right + 1))
+
+        for __, block_bottom, block_left, block_right, __ in \
+                self._find_blocks(top):
+            if block_bottom >= bottom and block_left <= left and \
+               block_right >= right:
+                return True
+
+        if bottom != INF and bottom - top < self.max_cell_checks and \
+           all(row in self.rows for row in xrange(top, bottom + 1)):
+            return True
+
+        if right != INF and right - left < self.max_cell_checks and \
+           all(col in self.cols for col in xrange(left, right + 1)):
+            return True
+
+        return False
+
+    def contains(self, selection):
+        """Returns True if the indexed selections cover all cells of selection
+
+        The result may be False for selections that are covered by a
+        complex union of large blocks, i. e. True is always correct.
+
+        Parameters
+        ----------
+        selection: Selection
+        \tSelection that is tested
+
+        """
+
+        for (top, left), (bottom, right) in izip(selection.block_tl,
+                                                 selection.block_br):
+            if top is None:
+                top = 0
+            if left is None:
+                left = 0
+            if bottom is None:
+                bottom = INF
+            if right is None:
+                right = INF
+
+            if top <= bottom and left <= right and \
+               not self._contains_block(top, left, bottom, right):
+                return False
+
+        for row in selection.rows:
+            if row not in self.rows and \
+               not self._contains_block(row, 0, row, INF):
+                return False
+
+        for col in selection.cols:
+            if col not in self.cols and \
+               not self._contains_block(0, col, INF, col):
+                return False
+
+        return all(self._contains_cell(row, col)
+                   for row, col in selection.cells)
+
+# End of class SelectionIndex
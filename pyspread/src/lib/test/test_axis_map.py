@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+test_axis_map
+=============
+
+Unit tests for axis_map.py
+
+"""
+
+import os
+import random
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.axis_map import AxisMap, INF
+
+
+class TestAxisMap(object):
+    """Unit tests for AxisMap"""
+
+    def setup_method(self, method):
+        self.axis_map = AxisMap(10)
+
+    def get_physicals(self, length=12):
+        """Returns physical indices of the first length logical indices"""
+
+        return map(self.axis_map.get_physical, xrange(length))
+
+    def test_identity(self):
+        """New map does not change indices"""
+
+        assert self.get_physicals() == range(12)
+        assert self.axis_map.get_physical(-3) == -3
+        assert self.axis_map.get_logical(11) == 11
+
+    param_test_insert = [
+        {'point': 0, 'number': 2,
+         'res': [10, 11, 0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 12, 13]},
+        {'point': 3, 'number': 1,
+         'res': [0, 1, 2, 10, 3, 4, 5, 6, 7, 8, 9, 11, 12, 13]},
+        {'point': 10, 'number': 2,
+         'res': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13]},
+    ]
+
+    @params(param_test_insert)
+    def test_insert(self, point, number, res):
+        """Unit test for insert"""
+
+        self.axis_map.insert(point, number)
+
+        assert self.get_physicals(14) == res
+        assert [self.axis_map.get_logical(i) for i in res] == range(14)
+
+    param_test_delete = [
+        {'point': 0, 'number': 2, 'res': [2, 3, 4, 5, 6, 7, 8, 9, 10, 11]},
+        {'point': 8, 'number': 5, 'res': [0, 1, 2, 3, 4, 5, 6, 7, 10, 11]},
+    ]
+
+    @params(param_test_delete)
+    def test_delete(self, point, number, res):
+        """Unit test for delete"""
+
+        self.axis_map.delete(point, number)
+
+        assert self.get_physicals(10) == res
+
+    def test_permute(self):
+        """Unit test for permute"""
+
+        self.axis_map.insert(1, 1)
+        self.axis_map.permute([2, 1, 0])
+
+        assert self.get_physicals(5) == [1, 10, 0, 2, 3]
+        assert self.axis_map.get_logical(10) == 1
+
+    param_test_get_physical_ranges = [
+        {'first': 0, 'last': INF,
+         'res': [(0, 0), (10, 10), (1, 9), (11, INF)]},
+        {'first': 1, 'last': 1, 'res': [(10, 10)]},
+        {'first': 5, 'last': 12, 'res': [(4, 9), (11, 12)]},
+    ]
+
+    @params(param_test_get_physical_ranges)
+    def test_get_physical_ranges(self, first, last, res):
+        """Unit test for get_physical_ranges"""
+
+        self.axis_map.insert(1, 1)
+
+        assert self.axis_map.get_physical_ranges(first, last) == res
+
+    def test_random_edits(self):
+        """Map matches a list of physical indices after random edits"""
+
+        rnd = random.Random(7)
+        physicals = range(10)
+        free = 10
+
+        for __ in xrange(200):
+            point = rnd.randint(0, len(physicals))
+            number = rnd.randint(1, 3)
+
+            if rnd.random() < 0.5:
+                self.axis_map.insert(point, number)
+                physicals[point:point] = range(free, free + number)
+                free += number
+
+            elif len(physicals) > number:
+                self.axis_map.delete(point, number)
+                del physicals[point:point + number]
+
+            assert self.get_physicals(len(physicals)) == physicals
+
+        copied_map = self.axis_map.copy()
+        assert map(copied_map.get_physical, xrange(len(physicals))) == \
+            physicals
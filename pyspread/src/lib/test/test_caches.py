@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+
+"""
+test_caches
+===========
+
+Unit tests for caches.py
+
+"""
+
+import os
+import sys
+
+import py.test as pytest
+import numpy
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+from src.lib.caches import LRUCache, MemoryCache, get_cache_key
+from src.lib.caches import is_range_key, get_size
+
+
+class TestLRUCache(object):
+    """Unit tests for LRUCache"""
+
+    def setup_method(self, method):
+        """Creates LRUCache with 2 entries"""
+
+        self.cache = LRUCache(maxsize=2)
+        self.cache["a"] = 1
+        self.cache["b"] = 2
+
+    def test_getitem(self):
+        """Unit test for __getitem__"""
+
+        assert self.cache["a"] == 1
+
+        with pytest.raises(KeyError):
+            self.cache["c"]
+
+        assert self.cache.hits == 1
+        assert self.cache.misses == 1
+
+    def test_setitem(self):
+        """Least recently used entries are discarded"""
+
+        self.cache["a"]
+        self.cache["c"] = 3
+
+        assert len(self.cache) == 2
+        assert "a" in self.cache
+        assert "b" not in self.cache
+        assert "c" in self.cache
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        self.cache["a"]
+        self.cache.clear()
+
+        assert len(self.cache) == 0
+        assert self.cache.hits == 0
+
+
+param_get_cache_key = [
+    {'key': (1, 2, 3), 'res': (1, 2, 3)},
+    {'key': [1, 2, 3], 'res': (1, 2, 3)},
+    {'key': (slice(1, 5), 2, 3), 'res': ((1, 5, None), 2, 3)},
+    {'key': (slice(None), 2, slice(0, 3, 2)),
+     'res': ((None, None, None), 2, (0, 3, 2))},
+]
+
+
+@params(param_get_cache_key)
+def test_get_cache_key(key, res):
+    """Unit test for get_cache_key and is_range_key"""
+
+    cache_key = get_cache_key(key)
+
+    assert cache_key == res
+    assert hash(cache_key) is not None
+    assert is_range_key(cache_key) == (cache_key != tuple(key))
+
+
+def test_get_size():
+    """Unit test for get_size"""
+
+    array = numpy.zeros(1000)
+
+    assert get_size(array) >= array.nbytes
+    assert get_size(1) == sys.getsizeof(1)
+
+
+class TestMemoryCache(object):
+    """Unit tests for MemoryCache"""
+
+    def setup_method(self, method):
+        """Creates MemoryCache with budget for two 1000 float arrays"""
+
+        self.size = get_size(numpy.zeros(1000))
+        self.cache = MemoryCache(maxbytes=2 * self.size)
+        self.cache[(0, 0, 0)] = numpy.zeros(1000)
+        self.cache[(1, 0, 0)] = numpy.ones(1000)
+
+    def test_getitem(self):
+        """Unit test for __getitem__"""
+
+        assert self.cache[(1, 0, 0)][0] == 1
+
+        with pytest.raises(KeyError):
+            self.cache[(2, 0, 0)]
+
+        stats = self.cache.get_stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 2
+        assert stats["bytes"] == 2 * self.size
+
+    def test_setitem(self):
+        """Least recently used entries are discarded if budget is exceeded"""
+
+        self.cache[(0, 0, 0)]
+        self.cache[(2, 0, 0)] = numpy.zeros(1000)
+
+        assert (0, 0, 0) in self.cache
+        assert (1, 0, 0) not in self.cache
+        assert self.cache.evictions == 1
+        assert self.cache.bytes == 2 * self.size
+
+        # Values that exceed the budget are not stored
+        self.cache[(3, 0, 0)] = numpy.zeros(3000)
+
+        assert (3, 0, 0) not in self.cache
+        assert len(self.cache) == 2
+
+    def test_pop(self):
+        """Unit test for pop"""
+
+        assert self.cache.pop((0, 0, 0))[0] == 0
+        assert self.cache.pop((0, 0, 0), None) is None
+        assert self.cache.bytes == self.size
+
+        with pytest.raises(KeyError):
+            self.cache.pop((0, 0, 0))
+
+    def test_clear(self):
+        """Clear removes entries but keeps statistics"""
+
+        self.cache[(0, 0, 0)]
+        self.cache.clear()
+
+        assert len(self.cache) == 0
+        assert self.cache.bytes == 0
+        assert self.cache.hits == 1
+
+    def test_resize(self):
+        """Unit test for resize"""
+
+        self.cache.resize(self.size)
+
+        assert len(self.cache) == 1
+        assert (1, 0, 0) in self.cache
+
+    def test_pinned(self):
+        """Values that exceed the budget are pinned up to maxpinned"""
+
+        cache = MemoryCache(maxbytes=0, maxpinned=2)
+
+        for i in xrange(3):
+            cache[(i, 0, 0)] = numpy.zeros(1000)
+
+        assert (0, 0, 0) not in cache
+        assert cache[(2, 0, 0)][0] == 0
+        assert len(cache) == 2
+        assert cache.bytes == 0
+        assert cache.get_stats()["pinned"] == 2
+
+        assert cache.pop((1, 0, 0))[0] == 0
+        assert (1, 0, 0) not in cache
+
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_threads(self):
+        """The cache may be used from more than one thread"""
+
+        import threading
+
+        cache = MemoryCache(maxbytes=100 * self.size, maxpinned=10)
+
+        def fill(offset):
+            for i in xrange(2000):
+                key = (i % 150, offset, 0)
+                cache[key] = numpy.zeros(1000)
+                cache.pop((i % 150 - 1, offset, 0), None)
+                list(cache)
+
+        threads = [threading.Thread(target=fill, args=(offset,))
+                   for offset in xrange(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert cache.bytes == len(cache) * self.size
+        assert cache.bytes <= cache.maxbytes
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+test_chunk_index
+================
+
+Unit tests for chunk_index.py
+
+"""
+
+import os
+import random
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.chunk_index import ChunkIndex, INF
+
+
+class TestChunkIndex(object):
+    """Unit tests for ChunkIndex"""
+
+    def setup_method(self, method):
+        self.keys = [(0, 0, 0), (300, 2, 0), (5, 100, 0), (1000, 1000, 0),
+                     (3, 4, 1), (255, 63, 2), (256, 64, 2)]
+        self.index = ChunkIndex(self.keys)
+
+    def test_len(self):
+        """Unit test for __len__"""
+
+        assert len(self.index) == len(self.keys)
+
+    def test_discard(self):
+        """Unit test for discard"""
+
+        self.index.discard((3, 4, 1))
+        self.index.discard((3, 4, 1))
+        self.index.discard((7, 7, 7))
+
+        assert len(self.index) == len(self.keys) - 1
+        assert self.index.get_tables() == [0, 2]
+
+    param_test_get_keys = [
+        {'tab': None, 'region': (0, 0, INF, INF),
+         'res': [(0, 0, 0), (300, 2, 0), (5, 100, 0), (1000, 1000, 0),
+                 (3, 4, 1), (255, 63, 2), (256, 64, 2)]},
+        {'tab': 0, 'region': (0, 0, INF, INF),
+         'res': [(0, 0, 0), (300, 2, 0), (5, 100, 0), (1000, 1000, 0)]},
+        {'tab': 0, 'region': (5, 0, INF, INF),
+         'res': [(300, 2, 0), (5, 100, 0), (1000, 1000, 0)]},
+        {'tab': 0, 'region': (0, 3, 500, INF),
+         'res': [(5, 100, 0)]},
+        {'tab': 2, 'region': (255, 63, 255, 63), 'res': [(255, 63, 2)]},
+        {'tab': 3, 'region': (0, 0, INF, INF), 'res': []},
+    ]
+
+    @params(param_test_get_keys)
+    def test_get_keys(self, tab, region, res):
+        """Unit test for get_keys"""
+
+        assert sorted(self.index.get_keys(tab, *region)) == sorted(res)
+
+    def test_random_regions(self):
+        """Region queries match a scan of all keys"""
+
+        rnd = random.Random(3)
+        keys = set((rnd.randint(0, 2000), rnd.randint(0, 500),
+                    rnd.randint(0, 2)) for __ in xrange(2000))
+        index = ChunkIndex(keys)
+
+        for __ in xrange(50):
+            tab = rnd.randint(0, 2)
+            top, left = rnd.randint(0, 2000), rnd.randint(0, 500)
+            bottom = rnd.choice([INF, top + rnd.randint(0, 800)])
+            right = rnd.choice([INF, left + rnd.randint(0, 200)])
+
+            res = [key for key in keys if key[2] == tab and
+                   top <= key[0] <= bottom and left <= key[1] <= right]
+
+            assert sorted(index.get_keys(tab, top, left, bottom, right)) == \
+                sorted(res)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+test_compact_storage
+====================
+
+Unit tests for compact_storage.py
+
+"""
+
+import os
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.compact_storage import pack_key, unpack_key, StringArena
+from src.lib.compact_storage import PackedChunkIndex, MAX_ROW
+from src.lib.chunk_index import INF
+
+
+param_test_pack_key = [
+    {'key': (0, 0, 0), 'packed': True},
+    {'key': (1000000, 16384, 3), 'packed': True},
+    {'key': (MAX_ROW - 1, 1, 4095), 'packed': True},
+    {'key': (MAX_ROW, 0, 0), 'packed': False},
+    {'key': (2, -1, 0), 'packed': False},
+    {'key': (2, 1, 4096), 'packed': False},
+]
+
+
+@params(param_test_pack_key)
+def test_pack_key(key, packed):
+    """Unit test for pack_key and unpack_key"""
+
+    packed_key = pack_key(key)
+
+    assert (type(packed_key) is not tuple) == packed
+    assert unpack_key(packed_key) == key
+
+
+def test_pack_key_order():
+    """Packed keys of a table are ordered by row, then column"""
+
+    keys = [(1, 5, 2), (0, 900, 2), (1, 4, 2), (30, 0, 2)]
+
+    assert sorted(keys, key=pack_key) == sorted(keys)
+
+
+class TestStringArena(object):
+    """Unit tests for StringArena"""
+
+    def setup_method(self, method):
+        self.arena = StringArena()
+
+    param_test_add_get = [
+        {'value': ""},
+        {'value': "1 + 2"},
+        {'value': u"u'\xe4€'"},
+        {'value': "\x00\xff" * 1000},
+    ]
+
+    @params(param_test_add_get)
+    def test_add_get(self, value):
+        """Unit test for add and get"""
+
+        self.arena.add("Padding")
+        handle = self.arena.add(value)
+
+        assert self.arena.get(handle) == value
+        assert type(self.arena.get(handle)) is type(value)
+
+    param_test_is_storable = [
+        {'value': "x", 'res': True},
+        {'value': u"x", 'res': True},
+        {'value': None, 'res': False},
+        {'value': 1, 'res': False},
+        {'value': "x" * (StringArena.max_length + 1), 'res': False},
+    ]
+
+    @params(param_test_is_storable)
+    def test_is_storable(self, value, res):
+        """Unit test for is_storable"""
+
+        assert StringArena.is_storable(value) == res
+
+    def test_is_compaction_due(self):
+        """Unit test for discard and is_compaction_due"""
+
+        handles = [self.arena.add("x" * 1000) for __ in xrange(100)]
+        assert not self.arena.is_compaction_due()
+
+        for handle in handles[:80]:
+            self.arena.discard(handle)
+
+        assert self.arena.garbage == 80000
+        assert self.arena.is_compaction_due()
+
+
+def test_packed_chunk_index():
+    """PackedChunkIndex answers region queries with packed keys"""
+
+    keys = [(0, 0, 0), (300, 2, 0), (5, 100, 0), (1000, 1000, 1),
+            (-1, 2, 0)]
+    index = PackedChunkIndex(map(pack_key, keys))
+
+    assert index.get_tables() == [0, 1]
+    assert sorted(map(unpack_key, index.get_keys(0, 0, 0, INF, 50))) == \
+        [(0, 0, 0), (300, 2, 0)]
+
+    index.discard(pack_key((300, 2, 0)))
+    assert map(unpack_key, index.get_keys(0, 1, 0, INF, INF)) == \
+        [(5, 100, 0)]
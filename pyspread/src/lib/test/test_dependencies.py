@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+
+"""
+test_dependencies
+=================
+
+Unit tests for dependencies.py
+
+"""
+
+import os
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.dependencies import DependencyGraph
+
+
+class TestDependencyGraph(object):
+    """Unit tests for DependencyGraph"""
+
+    def setup_method(self, method):
+        """Creates graph, in which (2, 0, 0) reads (1, 0, 0) reads (0, 0, 0)"""
+
+        self.graph = DependencyGraph()
+        self.graph.add((1, 0, 0), (0, 0, 0))
+        self.graph.add((2, 0, 0), (1, 0, 0))
+
+    def test_add(self):
+        """Unit test for add"""
+
+        assert len(self.graph) == 2
+        assert (0, 0, 0) in self.graph
+        assert (5, 0, 0) not in self.graph
+
+    def test_get_precedents(self):
+        """Unit test for get_precedents"""
+
+        assert self.graph.get_precedents((1, 0, 0)) == set([(0, 0, 0)])
+        assert self.graph.get_precedents((0, 0, 0)) == set()
+
+    def test_get_dependents(self):
+        """Unit test for get_dependents"""
+
+        assert self.graph.get_dependents((0, 0, 0)) == set([(1, 0, 0)])
+        assert self.graph.get_dependents((2, 0, 0)) == set()
+
+    def test_get_transitive_dependents(self):
+        """Unit test for get_transitive_dependents"""
+
+        assert self.graph.get_transitive_dependents((0, 0, 0)) == \
+            set([(1, 0, 0), (2, 0, 0)])
+
+        # Cycles terminate
+        self.graph.add((0, 0, 0), (2, 0, 0))
+        assert self.graph.get_transitive_dependents((0, 0, 0)) == \
+            set([(0, 0, 0), (1, 0, 0), (2, 0, 0)])
+
+    def test_remove_precedents(self):
+        """Unit test for remove_precedents"""
+
+        self.graph.remove_precedents((1, 0, 0))
+
+        assert self.graph.get_dependents((0, 0, 0)) == set()
+        assert self.graph.get_transitive_dependents((1, 0, 0)) == \
+            set([(2, 0, 0)])
+        assert (0, 0, 0) not in self.graph
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        self.graph.clear()
+
+        assert len(self.graph) == 0
+        assert self.graph.get_dependents((0, 0, 0)) == set()
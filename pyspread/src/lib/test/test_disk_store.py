@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+test_disk_store
+===============
+
+Unit tests for disk_store.py
+
+"""
+
+from copy import deepcopy
+import os
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+import py.test as pytest
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.disk_store import DiskStore
+from src.lib.chunk_index import INF
+
+
+class TestDiskStore(object):
+    """Unit tests for DiskStore"""
+
+    def setup_method(self, method):
+        self.store = DiskStore(cache_pages=2)
+
+        self.items = {(0, 0, 0): u"1", (300, 2, 0): "'a'", (5, 100, 0): 3,
+                      (1000, 1000, 1): None, (63, 4, 1): u"\xe4"}
+        for key, value in self.items.iteritems():
+            self.store.set(key, value)
+
+    def test_len(self):
+        """Unit test for __len__"""
+
+        assert len(self.store) == len(self.items)
+
+        self.store.set((0, 0, 0), "2")
+        assert len(self.store) == len(self.items)
+
+    param_test_get = [
+        {'key': (0, 0, 0), 'res': u"1"},
+        {'key': (300, 2, 0), 'res': "'a'"},
+        {'key': (5, 100, 0), 'res': 3},
+        {'key': (63, 4, 1), 'res': u"\xe4"},
+        {'key': (64, 4, 1), 'res': "default"},
+    ]
+
+    @params(param_test_get)
+    def test_get(self, key, res):
+        """Unit test for get"""
+
+        assert self.store.get(key, "default") == res
+
+    def test_set_pop(self):
+        """Changes are visible in cached and in evicted pages"""
+
+        self.store.get((0, 0, 0))
+        self.store.set((1, 1, 0), "New")
+        self.store.set((0, 0, 0), "Changed")
+
+        for row in xrange(0, 1000, 64):
+            self.store.get((row, 0, 2))
+
+        assert self.store.get((1, 1, 0)) == "New"
+        assert self.store.get((0, 0, 0)) == "Changed"
+
+        assert self.store.pop((1, 1, 0)) == "New"
+        assert self.store.pop((1, 1, 0), None) is None
+        assert (1, 1, 0) not in self.store
+
+        with pytest.raises(KeyError):
+            self.store.pop((1, 1, 0))
+
+        for row in xrange(0, 1000, 64):
+            self.store.get((row, 0, 2))
+
+        assert (1, 1, 0) not in self.store
+        assert len(self.store) == len(self.items)
+
+    def test_iteritems(self):
+        """Unit test for iteritems"""
+
+        self.store.fetch_size = 2
+
+        assert dict(self.store.iteritems()) == self.items
+        assert list(self.store.iterkeys()) == sorted(
+            self.items, key=lambda key: (key[2], key[0], key[1]))
+
+    param_test_get_keys = [
+        {'tab': None, 'region': (0, 0, INF, INF),
+         'res': [(0, 0, 0), (300, 2, 0), (5, 100, 0), (1000, 1000, 1),
+                 (63, 4, 1)]},
+        {'tab': 0, 'region': (5, 0, INF, INF),
+         'res': [(300, 2, 0), (5, 100, 0)]},
+        {'tab': 0, 'region': (0, 3, 500, INF), 'res': [(5, 100, 0)]},
+        {'tab': 1, 'region': (63, 4, 63, 4), 'res': [(63, 4, 1)]},
+        {'tab': 3, 'region': (0, 0, INF, INF), 'res': []},
+    ]
+
+    @params(param_test_get_keys)
+    def test_get_keys(self, tab, region, res):
+        """Unit test for get_keys"""
+
+        assert sorted(self.store.get_keys(tab, *region)) == sorted(res)
+
+    def test_get_tables_bbox(self):
+        """Unit test for get_tables and get_bbox"""
+
+        assert self.store.get_tables() == [0, 1]
+        assert self.store.get_bbox(0) == (300, 100)
+        assert self.store.get_bbox(2) is None
+
+        self.store.pop((1000, 1000, 1))
+        self.store.pop((63, 4, 1))
+        assert self.store.get_tables() == [0]
+
+    param_test_get_first_index = [
+        {'args': (0, 0), 'res': 0},
+        {'args': (0, 0, 1), 'res': 5},
+        {'args': (0, 0, 0, 299, None, True), 'res': 5},
+        {'args': (0, 1, 0, INF, 0), 'res': 0},
+        {'args': (0, 1, 1, INF, 5), 'res': 100},
+        {'args': (0, 0, 0, INF, 100), 'res': 5},
+        {'args': (0, 1, 0, INF, None, True), 'res': 100},
+        {'args': (0, 0, 301), 'res': None},
+        {'args': (2, 0), 'res': None},
+    ]
+
+    @params(param_test_get_first_index)
+    def test_get_first_index(self, args, res):
+        """Unit test for get_first_index"""
+
+        assert self.store.get_first_index(*args) == res
+
+    def test_iterkeys_streamed(self):
+        """Keys are fetched in batches without decoding values"""
+
+        self.store.fetch_size = 2
+        self.store._decode = None
+
+        keys = self.store.iterkeys()
+        assert next(keys) == (0, 0, 0)
+
+        # Keys behind the fetched batch may be changed while iterating
+        self.store.set((6, 0, 0), 1)
+        assert list(keys) == [(5, 100, 0), (6, 0, 0), (300, 2, 0),
+                              (63, 4, 1), (1000, 1000, 1)]
+
+    def test_clear_copy(self):
+        """Unit test for clear and deepcopy"""
+
+        store = deepcopy(self.store)
+        assert len(store) == 0
+
+        self.store.clear()
+        assert len(self.store) == 0
+        assert self.store.get((0, 0, 0)) is None
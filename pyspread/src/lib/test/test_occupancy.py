@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+test_occupancy
+==============
+
+Unit tests for occupancy.py
+
+"""
+
+import os
+import random
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.occupancy import Occupancy
+
+
+class TestOccupancy(object):
+    """Unit tests for Occupancy"""
+
+    def setup_method(self, method):
+        self.occupancy = Occupancy([(2, 3), (2, 7), (10, 3), (5, 1)])
+
+    def test_len(self):
+        """Unit test for __len__"""
+
+        assert len(self.occupancy) == 4
+        assert len(Occupancy()) == 0
+
+    def test_add_remove(self):
+        """Unit test for add and remove"""
+
+        self.occupancy.add(20, 20)
+        assert self.occupancy.get_bbox() == (2, 1, 20, 20)
+
+        self.occupancy.remove(20, 20)
+        self.occupancy.remove(5, 1)
+        assert self.occupancy.get_bbox() == (2, 3, 10, 7)
+        assert self.occupancy.rows == [2, 10]
+        assert self.occupancy.cols == [3, 7]
+
+        for row, col in list(self.occupancy.iter_cells()):
+            self.occupancy.remove(row, col)
+
+        assert self.occupancy.get_bbox() is None
+
+    param_test_get_count = [
+        {'row': 2, 'col': 3, 'res': (2, 2)},
+        {'row': 5, 'col': 7, 'res': (1, 1)},
+        {'row': 4, 'col': 4, 'res': (0, 0)},
+    ]
+
+    @params(param_test_get_count)
+    def test_get_count(self, row, col, res):
+        """Unit test for get_row_count and get_col_count"""
+
+        assert (self.occupancy.get_row_count(row),
+                self.occupancy.get_col_count(col)) == res
+
+    param_test_get_next = [
+        {'row': 2, 'col': 3, 'reverse': False, 'res': (7, 10)},
+        {'row': 2, 'col': 3, 'reverse': True, 'res': (None, None)},
+        {'row': 2, 'col': 0, 'reverse': False, 'res': (3, None)},
+        {'row': 10, 'col': 3, 'reverse': True, 'res': (None, 2)},
+        {'row': 7, 'col': 3, 'reverse': True, 'res': (None, 2)},
+    ]
+
+    @params(param_test_get_next)
+    def test_get_next(self, row, col, reverse, res):
+        """Unit test for get_next_in_row and get_next_in_col"""
+
+        assert (self.occupancy.get_next_in_row(row, col, reverse),
+                self.occupancy.get_next_in_col(col, row, reverse)) == res
+
+    def test_get_next_line(self):
+        """Unit test for get_next_row and get_next_col"""
+
+        assert self.occupancy.get_next_row(2) == 5
+        assert self.occupancy.get_next_row(2, reverse=True) is None
+        assert self.occupancy.get_next_col(7, reverse=True) == 3
+
+    def test_random(self):
+        """Occupancy matches a set of cells after random changes"""
+
+        rnd = random.Random(2)
+        cells = set()
+        occupancy = Occupancy()
+
+        for __ in xrange(500):
+            cell = rnd.randint(0, 30), rnd.randint(0, 30)
+            if cell in cells:
+                cells.remove(cell)
+                occupancy.remove(*cell)
+            else:
+                cells.add(cell)
+                occupancy.add(*cell)
+
+        assert sorted(occupancy.iter_cells()) == sorted(cells)
+        assert occupancy.rows == sorted(set(row for row, __ in cells))
+        assert Occupancy(cells).get_bbox() == occupancy.get_bbox()
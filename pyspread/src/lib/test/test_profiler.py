@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+
+"""
+test_profiler
+=============
+
+Unit tests for profiler.py
+
+"""
+
+import cStringIO
+import os
+import sys
+import threading
+import time
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.profiler import EvalProfiler
+
+
+class TestEvalProfiler(object):
+    """Unit tests for EvalProfiler"""
+
+    def setup_method(self, method):
+        """Creates profiler, in which (1, 0, 0) has evaluated (0, 0, 0)"""
+
+        self.profiler = EvalProfiler()
+
+        self.profiler.start()
+        self.profiler.start()
+        time.sleep(0.01)
+        self.profiler.stop((0, 0, 0))
+        self.profiler.stop((1, 0, 0))
+
+        self.profiler.add_hit((0, 0, 0))
+
+    def test_get_report(self):
+        """Unit test for get_report"""
+
+        report = self.profiler.get_report()
+
+        assert [row[0] for row in report] == [(1, 0, 0), (0, 0, 0)]
+
+        key, calls, hits, misses, total_time, self_time = report[1]
+        assert (calls, hits, misses) == (2, 1, 1)
+        assert total_time >= 0.01
+
+        # Nested evaluation is excluded from the self time
+        key, calls, hits, misses, total_time, self_time = report[0]
+        assert self_time < total_time
+        assert total_time >= 0.01
+
+    def test_write_csv(self):
+        """Unit test for write_csv"""
+
+        csvfile = cStringIO.StringIO()
+        self.profiler.write_csv(csvfile)
+
+        lines = csvfile.getvalue().splitlines()
+
+        assert lines[0] == "Row,Column,Table,Calls,Hits,Misses,Total time," \
+                           "Self time"
+        assert lines[1].startswith("1,0,0,1,0,1,")
+        assert len(lines) == 3
+
+    def test_clear(self):
+        """Unit test for clear"""
+
+        self.profiler.clear()
+
+        assert self.profiler.get_report() == []
+
+    def test_threads(self):
+        """Evaluations in another thread are not nested in running ones"""
+
+        self.profiler.clear()
+        self.profiler.start()
+
+        def evaluate():
+            self.profiler.start()
+            time.sleep(0.01)
+            self.profiler.stop((2, 0, 0))
+
+        thread = threading.Thread(target=evaluate)
+        thread.start()
+        thread.join()
+
+        self.profiler.stop((3, 0, 0))
+
+        stats = self.profiler.stats
+        assert stats[(3, 0, 0)][3] == stats[(3, 0, 0)][2]
+        assert stats[(2, 0, 0)][2] >= 0.01
@@ -163,6 +163,28 @@ class TestSelection(object):
 
         assert (key in sel) == res
 
+    def test_get_compiled(self):
+        """Compiled selection is rebuilt when the selection is changed"""
+
+        selection = Selection([(1, 1)], [(2, 2)], [], [], [(5, 5)])
+
+        compiled = selection.get_compiled()
+        assert selection.get_compiled() is compiled
+        assert (6, 6) not in selection
+
+        selection.cells.append((6, 6))
+        assert selection.get_compiled() is not compiled
+        assert (6, 6) in selection
+
+        selection.cells = [(7, 7)]
+        assert (6, 6) not in selection
+        assert (7, 7) in selection
+
+        selection.insert(0, 1, 0)
+        assert (8, 7) in selection
+        assert (3, 1) in selection
+        assert (1, 1) not in selection
+
     param_test_add = [
         {'sel': Selection([], [], [], [], [(0, 0), (34, 56)]),
          'add': (4, 5),
@@ -223,6 +245,84 @@ class TestSelection(object):
         else:
             assert s1_and_s2 == res
 
+    param_test_and_rects = [
+        {'s1': Selection([], [], [3], [], []),
+         's2': Selection([], [], [], [4], []),
+         'res': Selection([], [], [], [], [(3, 4)])},
+        {'s1': Selection([], [], [3], [], []),
+         's2': Selection([(1, 2)], [(10, 20)], [], [], []),
+         'res': Selection([(3, 2)], [(3, 20)], [], [], [])},
+        {'s1': Selection([(0, 0)], [(10**9, 10**6)], [], [], []),
+         's2': Selection([(5, 5)], [(None, None)], [], [], []),
+         'res': Selection([(5, 5)], [(10**9, 10**6)], [], [], [])},
+    ]
+
+    @params(param_test_and_rects)
+    def test_and_rects(self, s1, s2, res):
+        """Intersection of primitives does not enumerate cells"""
+
+        assert s1 & s2 == res
+
+    param_test_or = [
+        {'s1': Selection([], [], [3], [], [(1, 1)]),
+         's2': Selection([], [], [3], [5], [(1, 1)]),
+         'res': Selection([], [], [3], [5], [(1, 1)])},
+        {'s1': Selection([(0, 0)], [(2, 2)], [], [], []),
+         's2': Selection([], [], [], [], [(4, 4)]),
+         'res': Selection([(0, 0)], [(2, 2)], [], [], [(4, 4)])},
+    ]
+
+    @params(param_test_or)
+    def test_or(self, s1, s2, res):
+        """Unit test for __or__"""
+
+        assert s1 | s2 == res
+
+    param_test_sub = [
+        {'s1': Selection([(0, 0)], [(2, 2)], [], [], []),
+         's2': Selection([], [], [], [], [(1, 1)]),
+         'inside': [(0, 0), (0, 2), (1, 0), (1, 2), (2, 1)],
+         'outside': [(1, 1), (3, 3)]},
+        {'s1': Selection([], [], [4], [], []),
+         's2': Selection([], [], [], [10**6], []),
+         'inside': [(4, 0), (4, 10**6 - 1), (4, 10**9)],
+         'outside': [(4, 10**6), (5, 0)]},
+        {'s1': Selection([], [], [], [], [(1, 1)]),
+         's2': Selection([(0, 0)], [(5, 5)], [], [], []),
+         'inside': [],
+         'outside': [(1, 1)]},
+    ]
+
+    @params(param_test_sub)
+    def test_sub(self, s1, s2, inside, outside):
+        """Unit test for __sub__"""
+
+        difference = s1 - s2
+
+        for cell in inside:
+            assert cell in difference
+        for cell in outside:
+            assert cell not in difference
+
+    param_test_get_cell_count = [
+        {'sel': Selection([], [], [], [], []), 'shape': None, 'res': 0},
+        {'sel': Selection([(0, 0)], [(9, 9)], [], [], [(5, 5), (20, 20)]),
+         'shape': None, 'res': 101},
+        {'sel': Selection([(0, 0)], [(9, 9)], [], [], []) |
+         Selection([(5, 5)], [(14, 14)], [], [], []),
+         'shape': None, 'res': 175},
+        {'sel': Selection([], [], [1], [], []), 'shape': None,
+         'res': float("inf")},
+        {'sel': Selection([], [], [1], [1], []), 'shape': (10, 5, 1),
+         'res': 14},
+    ]
+
+    @params(param_test_get_cell_count)
+    def test_get_cell_count(self, sel, shape, res):
+        """Unit test for get_cell_count"""
+
+        assert sel.get_cell_count(shape) == res
+
     param_test_insert = [
         {'sel': Selection([], [], [2], [], []),
          'point': 1, 'number': 10, 'axis': 0,
@@ -247,6 +347,8 @@ class TestSelection(object):
          'res': ((32, 53), (34, 56))},
         {'sel': Selection([(4, 5)], [(100, 200)], [], [], []),
          'res': ((4, 5), (100, 200))},
+        {'sel': Selection([(4, 5), (1, 1)], [(100, 200), (2, 2)], [], [], []),
+         'res': ((1, 1), (100, 200))},
     ]
 
     @params(param_test_get_bbox)
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+test_size_index
+===============
+
+Unit tests for size_index.py
+
+"""
+
+import os
+import random
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.size_index import SizeIndex
+
+
+class TestSizeIndex(object):
+    """Unit tests for SizeIndex"""
+
+    def setup_method(self, method):
+        self.size_index = SizeIndex({0: 10, 3: 40, 7: 5})
+
+    param_test_get_sum = [
+        {'first': 0, 'last': 0, 'res': 0},
+        {'first': 0, 'last': 1, 'res': 10},
+        {'first': 0, 'last': 4, 'res': 72},
+        {'first': 1, 'last': 3, 'res': 22},
+        {'first': 3, 'last': 8, 'res': 78},
+        {'first': 8, 'last': 10, 'res': 22},
+        {'first': 5, 'last': 2, 'res': 0},
+    ]
+
+    @params(param_test_get_sum)
+    def test_get_sum(self, first, last, res):
+        """Unit test for get_sum with default size 11"""
+
+        assert self.size_index.get_sum(first, last, 11) == res
+
+    def test_set(self):
+        """Sums follow changed, removed and appended sizes"""
+
+        assert self.size_index.get_sum(0, 10, 1) == 62
+
+        self.size_index.set(3, 20)
+        self.size_index.set(0, None)
+        self.size_index.set(100, 2)
+
+        assert self.size_index.get(3) == 20
+        assert len(self.size_index) == 3
+        assert self.size_index.get_sum(0, 10, 1) == 33
+        assert self.size_index.get_sum(0, 101, 1) == 125
+
+    def test_random(self):
+        """Sums match a scan of the sizes"""
+
+        rnd = random.Random(5)
+        size_index = SizeIndex()
+        sizes = {}
+
+        for __ in xrange(500):
+            index = rnd.randint(0, 300)
+            size = rnd.choice([None, rnd.randint(1, 50)])
+
+            size_index.set(index, size)
+            sizes.pop(index, None)
+            if size is not None:
+                sizes[index] = size
+
+            first = rnd.randint(0, 320)
+            last = rnd.randint(first, 330)
+            res = sum(sizes.get(i, 7) for i in xrange(first, last))
+
+            assert size_index.get_sum(first, last, 7) == res
@@ -0,0 +1,182 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+
+
+"""
+test_spatial_index
+==================
+
+Unit tests for spatial_index.py
+
+"""
+
+import os
+import random
+import sys
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.testlib import params, pytest_generate_tests
+
+from src.lib.selection import Selection
+from src.lib.spatial_index import IntervalTree, SelectionIndex, get_bounds
+
+INF = float("inf")
+
+param_test_get_bounds = [
+    {'sel': Selection([], [], [], [], []), 'res': None},
+    {'sel': Selection([], [], [], [], [(2, 3), (4, 1)]), 'res': (2, 1, 4, 3)},
+    {'sel': Selection([(1, 2)], [(3, 4)], [], [], [(0, 9)]),
+     'res': (0, 2, 3, 9)},
+    {'sel': Selection([(None, 2)], [(3, None)], [], [], []),
+     'res': (0, 2, 3, INF)},
+    {'sel': Selection([], [], [5, 7], [], []), 'res': (5, 0, 7, INF)},
+    {'sel': Selection([], [], [], [5], [(1, 1)]), 'res': (0, 1, INF, 5)},
+]
+
+
+@params(param_test_get_bounds)
+def test_get_bounds(sel, res):
+    """Unit test for get_bounds"""
+
+    assert get_bounds(sel) == res
+
+
+class TestIntervalTree(object):
+    """Unit tests for IntervalTree"""
+
+    def setup_method(self, method):
+        intervals = [(0, 10, "a"), (5, 5, "b"), (3, 8, "c"), (20, 30, "d"),
+                     (9, float("inf"), "e")]
+        self.tree = IntervalTree(intervals)
+
+    param_test_find = [
+        {'point': -1, 'res': []},
+        {'point': 0, 'res': ["a"]},
+        {'point': 5, 'res': ["a", "b", "c"]},
+        {'point': 9, 'res': ["a", "e"]},
+        {'point': 15, 'res': ["e"]},
+        {'point': 30, 'res': ["d", "e"]},
+        {'point': 10 ** 9, 'res': ["e"]},
+    ]
+
+    @params(param_test_find)
+    def test_find(self, point, res):
+        """Unit test for find"""
+
+        assert sorted(self.tree.find(point)) == res
+
+    def test_empty(self):
+        """Empty trees find nothing"""
+
+        assert list(IntervalTree([]).find(0)) == []
+
+
+class TestSelectionIndex(object):
+    """Unit tests for SelectionIndex"""
+
+    selections = [
+        Selection([(1, 1)], [(3, 3)], [], [], []),
+        Selection([], [], [2], [], []),
+        Selection([], [], [], [4], []),
+        Selection([], [], [], [], [(2, 4), (7, 7)]),
+        Selection([(None, 2)], [(None, 2)], [], [], []),
+        Selection([(5, None)], [(None, None)], [], [], []),
+    ]
+
+    param_test_get_indices = [
+        {'row': 0, 'col': 0, 'res': []},
+        {'row': 1, 'col': 1, 'res': [0]},
+        {'row': 2, 'col': 2, 'res': [0, 1, 4]},
+        {'row': 2, 'col': 4, 'res': [1, 2, 3]},
+        {'row': 7, 'col': 7, 'res': [3, 5]},
+        {'row': 100, 'col': 2, 'res': [4, 5]},
+    ]
+
+    @params(param_test_get_indices)
+    def test_get_indices(self, row, col, res):
+        """Unit test for get_indices"""
+
+        index = SelectionIndex(self.selections)
+
+        assert index.get_indices(row, col) == res
+
+    def test_append(self):
+        """Appended selections are found"""
+
+        index = SelectionIndex(self.selections[:2])
+
+        for selection in self.selections[2:]:
+            index.append(selection)
+
+        assert index.length == len(self.selections)
+        assert index.get_indices(2, 2) == [0, 1, 4]
+        assert index.get_indices(100, 2) == [4, 5]
+
+    param_test_contains = [
+        {'sel': Selection([], [], [], [], [(2, 4), (100, 2)]), 'res': True},
+        {'sel': Selection([], [], [], [], [(0, 0)]), 'res': False},
+        {'sel': Selection([(1, 1)], [(3, 4)], [], [], []), 'res': True},
+        {'sel': Selection([(1, 1)], [(3, 5)], [], [], []), 'res': False},
+        {'sel': Selection([(6, 3)], [(None, 20)], [], [], []), 'res': True},
+        {'sel': Selection([], [], [2, 6], [], []), 'res': True},
+        {'sel': Selection([], [], [3], [], []), 'res': False},
+        {'sel': Selection([], [], [], [2, 4], []), 'res': True},
+        {'sel': Selection([], [], [], [3], []), 'res': False},
+    ]
+
+    @params(param_test_contains)
+    def test_contains(self, sel, res):
+        """Unit test for contains"""
+
+        index = SelectionIndex(self.selections)
+
+        assert index.contains(sel) == res
+
+    def test_random_selections(self):
+        """Index results equal Selection.__contains__ results"""
+
+        rnd = random.Random(2)
+
+        def randint():
+            return rnd.randint(0, 20)
+
+        selections = []
+        for __ in xrange(200):
+            top, left = randint(), randint()
+            bottom, right = top + randint(), left + randint()
+            selections.append(Selection([(top, left)], [(bottom, right)],
+                                        [randint()], [randint()],
+                                        [(randint(), randint())]))
+
+        index = SelectionIndex(selections[:50])
+        for selection in selections[50:]:
+            index.append(selection)
+
+        for row in xrange(45):
+            for col in xrange(45):
+                indices = [i for i, selection in enumerate(selections)
+                           if (row, col) in selection]
+                assert index.get_indices(row, col) == indices
@@ -0,0 +1,197 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+
+
+"""
+test_watchdog
+=============
+
+Unit tests for watchdog.py
+
+"""
+
+import os
+import sys
+import threading
+import time
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.watchdog import EvaluationTimeout, Watchdog
+
+
+def busy_loop(seconds):
+    """Runs Python bytecode for seconds s"""
+
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class TestWatchdog(object):
+    """Unit tests for Watchdog"""
+
+    def setup_method(self, method):
+        self.watchdog = Watchdog()
+
+    def test_budget(self):
+        """Unit test for budget without timeout"""
+
+        with self.watchdog.budget(1.0):
+            busy_loop(0.01)
+
+        with self.watchdog.budget(None):
+            busy_loop(0.01)
+
+        # Pending interrupts must not leak out of the batch
+        busy_loop(0.05)
+
+    def test_timeout(self):
+        """Unit test for budget with exceeded timeout"""
+
+        start = time.time()
+
+        try:
+            with self.watchdog.budget(0.05):
+                busy_loop(5)
+            raise AssertionError("Budget has not been enforced")
+
+        except EvaluationTimeout:
+            assert time.time() - start < 1
+
+        busy_loop(0.1)
+
+    def test_nested_budget(self):
+        """Nested budgets end with the enclosing budget"""
+
+        start = time.time()
+
+        try:
+            with self.watchdog.budget(0.1):
+                while True:
+                    # Each nested budget alone would not be exceeded
+                    with self.watchdog.budget(1.0):
+                        busy_loop(0.02)
+            raise AssertionError("Budget has not been enforced")
+
+        except EvaluationTimeout:
+            assert time.time() - start < 0.5
+
+        busy_loop(0.05)
+
+        # The enclosing budget is enforced after a caught nested timeout
+        start = time.time()
+
+        try:
+            with self.watchdog.budget(0.1):
+                try:
+                    with self.watchdog.budget(1.0):
+                        busy_loop(5)
+                except EvaluationTimeout:
+                    pass
+                busy_loop(5)
+            raise AssertionError("Budget has not been enforced")
+
+        except EvaluationTimeout:
+            assert time.time() - start < 0.5
+
+        busy_loop(0.05)
+
+        try:
+            with self.watchdog.budget(1.0):
+                with self.watchdog.budget(0.05):
+                    busy_loop(5)
+            raise AssertionError("Budget has not been enforced")
+
+        except EvaluationTimeout:
+            pass
+
+    def test_thread(self):
+        """Timeouts work in threads other than the main thread"""
+
+        results = []
+
+        def evaluate():
+            try:
+                with self.watchdog.budget(0.05):
+                    busy_loop(5)
+                results.append(False)
+
+            except EvaluationTimeout:
+                results.append(True)
+
+        thread = threading.Thread(target=evaluate)
+        thread.start()
+        thread.join(2)
+
+        assert results == [True]
+
+    def test_batch(self):
+        """Budgets in a batch are enforced and do not wake the watchdog"""
+
+        notifications = []
+        condition = self.watchdog._condition
+        notify = condition.notify
+
+        def counting_notify(*args):
+            notifications.append(None)
+            notify(*args)
+
+        condition.notify = counting_notify
+
+        with self.watchdog.batch():
+            for _ in xrange(100):
+                with self.watchdog.budget(1.0):
+                    pass
+
+            assert len(notifications) <= 2
+
+            try:
+                with self.watchdog.budget(0.05):
+                    busy_loop(5)
+                raise AssertionError("Budget has not been enforced")
+
+            except EvaluationTimeout:
+                pass
+
+        assert not self.watchdog._batches
+
+    def test_stop(self):
+        """The watchdog thread stops and is restarted on next use"""
+
+        with self.watchdog.budget(1.0):
+            pass
+
+        thread = self.watchdog._thread
+        self.watchdog.stop()
+        assert not thread.is_alive()
+
+        try:
+            with self.watchdog.budget(0.05):
+                busy_loop(5)
+            raise AssertionError("Budget has not been enforced")
+
+        except EvaluationTimeout:
+            pass
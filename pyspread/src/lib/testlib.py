@@ -71,7 +71,7 @@ def basic_setup_test(grid, func, test_key, test_val, *args, **kwargs):
     restore_basic_grid(grid)
 
     func(*args, **kwargs)
-    grid.code_array.result_cache.clear()
+    grid.code_array.clear_results()
     assert grid.code_array(test_key) == test_val
 
 
@@ -0,0 +1,291 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+watchdog
+========
+
+Evaluation timeouts that work in any thread and do not use signals
+
+A single watchdog thread sleeps until the earliest deadline of all
+evaluating threads. If a deadline is exceeded then EvaluationTimeout is
+raised asynchronously in the evaluating thread. The exception is raised
+when the thread executes its next Python bytecode, i. e. blocking calls
+into C code are not interrupted.
+
+Provides
+--------
+
+ * EvaluationTimeout: Exception that is raised in timed out threads
+ * Watchdog: Interrupts evaluations that exceed their time budget
+
+"""
+
+import atexit
+from contextlib import contextmanager
+import ctypes
+import threading
+from timeit import default_timer
+
+INF = float("inf")
+
+
+class EvaluationTimeout(RuntimeError):
+    """Raised in a thread that has exceeded its evaluation time budget"""
+
+    def __init__(self, msg="Evaluation timeout"):
+        RuntimeError.__init__(self, msg)
+
+
+def _set_async_exc(thread_id, exc_type):
+    """Raises exc_type in thread thread_id, None clears pending exceptions"""
+
+    if exc_type is not None:
+        exc_type = ctypes.py_object(exc_type)
+
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_long(thread_id),
+                                               exc_type)
+
+
+class Watchdog(object):
+    """Interrupts evaluations that exceed their time budget
+
+    A batch, e.g. one recalculation of all cells, is registered at the
+    watchdog once. Budgets that are entered within the batch only cost a
+    list append. The watchdog thread is only woken if a budget ends
+    before its next scheduled wake-up. Nested budgets end at the latest
+    with the enclosing budget, i. e. a chain of nested evaluations is
+    limited by the timeout of the outermost budget.
+
+    A budget outside of a batch opens a batch of its own.
+
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+
+        # Maps thread id to stack of [deadline] of its budgets
+        # The deadline is None for the batch itself and after the thread
+        # has been interrupted.
+        self._batches = {}
+
+        # Ids of threads that may have a pending EvaluationTimeout
+        self._interrupted = set()
+
+        # Time, at which the watchdog thread wakes up next
+        self._wakeup = INF
+
+        self._thread = None
+        self._stopped = False
+
+        atexit.register(self.stop)
+
+    def _start(self):
+        """Starts watchdog thread, e.g. on first use or after a fork"""
+
+        if self._thread is None or not self._thread.is_alive():
+            self._stopped = False
+            self._thread = threading.Thread(target=self._run,
+                                            name="Watchdog")
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stops the watchdog thread, which is restarted on next use
+
+        This is called at exit, so that the thread does not run while the
+        interpreter shuts down.
+
+        """
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(1)
+
+    @contextmanager
+    def batch(self):
+        """Context manager that registers all budgets of its block at once
+
+        Nested batches are part of the enclosing batch.
+
+        """
+
+        thread_id = threading.current_thread().ident
+
+        if thread_id in self._batches:
+            yield
+            return
+
+        batch = [[None]]
+
+        with self._condition:
+            self._batches[thread_id] = batch
+            self._start()
+
+        try:
+            yield
+
+        finally:
+            self._leave(thread_id, batch, 1)
+
+    @contextmanager
+    def budget(self, timeout):
+        """Context manager that limits the run time of its block
+
+        EvaluationTimeout is raised in the block if it runs longer than
+        timeout seconds or if an enclosing budget is exceeded.
+
+        Parameters
+        ----------
+        timeout: Number
+        \tTime budget in seconds, no limit if timeout is 0 or None
+
+        """
+
+        if not timeout:
+            yield
+            return
+
+        thread_id = threading.current_thread().ident
+        deadline = default_timer() + timeout
+
+        batch = self._batches.get(thread_id)
+
+        if batch is None:
+            with self.batch():
+                with self.budget(timeout):
+                    yield
+            return
+
+        # Inherit the deadline of the enclosing budget if it is earlier
+        enclosing_deadline = batch[-1][0]
+        if enclosing_deadline is not None and enclosing_deadline < deadline:
+            deadline = enclosing_deadline
+
+        batch.append([deadline])
+        depth = len(batch)
+
+        if deadline < self._wakeup:
+            with self._condition:
+                # The watchdog rescans all batches after the notification
+                self._wakeup = deadline
+                self._condition.notify()
+
+        try:
+            yield
+
+        finally:
+            self._leave(thread_id, batch, depth)
+
+    def _leave(self, thread_id, batch, depth):
+        """Removes the budget at depth from batch
+
+        An EvaluationTimeout that is raised asynchronously during the
+        cleanup is dropped, and the cleanup is resumed. Exceptions that
+        are raised after the cleanup belong to the enclosing budget.
+
+        Parameters
+        ----------
+        thread_id: Integer
+        \tId of the current thread
+        batch: List
+        \tBatch of the current thread
+        depth: Integer
+        \tStack depth of the budget, 1 is the batch itself
+
+        """
+
+        is_done = False
+
+        while True:
+            try:
+                if not is_done:
+                    del batch[depth - 1:]
+                    is_done = True
+
+                    if depth == 1:
+                        with self._condition:
+                            self._batches.pop(thread_id, None)
+
+                            if thread_id in self._interrupted:
+                                # Do not raise outside of the batch
+                                self._interrupted.discard(thread_id)
+                                _set_async_exc(thread_id, None)
+
+                    else:
+                        deadline = batch[-1][0]
+                        if deadline is not None and deadline < self._wakeup:
+                            # The watchdog has not scheduled the enclosing
+                            # budget, e.g. after interrupting this one
+                            with self._condition:
+                                self._wakeup = deadline
+                                self._condition.notify()
+
+                return
+
+            except EvaluationTimeout:
+                if is_done:
+                    raise
+
+    def _run(self):
+        """Watchdog loop that interrupts threads with exceeded budgets"""
+
+        with self._condition:
+            while not self._stopped:
+                # Budgets that are entered during the scan notify
+                self._wakeup = INF
+
+                now = default_timer()
+                next_deadline = INF
+
+                for thread_id, batch in self._batches.items():
+                    try:
+                        budget = batch[-1]
+
+                    except IndexError:
+                        # The batch is being left
+                        continue
+
+                    deadline = budget[0]
+
+                    if deadline is None:
+                        continue
+
+                    elif deadline <= now:
+                        budget[0] = None
+                        self._interrupted.add(thread_id)
+                        _set_async_exc(thread_id, EvaluationTimeout)
+
+                    elif deadline < next_deadline:
+                        next_deadline = deadline
+
+                self._wakeup = next_deadline
+
+                if next_deadline == INF:
+                    self._condition.wait()
+                else:
+                    self._condition.wait(next_deadline - now)
+
+# End of class Watchdog
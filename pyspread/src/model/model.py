@@ -37,13 +37,16 @@ Layer 0: KeyValueStore
 import ast
 import base64
 import bz2
+from collections import MutableMapping
 from copy import copy
 import cStringIO
 import datetime
 from itertools import imap, ifilter, product
 import re
 import sys
-from types import SliceType, IntType
+import threading
+from types import CodeType, SliceType, IntType
+import weakref
 
 import numpy
 
@@ -53,8 +56,20 @@ from src.config import config
 
 from src.lib.typechecks import is_slice_like, is_string_like, is_generator_like
 from src.lib.selection import Selection
+from src.lib.spatial_index import SelectionIndex, get_bounds
+from src.lib.chunk_index import ChunkIndex, INF
+from src.lib.axis_map import AxisMap
+from src.lib.occupancy import Occupancy
+from src.lib.size_index import SizeIndex
+from src.lib.compact_storage import PackedChunkIndex, StringArena
+from src.lib.compact_storage import pack_key, unpack_key
+from src.lib.disk_store import DiskStore
+from src.lib.dependencies import DependencyGraph
+from src.lib.caches import LRUCache, MemoryCache, get_cache_key
+from src.lib.caches import is_range_key
 
 from src.lib.undo import undoable
+from src.lib.watchdog import EvaluationTimeout, Watchdog
 
 import src.lib.charts as charts
 from src.gui.grid_panels import vlcpanel_factory
@@ -78,38 +93,363 @@ class KeyValueStore(dict):
 
         self.default_value = default_value
 
+        # Weak references to StoreSnapshots, see get_snapshot
+        self._snapshots = []
+
     def __missing__(self, value):
         """Returns the default value None"""
 
         return self.default_value
 
+    def _set(self, key, value):
+        """Stores value without undo, overridden by indexing subclasses"""
+
+        if self._snapshots:
+            self._preserve(key)
+
+        dict.__setitem__(self, key, value)
+
+    def _pop(self, key, *args):
+        """Removes key without undo, overridden by indexing subclasses"""
+
+        if self._snapshots:
+            self._preserve(key)
+
+        return dict.pop(self, key, *args)
+
+    # Snapshots
+
+    def get_snapshot(self):
+        """Returns a StoreSnapshot of the current content
+
+        The snapshot is taken in constant time. The store saves old values
+        in its snapshots when keys are changed.
+
+        """
+
+        snapshot = StoreSnapshot(self)
+        self._snapshots.append(weakref.ref(snapshot,
+                                           self._remove_snapshot_ref))
+
+        return snapshot
+
+    def _remove_snapshot_ref(self, ref):
+        """Forgets the snapshot of ref, which has been garbage collected"""
+
+        try:
+            self._snapshots.remove(ref)
+
+        except ValueError:
+            pass
+
+    def _preserve(self, key):
+        """Saves the value of key in all snapshots before key is changed"""
+
+        for ref in self._snapshots:
+            snapshot = ref()
+            if snapshot is not None:
+                snapshot.preserve(key)
+
+    def _detach_snapshots(self):
+        """Copies the content of all snapshots before bulk changes"""
+
+        for ref in self._snapshots:
+            snapshot = ref()
+            if snapshot is not None:
+                snapshot.detach()
+
+        del self._snapshots[:]
+
+    def clear(self):
+        if self._snapshots:
+            self._detach_snapshots()
+
+        dict.clear(self)
+
+    def __getstate__(self):
+        """Returns state without snapshots"""
+
+        state = self.__dict__.copy()
+        state["_snapshots"] = []
+
+        return state
+
     @undoable
     def __setitem__(self, key, value):
         old_value = self[key]
-        dict.__setitem__(self, key, value)
+        self._set(key, value)
 
         yield "__setitem__"
         # Undo actions
         if old_value is None:
-            dict.pop(self, key)
+            self._pop(key)
         else:
-            dict.__setitem__(self, key, old_value)
+            self._set(key, old_value)
 
     @undoable
     def pop(self, key, *args):
-        res = dict.pop(self, key, *args)
+        res = self._pop(key, *args)
 
         yield "pop", res
 
         # Undo actions
         if res is not None:
-            dict.__setitem__(self, key, res)
+            self._set(key, res)
 
 # End of class KeyValueStore
 
+
+class StoreSnapshot(object):
+    """Read-only copy-on-write view of a KeyValueStore
+
+    The snapshot reads from the store. Before a key of the store is
+    changed, its old value is saved in the snapshot. Bulk changes such as
+    clear or row insertions detach the snapshot, which then copies its
+    content. Reads are consistent while another thread changes the store.
+
+    Parameters
+    ----------
+    store: KeyValueStore
+    \tStore, of which the snapshot is taken
+
+    """
+
+    # Marks keys that are absent in the snapshot
+    _missing = object()
+
+    def __init__(self, store):
+        self.store = store
+        self.default_value = store.default_value
+
+        # Maps changed keys to their old value or _missing
+        self.saved = {}
+
+        # Content after detach, None while attached
+        self.data = None
+
+    def preserve(self, key):
+        """Saves the value of key in the store if it is not saved yet"""
+
+        if key not in self.saved:
+            self.saved[key] = self.store.get(key, self._missing)
+
+    def detach(self):
+        """Copies the content so that the store is not read any more"""
+
+        self.data = dict(self.iteritems())
+
+    def _get_value(self, key):
+        """Returns value of key or _missing"""
+
+        data = self.data
+
+        if data is None:
+            # The store is read before the saved values, which the store
+            # fills before it changes a key
+            value = self.store.get(key, self._missing)
+            value = self.saved.get(key, value)
+
+            # Detaching precedes bulk changes of the store
+            if self.data is None:
+                return value
+
+            data = self.data
+
+        return data.get(key, self._missing)
+
+    def __getitem__(self, key):
+        value = self._get_value(key)
+
+        if value is self._missing:
+            return self.default_value
+
+        return value
+
+    def get(self, key, default=None):
+        value = self._get_value(key)
+
+        if value is self._missing:
+            return default
+
+        return value
+
+    def __contains__(self, key):
+        return self._get_value(key) is not self._missing
+
+    def items(self):
+        """Returns list of (key, value) tuples"""
+
+        data = self.data
+
+        if data is None:
+            keys = set(self.store.keys())
+            keys.update(self.saved.keys())
+
+            items = []
+            for key in keys:
+                value = self._get_value(key)
+                if value is not self._missing:
+                    items.append((key, value))
+
+            if self.data is None:
+                return items
+
+            data = self.data
+
+        return data.items()
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def keys(self):
+        return [key for key, __ in self.items()]
+
+    def iterkeys(self):
+        return iter(self.keys())
+
+    __iter__ = iterkeys
+
+    def __len__(self):
+        return len(self.items())
+
+# End of class StoreSnapshot
+
+
+class SizeStore(KeyValueStore):
+    """KeyValueStore of row heights or col widths with prefix sums
+
+    Keys have the format (row, table) or (col, table). A SizeIndex of each
+    table is kept up to date with the content, i.e. also on undo and redo.
+
+    """
+
+    def __init__(self, default_value=None):
+        KeyValueStore.__init__(self, default_value)
+
+        # Maps table to SizeIndex
+        self.indices = {}
+
+    def _set(self, key, value):
+        """Stores value and updates the index of the table"""
+
+        KeyValueStore._set(self, key, value)
+
+        pos, tab = key
+        self.indices.setdefault(tab, SizeIndex()).set(pos, value)
+
+    def _pop(self, key, *args):
+        """Removes key and updates the index of the table"""
+
+        res = KeyValueStore._pop(self, key, *args)
+
+        pos, tab = key
+        size_index = self.indices.get(tab)
+        if size_index is not None:
+            size_index.set(pos, None)
+            if not size_index:
+                del self.indices[tab]
+
+        return res
+
+    def clear(self):
+        KeyValueStore.clear(self)
+        self.indices.clear()
+
+    def get_sum(self, first, last, tab, default=None):
+        """Returns sum of the sizes of first <= row/col < last in table tab
+
+        Parameters
+        ----------
+        first: Integer
+        \tFirst row/col of the range
+        last: Integer
+        \tRow/col after the range
+        tab: Integer
+        \tTable of the rows/cols
+        default: Number, defaults to None
+        \tSize of rows/cols without size, default_value if None
+
+        """
+
+        if default is None:
+            default = self.default_value
+
+        size_index = self.indices.get(tab)
+
+        if size_index is None:
+            return max(0, last - first) * default
+
+        return size_index.get_sum(first, last, default)
+
+# End of class SizeStore
+
 # -----------------------------------------------------------------------------
 
 
+class AttributeView(MutableMapping):
+    """Copy-on-write view of a shared attribute record
+
+    CellAttributes shares one attribute record dict between all cells with
+    identical attributes. The view reads from the shared record. The first
+    write copies the record, so that the shared record remains unchanged.
+
+    Parameters
+    ----------
+    record: Dict
+    \tShared attribute record, which must not be changed
+
+    """
+
+    __slots__ = ("record", "_data")
+
+    def __init__(self, record):
+        self.record = record
+        self._data = record
+
+    def _get_writable(self):
+        """Returns dict that may be changed, copies record on first call"""
+
+        if self._data is self.record:
+            self._data = dict(self.record)
+
+        return self._data
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._get_writable()[key] = value
+
+    def __delitem__(self, key):
+        del self._get_writable()[key]
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return repr(self._data)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def iteritems(self):
+        return self._data.iteritems()
+
+    def copy(self):
+        """Returns dict copy of the attributes"""
+
+        return dict(self._data)
+
+# End of class AttributeView
+
+# -----------------------------------------------------------------------------
+
 
 class CellAttributes(list):
     """Stores cell formatting attributes in a list of 3 - tuples
@@ -127,6 +467,9 @@ class CellAttributes(list):
 
     List methods that may alter the list have been removed
 
+    Attributes may be read and changed from more than one thread, e.g. by
+    the renderer and by cells that are evaluated in a background thread.
+
     """
 
     def __init__(self, *args, **kwargs):
@@ -145,6 +488,34 @@ class CellAttributes(list):
         self.reverse = None
         self.sort = None
 
+        self._attr_cache = {}
+        self._table_cache = {}
+        self._table_index = {}
+        self._record_cache = {}
+        self._records = {}
+        self._layers = {}
+        self._merge_areas = {}
+
+        # Guards the list and its caches, see class docstring
+        self._lock = threading.RLock()
+
+        # Length after the last compaction, see is_compaction_due
+        self._compacted_len = 0
+
+    def __getstate__(self):
+        """Returns state without lock"""
+
+        state = self.__dict__.copy()
+        del state["_lock"]
+
+        return state
+
+    def __setstate__(self, state):
+        """Restores state with a new lock"""
+
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
     default_cell_attributes = {
         "borderwidth_bottom": 1,
         "borderwidth_right": 1,
@@ -172,1004 +543,2934 @@ class CellAttributes(list):
         "video_volume": None,
     }
 
-    # Cache for __getattr__ maps key to tuple of len and attr_dict
-
-    _attr_cache = {}
-    _table_cache = {}
+    # Entries with these attributes are not merged by get_compacted
+    # because their selections are evaluated individually
+    unmergeable_attributes = ("frozen", "merge_area")
+
+    # Caches for __getitem__, which are kept up to date by _invalidate
+    # _attr_cache maps table to dict that maps (row chunk, col chunk) to
+    # dict that maps (row, col) to shared record, see _get_chunk_key
+    # _table_cache maps table to list of (selection, attr_dict)
+    # _table_index maps table to SelectionIndex of its _table_cache list
+    # _record_cache maps table to dict that maps a tuple of _table_cache
+    # indices to the shared record of the resolved attributes
+    # _records maps attribute items to shared records
+    # _layers maps (table, attribute key) to (SelectionIndex, values) of the
+    # entries that set the attribute or to None if there are none
+    # _merge_areas maps table to dict that maps (row, col) of merged cells
+    # to merge areas or to None if merge areas have unbounded selections
 
     @undoable
     def append(self, value):
-        list.append(self, value)
-        self._attr_cache.clear()
-        self._table_cache.clear()
+        with self._lock:
+            list.append(self, value)
+            self._cache_append(value)
 
         yield "append"
 
         # Undo actions
 
-        list.pop(self)
-        self._attr_cache.clear()
-        self._table_cache.clear()
+        with self._lock:
+            list.pop(self)
+            self._cache_pop(value)
 
     def __getitem__(self, key):
-        """Returns attribute dict for a single key"""
-
-        assert not any(type(key_ele) is SliceType for key_ele in key)
+        """Returns attribute dict view for a single key
 
-        if key in self._attr_cache:
-            cache_len, cache_dict = self._attr_cache[key]
+        The view is an AttributeView of a record that is shared by all cells
+        with identical attributes. Changing the view does not change the
+        attributes of any cell.
 
-            # Use cache result only if no new attrs have been defined
-            if cache_len == len(self):
-                return cache_dict
+        """
 
-        # Update table cache if it is outdated (e.g. when creating a new grid)
-        if len(self) != self._len_table_cache():
-            self._update_table_cache()
+        assert not any(type(key_ele) is SliceType for key_ele in key)
 
-        row, col, tab = key
+        with self._lock:
+            self._sync_caches()
 
-        result_dict = copy(self.default_cell_attributes)
+            row, col, tab = key
 
-        try:
-            for selection, attr_dict in self._table_cache[tab]:
-                if (row, col) in selection:
-                    result_dict.update(attr_dict)
-        except KeyError:
-            pass
+            chunk_key = self._get_chunk_key(row, col)
 
-        # Upddate cache with current length and dict
-        self._attr_cache[key] = (len(self), result_dict)
+            try:
+                return AttributeView(
+                    self._attr_cache[tab][chunk_key][row, col])
 
-        return result_dict
+            except KeyError:
+                pass
 
-    @undoable
-    def __setitem__(self, key, value):
-        """Undoable version of list.__setitem__"""
+            try:
+                table_cache = self._table_cache[tab]
+            except KeyError:
+                table_cache = []
 
-        try:
-            old_value = list.__getitem__(self, key)
-        except IndexError:
-            old_value = None
+            if table_cache:
+                try:
+                    table_index = self._table_index[tab]
+                except KeyError:
+                    table_index = self._table_index[tab] = SelectionIndex(
+                        selection for selection, __ in table_cache)
 
-        list.__setitem__(self, key, value)
+                indices = tuple(table_index.get_indices(row, col))
 
-        self._attr_cache.clear()
-        self._table_cache.clear()
+            else:
+                indices = ()
 
-        yield "__setitem__"
+            record = self._get_record(tab, indices)
+            self._attr_cache.setdefault(tab, {}).setdefault(chunk_key, {})[
+                row, col] = record
 
-        if old_value is None:
-            self.pop(key)
-        else:
-            list.__setitem__(self, key, old_value)
+            return AttributeView(record)
 
-        self._attr_cache.clear()
-        self._table_cache.clear()
+    def get(self, key, attr_key):
+        """Returns the value of the attribute attr_key of cell key
 
-    def _len_table_cache(self):
-        """Returns the length of the table cache"""
+        Unlike __getitem__, only the entries of the table that set attr_key
+        are looked up via an index of these entries, i.e. the other
+        attributes are not resolved.
 
-        length = 0
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of the cell
+        attr_key: String
+        \tAttribute key, e.g. "frozen"
 
-        for table in self._table_cache:
-            length += len(self._table_cache[table])
+        """
 
-        return length
+        with self._lock:
+            self._sync_caches()
 
-    def _update_table_cache(self):
-        """Clears and updates the table cache to be in sync with self"""
+            row, col, tab = key
 
-        self._table_cache.clear()
-        for sel, tab, val in self:
             try:
-                self._table_cache[tab].append((sel, val))
+                return self._attr_cache[tab][self._get_chunk_key(row, col)][
+                    row, col][attr_key]
+
             except KeyError:
-                self._table_cache[tab] = [(sel, val)]
+                pass
 
-        assert len(self) == self._len_table_cache()
+            layer = self._get_layer(tab, attr_key)
 
-    def get_merging_cell(self, key):
-        """Returns key of cell that merges the cell key
+            if layer is not None:
+                layer_index, values = layer
+                indices = layer_index.get_indices(row, col)
 
-        or None if cell key not merged
+                if indices:
+                    # The last entry overrides all others
+                    return values[indices[-1]]
+
+            return self.default_cell_attributes[attr_key]
+
+    def get_merge_area(self, key):
+        """Returns merge area (top, left, bottom, right) of cell key or None
+
+        Merge areas are looked up in a dict per table that maps each merged
+        cell to its merge area.
 
         Parameters
         ----------
         key: 3-tuple of Integer
-        \tThe key of the cell that is merged
+        \tKey of the cell
 
         """
 
-        row, col, tab = key
+        with self._lock:
+            self._sync_caches()
 
-        # Is cell merged
-        merge_area = self[key]["merge_area"]
+            row, col, tab = key
 
-        if merge_area:
-            return merge_area[0], merge_area[1], tab
+            try:
+                merge_areas = self._merge_areas[tab]
 
-# End of class CellAttributes
+            except KeyError:
+                merge_areas = self._merge_areas[tab] = \
+                    self._get_merge_areas(tab)
 
+            if merge_areas is None:
+                # Merge area of unbounded selection
+                return self.get(key, "merge_area")
 
-class DictGrid(KeyValueStore):
-    """The core data class with all information that is stored in a pys file.
+            return merge_areas.get((row, col))
 
-    Besides grid code access via standard dict operations, it provides
-    the following attributes:
+    def _get_merge_areas(self, tab):
+        """Returns dict that maps merged cells of table tab to merge areas
 
-    * cell_attributes: Stores cell formatting attributes
-    * macros:          String of all macros
+        Returns None if a merge area attribute has an unbounded selection.
 
-    This class represents layer 1 of the model.
+        """
 
-    Parameters
-    ----------
-    shape: n-tuple of integer
-    \tShape of the grid
+        merge_areas = {}
 
-    """
+        for selection, attr_dict in self._table_cache.get(tab, []):
+            if "merge_area" in attr_dict:
+                if not self._update_merge_areas(merge_areas, selection,
+                                                attr_dict["merge_area"]):
+                    return
 
-    def __init__(self, shape):
-        KeyValueStore.__init__(self)
+        return merge_areas
 
-        self.shape = shape
+    @staticmethod
+    def _update_merge_areas(merge_areas, selection, merge_area):
+        """Sets merge area of cells in selection in merge_areas dict
 
-        self.cell_attributes = CellAttributes()
+        Returns False if the cells of the selection are unbounded.
 
-        self.macros = u""
+        """
 
-        default_row_height = config["default_row_height"]
-        default_col_width = config["default_col_width"]
+        if selection.rows or selection.cols:
+            return False
 
-        # Keys have the format (row, table)
-        self.row_heights = KeyValueStore(default_value=default_row_height)
+        cells = [tuple(cell) for cell in selection.cells]
 
-        # Keys have the format (col, table)
-        self.col_widths = KeyValueStore(default_value=default_col_width)
+        for top_left, bottom_right in zip(selection.block_tl,
+                                          selection.block_br):
+            if None in top_left or None in bottom_right:
+                return False
 
-    def __getitem__(self, key):
+            (top, left), (bottom, right) = top_left, bottom_right
+            cells += product(xrange(top, bottom + 1), xrange(left, right + 1))
 
-        shape = self.shape
+        for cell in cells:
+            if merge_area is None:
+                merge_areas.pop(cell, None)
+            else:
+                merge_areas[cell] = merge_area
 
-        for axis, key_ele in enumerate(key):
-            if shape[axis] <= key_ele or key_ele < -shape[axis]:
-                msg = "Grid index {key} outside grid shape {shape}."
-                msg = msg.format(key=key, shape=shape)
-                raise IndexError(msg)
+        return True
 
-        return KeyValueStore.__getitem__(self, key)
+    def _get_layer(self, tab, attr_key):
+        """Returns (SelectionIndex, values) of entries that set attr_key
 
-# End of class DictGrid
+        Returns None if no entry of table tab sets attr_key.
 
-# -----------------------------------------------------------------------------
+        """
 
+        try:
+            return self._layers[tab, attr_key]
 
-class DataArray(object):
-    """DataArray provides enhanced grid read/write access.
+        except KeyError:
+            pass
 
-    Enhancements comprise:
-     * Slicing
-     * Multi-dimensional operations such as insertion and deletion along 1 axis
-     * Undo/redo operations
+        layer = None
 
-    This class represents layer 2 of the model.
+        for selection, attr_dict in self._table_cache.get(tab, []):
+            if attr_key in attr_dict:
+                if layer is None:
+                    layer = SelectionIndex(), []
 
-    Parameters
-    ----------
-    shape: n-tuple of integer
-    \tShape of the grid
+                layer[0].append(selection)
+                layer[1].append(attr_dict[attr_key])
 
-    """
+        self._layers[tab, attr_key] = layer
 
-    def __init__(self, shape):
-        self.dict_grid = DictGrid(shape)
-
-        # Safe mode
-        self.safe_mode = False
-
-    def __eq__(self, other):
-        if not hasattr(other, "dict_grid") or \
-           not hasattr(other, "cell_attributes"):
-            return NotImplemented
-
-        return self.dict_grid == other.dict_grid and \
-            self.cell_attributes == other.cell_attributes
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
-
-    # Data is the central content interface for loading / saving data.
-    # It shall be used for loading and saving from and to pys and other files.
-    # It shall be used for loading and saving macros.
-    # It is not used for importinf and exporting data because these operations
-    # are partial to the grid.
-
-    def _get_data(self):
-        """Returns dict of data content.
+        return layer
 
-        Keys
-        ----
+    def _get_record(self, tab, indices):
+        """Returns shared attribute record for the table cache entries
 
-        shape: 3-tuple of Integer
-        \tGrid shape
-        grid: Dict of 3-tuples to strings
-        \tCell content
-        attributes: List of 3-tuples
-        \tCell attributes
-        row_heights: Dict of 2-tuples to float
-        \t(row, tab): row_height
-        col_widths: Dict of 2-tuples to float
-        \t(col, tab): col_width
-        macros: String
-        \tMacros from macro list
+        Parameters
+        ----------
+        tab: Integer
+        \tTable of the entries
+        indices: Tuple of Integer
+        \tAscending indices of the entries in the table cache of tab
 
         """
 
-        data = {}
+        record_cache = self._record_cache.setdefault(tab, {})
 
-        data["shape"] = self.shape
-        data["grid"] = {}.update(self.dict_grid)
-        data["attributes"] = [ca for ca in self.cell_attributes]
-        data["row_heights"] = self.row_heights
-        data["col_widths"] = self.col_widths
-        data["macros"] = self.macros
+        try:
+            return record_cache[indices]
 
-        return data
+        except KeyError:
+            pass
 
-    def _set_data(self, **kwargs):
-        """Sets data from given parameters
+        record = copy(self.default_cell_attributes)
 
-        Old values are deleted.
-        If a paremeter is not given, nothing is changed.
+        # Later attributes override earlier ones
+        table_cache = self._table_cache.get(tab, [])
+        for i in indices:
+            record.update(table_cache[i][1])
 
-        Parameters
-        ----------
+        # Cells with identical attributes share one record
+        try:
+            record = self._records.setdefault(frozenset(record.iteritems()),
+                                              record)
 
-        shape: 3-tuple of Integer
-        \tGrid shape
-        grid: Dict of 3-tuples to strings
-        \tCell content
-        attributes: List of 3-tuples
-        \tCell attributes
-        row_heights: Dict of 2-tuples to float
-        \t(row, tab): row_height
-        col_widths: Dict of 2-tuples to float
-        \t(col, tab): col_width
-        macros: String
-        \tMacros from macro list
+        except TypeError:
+            # Unhashable attribute value
+            pass
 
-        """
+        record_cache[indices] = record
 
-        if "shape" in kwargs:
-            self.shape = kwargs["shape"]
+        return record
 
-        if "grid" in kwargs:
-            self.dict_grid.clear()
-            self.dict_grid.update(kwargs["grid"])
+    @undoable
+    def __setitem__(self, key, value):
+        """Undoable version of list.__setitem__"""
 
-        if "attributes" in kwargs:
-            self.attributes[:] = kwargs["attributes"]
+        with self._lock:
+            try:
+                old_value = list.__getitem__(self, key)
+            except IndexError:
+                old_value = None
 
-        if "row_heights" in kwargs:
-            self.row_heights = kwargs["row_heights"]
+            list.__setitem__(self, key, value)
 
-        if "col_widths" in kwargs:
-            self.col_widths = kwargs["col_widths"]
+            self._cache_replace(key, old_value, value)
 
-        if "macros" in kwargs:
-            self.macros = kwargs["macros"]
+        yield "__setitem__"
 
-    data = property(_get_data, _set_data)
+        with self._lock:
+            if old_value is None:
+                self.pop(key)
+            else:
+                list.__setitem__(self, key, old_value)
 
-    def get_row_height(self, row, tab):
-        """Returns row height"""
+            self._cache_replace(key, value, old_value)
 
-        try:
-            return self.row_heights[(row, tab)]
+    def _sync_caches(self):
+        """Rebuilds caches if they are outdated, e.g. for a new grid"""
 
-        except KeyError:
-            return config["default_row_height"]
+        if len(self) != self._len_table_cache():
+            self._attr_cache.clear()
+            self._update_table_cache()
 
-    def get_col_width(self, col, tab):
-        """Returns column width"""
+    def _len_table_cache(self):
+        """Returns the length of the table cache"""
 
-        try:
-            return self.col_widths[(col, tab)]
+        length = 0
 
-        except KeyError:
-            return config["default_col_width"]
+        for table in self._table_cache:
+            length += len(self._table_cache[table])
 
-    # Row and column attributes mask
-    # Keys have the format (row, table)
+        return length
 
-    def _get_row_heights(self):
-        """Returns row_heights dict"""
+    def _update_table_cache(self):
+        """Clears and updates the table cache to be in sync with self"""
 
-        return self.dict_grid.row_heights
+        self._table_cache.clear()
+        self._table_index.clear()
+        self._record_cache.clear()
+        self._records.clear()
+        self._layers.clear()
+        self._merge_areas.clear()
 
-    def _set_row_heights(self, row_heights):
-        """Sets  macros string"""
+        for sel, tab, val in self:
+            try:
+                self._table_cache[tab].append((sel, val))
+            except KeyError:
+                self._table_cache[tab] = [(sel, val)]
 
-        self.dict_grid.row_heights = row_heights
+        assert len(self) == self._len_table_cache()
 
-    row_heights = property(_get_row_heights, _set_row_heights)
+    def _update_table(self, tab):
+        """Updates the table cache of table tab to be in sync with self"""
 
-    def _get_col_widths(self):
-        """Returns col_widths dict"""
+        table_cache = [(sel, val) for sel, table, val in self if table == tab]
 
-        return self.dict_grid.col_widths
+        if table_cache:
+            self._table_cache[tab] = table_cache
+        else:
+            self._table_cache.pop(tab, None)
 
-    def _set_col_widths(self, col_widths):
-        """Sets  macros string"""
+        self._table_index.pop(tab, None)
+        self._record_cache.pop(tab, None)
 
-        self.dict_grid.col_widths = col_widths
+        for layer_key in self._layers.keys():
+            if layer_key[0] == tab:
+                del self._layers[layer_key]
 
-    col_widths = property(_get_col_widths, _set_col_widths)
+        self._merge_areas.pop(tab, None)
 
-    # Cell attributes mask
-    def _get_cell_attributes(self):
-        """Returns cell_attributes list"""
+    @staticmethod
+    def _get_chunk_key(row, col):
+        """Returns (row chunk, col chunk) of a cell in _attr_cache"""
 
-        return self.dict_grid.cell_attributes
+        return row // ChunkIndex.chunk_rows, col // ChunkIndex.chunk_cols
 
-    def _set_cell_attributes(self, value):
-        """Setter for cell_atributes"""
+    def _invalidate(self, selection, tab):
+        """Removes cached attributes of cells in the bounding box of selection
 
-        # Empty cell_attributes first
-        self.cell_attributes[:] = []
-        self.cell_attributes.extend(value)
+        Parameters
+        ----------
+        selection: Selection
+        \tSelection, for which attributes have changed
+        tab: Integer
+        \tTable, for which attributes have changed
 
-    cell_attributes = attributes = \
-        property(_get_cell_attributes, _set_cell_attributes)
+        """
 
-    def __iter__(self):
-        """Returns iterator over self.dict_grid"""
+        try:
+            chunks = self._attr_cache[tab]
+        except KeyError:
+            return
 
-        return iter(self.dict_grid)
+        bounds = get_bounds(selection)
+        if bounds is None:
+            return
 
-    def _get_macros(self):
-        """Returns macros string"""
+        top, left, bottom, right = bounds
 
-        return self.dict_grid.macros
+        chunk_rows = ChunkIndex.chunk_rows
+        chunk_cols = ChunkIndex.chunk_cols
 
-    def _set_macros(self, macros):
-        """Sets  macros string"""
+        for chunk_key in chunks.keys():
+            chunk_top = chunk_key[0] * chunk_rows
+            chunk_left = chunk_key[1] * chunk_cols
+            chunk_bottom = chunk_top + chunk_rows - 1
+            chunk_right = chunk_left + chunk_cols - 1
 
-        self.dict_grid.macros = macros
+            if chunk_bottom < top or chunk_top > bottom or \
+               chunk_right < left or chunk_left > right:
+                continue
 
-    macros = property(_get_macros, _set_macros)
+            if top <= chunk_top and chunk_bottom <= bottom and \
+               left <= chunk_left and chunk_right <= right:
+                del chunks[chunk_key]
+                continue
 
-    def keys(self):
-        """Returns keys in self.dict_grid"""
+            chunk = chunks[chunk_key]
+            for row, col in chunk.keys():
+                if top <= row <= bottom and left <= col <= right:
+                    del chunk[row, col]
 
-        return self.dict_grid.keys()
+            if not chunk:
+                del chunks[chunk_key]
 
-    def pop(self, key):
-        """Pops dict_grid
+    def invalidate(self, selection, tab):
+        """Removes cached attributes of the cells of selection in table tab
+
+        This is required after the attribute dicts of entries have been
+        changed in place.
 
         Parameters
         ----------
-        key: 3-tuple of Integer
-        \tCell key that shall be popped
+        selection: Selection
+        \tSelection, for which attributes have changed
+        tab: Integer
+        \tTable, for which attributes have changed
 
         """
 
-        return self.dict_grid.pop(key)
+        with self._lock:
+            self._invalidate(selection, tab)
 
-    # Shape mask
+    def _cache_append(self, value):
+        """Updates caches after value has been appended"""
 
-    def _get_shape(self):
-        """Returns dict_grid shape"""
+        selection, tab, attr_dict = value
 
-        return self.dict_grid.shape
+        if len(self) - 1 != self._len_table_cache():
+            self._attr_cache.clear()
+            self._update_table_cache()
+            return
 
-    @undoable
-    def _set_shape(self, shape):
-        """Deletes all cells beyond new shape and sets dict_grid shape
+        self._table_cache.setdefault(tab, []).append((selection, attr_dict))
 
-        Parameters
-        ----------
-        shape: 3-tuple of Integer
-        \tTarget shape for grid
+        if tab in self._table_index:
+            self._table_index[tab].append(selection)
 
-        """
+        for attr_key, attr_value in attr_dict.iteritems():
+            try:
+                layer = self._layers[tab, attr_key]
+            except KeyError:
+                continue
 
-        # Delete each cell that is beyond new borders
+            if layer is None:
+                layer = self._layers[tab, attr_key] = SelectionIndex(), []
 
-        old_shape = self.shape
-        deleted_cells = {}
+            layer[0].append(selection)
+            layer[1].append(attr_value)
 
-        if any(new_axis < old_axis
-               for new_axis, old_axis in zip(shape, old_shape)):
-            for key in self.dict_grid.keys():
-                if any(key_ele >= new_axis
-                       for key_ele, new_axis in zip(key, shape)):
-                    deleted_cells[key] = self.pop(key)
+        if "merge_area" in attr_dict and \
+           self._merge_areas.get(tab) is not None and \
+           not self._update_merge_areas(self._merge_areas[tab], selection,
+                                        attr_dict["merge_area"]):
+            self._merge_areas[tab] = None
 
-        # Set dict_grid shape attribute
-        self.dict_grid.shape = shape
+        self._invalidate(selection, tab)
 
-        self._adjust_rowcol(0, 0, 0)
-        self._adjust_cell_attributes(0, 0, 0)
+    def _cache_pop(self, value):
+        """Updates caches after value has been removed from the end"""
 
-        # Undo actions
+        selection, tab, attr_dict = value
 
-        yield "_set_shape"
+        if len(self) + 1 != self._len_table_cache():
+            self._attr_cache.clear()
+            self._update_table_cache()
+            return
 
-        self.shape = old_shape
+        self._update_table(tab)
+        self._invalidate(selection, tab)
 
-        for key in deleted_cells:
-            self[key] = deleted_cells[key]
+    def _cache_replace(self, key, old_value, new_value):
+        """Updates caches after old_value has been replaced by new_value"""
 
-    shape = property(_get_shape, _set_shape)
+        if type(key) is SliceType or old_value is None or \
+           len(self) != self._len_table_cache():
+            self._attr_cache.clear()
+            self._update_table_cache()
+            return
 
-    def get_last_filled_cell(self, table=None):
-        """Returns key for the bottommost rightmost cell with content
+        for selection, tab, attr_dict in old_value, new_value:
+            self._update_table(tab)
+            self._invalidate(selection, tab)
 
-        Parameters
-        ----------
-        table: Integer, defaults to None
-        \tLimit search to this table
+    def get_compacted(self):
+        """Returns compacted list of (selection, table, attr_dict) tuples
+
+        The resolved attributes of all cells are identical to those of self.
+        Attributes that are overridden by later entries for all cells of
+        their selection are dropped. Subsequent entries of a table with equal
+        selections are coalesced into one entry. Subsequent entries of a
+        table with equal attributes are merged into one selection.
 
         """
 
-        maxrow = 0
-        maxcol = 0
+        # Drop overridden attributes, last entries first
+        # Maps (table, attribute key) to index of later selections
+        later_selections = {}
+        live_entries = []
 
-        for row, col, tab in self.dict_grid:
-            if table is None or tab == table:
-                maxrow = max(row, maxrow)
-                maxcol = max(col, maxcol)
+        for selection, tab, attr_dict in reversed(self):
+            live_attr_dict = {}
 
-        return maxrow, maxcol, table
+            for attr_key, value in attr_dict.iteritems():
+                try:
+                    index = later_selections[tab, attr_key]
+                except KeyError:
+                    index = later_selections[tab, attr_key] = \
+                        SelectionIndex()
 
-    # Pickle support
+                if not index.contains(selection):
+                    live_attr_dict[attr_key] = value
+                    index.append(selection)
 
-    def __getstate__(self):
-        """Returns dict_grid for pickling
+            if selection and live_attr_dict:
+                live_entries.append((selection, tab, live_attr_dict))
 
-        Note that all persistent data is contained in the DictGrid class
+        live_entries.reverse()
 
-        """
+        # Coalesce and merge subsequent entries of each table
+        compacted = []
+        last_entry_index = {}
 
-        return {"dict_grid": self.dict_grid}
+        # Maps table to its last entry's selection if it has been created by
+        # merging and to the sets of its rows, columns, cells and blocks
+        merged = {}
 
-    # Slice support
+        for selection, tab, attr_dict in live_entries:
+            try:
+                i = last_entry_index[tab]
 
-    def __getitem__(self, key):
-        """Adds slicing access to cell code retrieval
+            except KeyError:
+                pass
 
-        The cells are returned as a generator of generators, of ... of unicode.
+            else:
+                last_selection, __, last_attr_dict = compacted[i]
 
-        Parameters
-        ----------
-        key: n-tuple of integer or slice
-        \tKeys of the cell code that is returned
+                if selection == last_selection:
+                    last_attr_dict.update(attr_dict)
+                    continue
 
-        Note
-        ----
-        Classical Excel type addressing (A$1, ...) may be added here
+                elif attr_dict == last_attr_dict and \
+                        not any(attr_key in attr_dict
+                                for attr_key in self.unmergeable_attributes):
+                    if tab not in merged:
+                        merged[tab] = self._get_merge_target(last_selection)
+                        compacted[i] = merged[tab][0], tab, last_attr_dict
 
-        """
+                    self._merge_selection(merged[tab], selection)
+                    continue
 
-        for key_ele in key:
-            if is_slice_like(key_ele):
-                # We have something slice-like here
+            merged.pop(tab, None)
+            last_entry_index[tab] = len(compacted)
+            compacted.append((selection, tab, attr_dict))
 
-                return self.cell_array_generator(key)
+        return compacted
 
-            elif is_string_like(key_ele):
-                # We have something string-like here
-                msg = "Cell string based access not implemented"
-                raise NotImplementedError(msg)
+    @staticmethod
+    def _get_merge_target(selection):
+        """Returns (selection copy, sets of its elements) for merging"""
 
-        # key_ele should be a single cell
+        target = Selection(list(selection.block_tl), list(selection.block_br),
+                           list(selection.rows), list(selection.cols),
+                           list(selection.cells))
 
-        return self.dict_grid[key]
+        blocks = set((tuple(top_left), tuple(bottom_right))
+                     for top_left, bottom_right in zip(target.block_tl,
+                                                       target.block_br))
+        rows = set(target.rows)
+        cols = set(target.cols)
+        cells = set(tuple(cell) for cell in target.cells)
 
-    def __setitem__(self, key, value):
-        """Accepts index and slice keys
+        return target, blocks, rows, cols, cells
 
-        Parameters
+    @staticmethod
+    def _merge_selection(merge_target, selection):
+        """Adds the elements of selection to the merge target in place"""
+
+        target, blocks, rows, cols, cells = merge_target
+
+        for top_left, bottom_right in zip(selection.block_tl,
+                                          selection.block_br):
+            block = tuple(top_left), tuple(bottom_right)
+            if block not in blocks:
+                blocks.add(block)
+                target.block_tl.append(top_left)
+                target.block_br.append(bottom_right)
+
+        for row in selection.rows:
+            if row not in rows:
+                rows.add(row)
+                target.rows.append(row)
+
+        for col in selection.cols:
+            if col not in cols:
+                cols.add(col)
+                target.cols.append(col)
+
+        for cell in selection.cells:
+            if tuple(cell) not in cells:
+                cells.add(tuple(cell))
+                target.cells.append(cell)
+
+    def compact(self):
+        """Replaces self by the compacted list with undo support
+
+        See get_compacted for details.
+
+        """
+
+        with self._lock:
+            compacted = self.get_compacted()
+
+            if len(compacted) < len(self):
+                # self[:] would call the non undoable list.__setslice__
+                self.__setitem__(slice(None), compacted)
+
+            self._compacted_len = len(self)
+
+    def is_compaction_due(self):
+        """Returns True if self has grown large since the last compaction
+
+        Compaction is due if the number of entries exceeds the config
+        value attribute_compaction_threshold and has doubled since the
+        last compaction.
+
+        """
+
+        return len(self) > max(config["attribute_compaction_threshold"],
+                               2 * self._compacted_len)
+
+    def get_merging_cell(self, key):
+        """Returns key of cell that merges the cell key
+
+        or None if cell key not merged
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tThe key of the cell that is merged
+
+        """
+
+        row, col, tab = key
+
+        # Is cell merged
+        merge_area = self.get_merge_area(key)
+
+        if merge_area:
+            return merge_area[0], merge_area[1], tab
+
+# End of class CellAttributes
+
+
+class DictGrid(KeyValueStore):
+    """The core data class with all information that is stored in a pys file.
+
+    Besides grid code access via standard dict operations, it provides
+    the following attributes:
+
+    * cell_attributes: Stores cell formatting attributes
+    * macros:          String of all macros
+
+    This class represents layer 1 of the model.
+
+    Cell keys are grouped by table and by blocks of rows and columns in
+    the chunk index, which is kept up to date with the dict content.
+
+    Inserting, deleting and reordering rows and columns edits the AxisMaps
+    in row_maps and col_maps instead of moving cells. The dict methods
+    accept and return logical keys. Cells are stored under physical keys,
+    i.e. dict(dict_grid) has to be replaced by dict(dict_grid.iteritems()).
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+
+    """
+
+    # Index of cell keys, which may be replaced by subclasses
+    key_index_class = ChunkIndex
+
+    # Region queries with more physical ranges scan the whole table
+    max_range_queries = 16
+
+    def __init__(self, shape):
+        KeyValueStore.__init__(self)
+
+        self.shape = shape
+
+        self.chunks = self.key_index_class()
+
+        # Map logical to physical rows and cols, keys are tables
+        # Tables without map store cells under their logical keys.
+        self.row_maps = {}
+        self.col_maps = {}
+
+        # Occupancy of tables in logical keys, created on demand
+        self._occupancy = {}
+
+        self.cell_attributes = CellAttributes()
+
+        self.macros = u""
+
+        default_row_height = config["default_row_height"]
+        default_col_width = config["default_col_width"]
+
+        # Keys have the format (row, table)
+        self.row_heights = SizeStore(default_value=default_row_height)
+
+        # Keys have the format (col, table)
+        self.col_widths = SizeStore(default_value=default_col_width)
+
+    def __getitem__(self, key):
+
+        shape = self.shape
+
+        for axis, key_ele in enumerate(key):
+            if shape[axis] <= key_ele or key_ele < -shape[axis]:
+                msg = "Grid index {key} outside grid shape {shape}."
+                msg = msg.format(key=key, shape=shape)
+                raise IndexError(msg)
+
+        return KeyValueStore.__getitem__(self, self._get_physical(key))
+
+    # Logical and physical keys
+
+    def _has_plain_keys(self):
+        """Returns True if all cells are stored under their logical keys"""
+
+        return not (self.row_maps or self.col_maps)
+
+    def _get_physical(self, key):
+        """Returns key, under which the cell with logical key is stored"""
+
+        if self._has_plain_keys():
+            return key
+
+        row, col, tab = key
+
+        row_map = self.row_maps.get(tab)
+        if row_map is not None:
+            row = row_map.get_physical(row)
+
+        col_map = self.col_maps.get(tab)
+        if col_map is not None:
+            col = col_map.get_physical(col)
+
+        return row, col, tab
+
+    def _get_logical(self, key):
+        """Returns logical key of the cell that is stored under key"""
+
+        row, col, tab = key
+
+        row_map = self.row_maps.get(tab)
+        if row_map is not None:
+            row = row_map.get_logical(row)
+
+        col_map = self.col_maps.get(tab)
+        if col_map is not None:
+            col = col_map.get_logical(col)
+
+        return row, col, tab
+
+    def _set(self, key, value):
+        """Stores value and indexes key"""
+
+        if self._snapshots:
+            self._preserve(key)
+
+        physical_key = self._get_physical(key)
+
+        occupancy = self._occupancy.get(key[2])
+        if occupancy is not None and \
+           not dict.__contains__(self, physical_key):
+            occupancy.add(key[0], key[1])
+
+        dict.__setitem__(self, physical_key, value)
+        self.chunks.add(physical_key)
+
+    def _pop(self, key, *args):
+        """Removes key from dict and index"""
+
+        if self._snapshots:
+            self._preserve(key)
+
+        physical_key = self._get_physical(key)
+
+        occupancy = self._occupancy.get(key[2])
+        if occupancy is not None and dict.__contains__(self, physical_key):
+            occupancy.remove(key[0], key[1])
+
+        res = dict.pop(self, physical_key, *args)
+        self.chunks.discard(physical_key)
+
+        return res
+
+    def __delitem__(self, key):
+        self._pop(key)
+
+    def __contains__(self, key):
+        return dict.__contains__(self, self._get_physical(key))
+
+    has_key = __contains__
+
+    def get(self, key, default=None):
+        return dict.get(self, self._get_physical(key), default)
+
+    def keys(self):
+        if self._has_plain_keys():
+            return dict.keys(self)
+
+        return map(self._get_logical, dict.keys(self))
+
+    def iterkeys(self):
+        if self._has_plain_keys():
+            return dict.iterkeys(self)
+
+        return imap(self._get_logical, dict.iterkeys(self))
+
+    __iter__ = iterkeys
+
+    def iteritems(self):
+        if self._has_plain_keys():
+            return dict.iteritems(self)
+
+        return ((self._get_logical(key), value)
+                for key, value in dict.iteritems(self))
+
+    def items(self):
+        return list(self.iteritems())
+
+    def copy(self):
+        """Returns dict of logical keys to cell code"""
+
+        return dict(self.iteritems())
+
+    def __eq__(self, other):
+        if self._has_plain_keys() and \
+           (not isinstance(other, DictGrid) or other._has_plain_keys()):
+            return dict.__eq__(self, other)
+
+        return len(self) == len(other) and \
+            all(other.get(key) == value for key, value in self.iteritems())
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def clear(self):
+        if self._snapshots:
+            self._detach_snapshots()
+
+        dict.clear(self)
+        self.chunks.clear()
+        self.row_maps.clear()
+        self.col_maps.clear()
+        self._occupancy.clear()
+
+    def update(self, *args, **kwargs):
+        if self._snapshots:
+            self._detach_snapshots()
+
+        self._occupancy.clear()
+
+        if not self._has_plain_keys():
+            for key, value in dict(*args, **kwargs).iteritems():
+                self._set(key, value)
+            return
+
+        dict.update(self, *args, **kwargs)
+        for key in dict.keys(self):
+            self.chunks.add(key)
+
+    # Structural edits
+
+    @undoable
+    def _edit_axis_maps(self, axis, tables, method_name, *args):
+        """Calls method of the AxisMap of axis of each table in tables
+
+        Parameters
+        ----------
+        axis: Integer in (0, 1)
+        \tAxis of the maps, i.e. 0 == row, 1 == col
+        tables: Iterable of Integer
+        \tTables of the maps
+        method_name: String
+        \tName of the AxisMap method
+        args: Tuple
+        \tArguments of the AxisMap method
+
+        """
+
+        if self._snapshots:
+            self._detach_snapshots()
+
+        maps = self.col_maps if axis else self.row_maps
+        old_maps = {}
+
+        for tab in tables:
+            self._occupancy.pop(tab, None)
+            old_maps[tab] = axis_map = maps.get(tab)
+
+            # Edited maps are copied so that undo can restore the old ones
+            if axis_map is None:
+                axis_map = AxisMap(self.shape[axis])
+            else:
+                axis_map = axis_map.copy()
+                axis_map.resize(self.shape[axis])
+
+            getattr(axis_map, method_name)(*args)
+            maps[tab] = axis_map
+
+        yield "_edit_axis_maps"
+
+        # Undo actions
+        if self._snapshots:
+            self._detach_snapshots()
+
+        for tab, axis_map in old_maps.iteritems():
+            self._occupancy.pop(tab, None)
+            if axis_map is None:
+                maps.pop(tab, None)
+            else:
+                maps[tab] = axis_map
+
+    def insert_axis(self, point, number, axis, tab=None):
+        """Inserts number empty rows or cols before point without moving cells
+
+        Parameters
+        ----------
+        point: Integer
+        \tFirst row/col of the inserted rows/cols
+        number: Integer >= 0
+        \tNumber of rows/cols that shall be inserted
+        axis: Integer in (0, 1)
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col
+        tab: Integer, defaults to None
+        \tIf given then insertion is limited to this tab
+
+        """
+
+        tables = self.get_tables() if tab is None else [tab]
+        self._edit_axis_maps(axis, tables, "insert", point, number)
+
+    def delete_axis(self, point, number, axis, tab=None):
+        """Removes number rows or cols from point on without moving cells
+
+        The removed rows/cols must not contain cells. Empty rows/cols are
+        appended at the end of the axis.
+
+        Parameters
+        ----------
+        point: Integer
+        \tFirst row/col of the removed rows/cols
+        number: Integer >= 0
+        \tNumber of rows/cols that shall be removed
+        axis: Integer in (0, 1)
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col
+        tab: Integer, defaults to None
+        \tIf given then deletion is limited to this tab
+
+        """
+
+        tables = self.get_tables() if tab is None else [tab]
+        self._edit_axis_maps(axis, tables, "delete", point, number)
+
+    def permute_axis(self, order, axis, tab):
+        """Reorders rows or cols so that new row/col i is old row/col order[i]
+
+        Parameters
+        ----------
+        order: List of Integer
+        \tPermutation of range(len(order))
+        axis: Integer in (0, 1)
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col
+        tab: Integer
+        \tTable, in which rows/cols are reordered
+
+        """
+
+        self._edit_axis_maps(axis, [tab], "permute", order)
+
+    # Queries
+
+    def get_keys(self, tab=None, top=0, left=0, bottom=INF, right=INF):
+        """Returns list of keys of cells in a region of one or all tables
+
+        Only chunks that overlap the region are visited.
+
+        Parameters
+        ----------
+        tab: Integer, defaults to None
+        \tTable of the keys, all tables if None
+        top: Integer, defaults to 0
+        \tTop row of the region
+        left: Integer, defaults to 0
+        \tLeft column of the region
+        bottom: Integer, defaults to INF
+        \tBottom row of the region (inclusive)
+        right: Integer, defaults to INF
+        \tRight column of the region (inclusive)
+
+        """
+
+        if self._has_plain_keys():
+            return list(self.chunks.get_keys(tab, top, left, bottom, right))
+
+        tables = self.get_tables() if tab is None else [tab]
+        keys = []
+
+        for table in tables:
+            row_map = self.row_maps.get(table)
+            col_map = self.col_maps.get(table)
+
+            if row_map is None and col_map is None:
+                physical_keys = self.chunks.get_keys(table, top, left,
+                                                     bottom, right)
+                keys += imap(self._get_logical, physical_keys)
+                continue
+
+            if row_map is None:
+                row_ranges = [(top, bottom)]
+            else:
+                row_ranges = row_map.get_physical_ranges(top, bottom)
+
+            if col_map is None:
+                col_ranges = [(left, right)]
+            else:
+                col_ranges = col_map.get_physical_ranges(left, right)
+
+            if len(row_ranges) * len(col_ranges) > self.max_range_queries:
+                # Many small ranges, e.g. after sorting
+                for key in imap(self._get_logical,
+                                self.chunks.get_keys(table)):
+                    if top <= key[0] <= bottom and left <= key[1] <= right:
+                        keys.append(key)
+                continue
+
+            for row_first, row_last in row_ranges:
+                for col_first, col_last in col_ranges:
+                    physical_keys = self.chunks.get_keys(
+                        table, row_first, col_first, row_last, col_last)
+                    keys += imap(self._get_logical, physical_keys)
+
+        return keys
+
+    def get_tables(self):
+        """Returns sorted list of tables that contain cells"""
+
+        return self.chunks.get_tables()
+
+    def get_occupancy(self, tab):
+        """Returns Occupancy of table tab
+
+        The occupancy is built from the chunk index on first access. It is
+        kept up to date on cell changes and rebuilt after rows or columns
+        of the table have been inserted, deleted or reordered.
+
+        Parameters
+        ----------
+        tab: Integer
+        \tTable of the occupancy
+
+        """
+
+        occupancy = self._occupancy.get(tab)
+
+        if occupancy is None:
+            cells = [key[:2] for key in self.get_keys(tab)]
+            occupancy = self._occupancy[tab] = Occupancy(cells)
+
+        return occupancy
+
+    def get_bbox(self, tab):
+        """Returns (bottom, right) of the cells in table tab or None if empty
+
+        Parameters
+        ----------
+        tab: Integer
+        \tTable that is inspected
+
+        """
+
+        bbox = self.get_occupancy(tab).get_bbox()
+
+        if bbox is not None:
+            return bbox[2:]
+
+    def get_next_filled(self, key, axis, reverse=False):
+        """Returns row or column of next filled cell in line of key or None
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tCell, behind which the search starts
+        axis: Integer in (0, 1)
+        \tSearch downwards in the column if 0, right in the row if 1
+        reverse: Bool, defaults to False
+        \tSearch upwards or left if True
+
+        """
+
+        row, col, tab = key
+        occupancy = self.get_occupancy(tab)
+
+        if axis == 0:
+            return occupancy.get_next_in_col(col, row, reverse)
+
+        return occupancy.get_next_in_row(row, col, reverse)
+
+    def __getstate__(self):
+        """Returns state without occupancies, which are rebuilt on demand"""
+
+        state = KeyValueStore.__getstate__(self)
+        state["_occupancy"] = {}
+
+        return state
+
+# End of class DictGrid
+
+
+class CompactDictGrid(DictGrid):
+    """DictGrid that stores keys as integers and code in a string arena
+
+    Each cell costs a dict slot, an integer key and an integer handle into
+    the arena instead of a key tuple and a string object. Keys and values
+    are packed on writes and unpacked on reads, i.e. the DictGrid
+    interface is unchanged.
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+
+    """
+
+    key_index_class = PackedChunkIndex
+
+    def __init__(self, shape):
+        DictGrid.__init__(self, shape)
+
+        self.arena = StringArena()
+
+    def _has_plain_keys(self):
+        """Returns False because keys are always packed"""
+
+        return False
+
+    def _get_physical(self, key):
+        """Returns packed key, under which the cell with key is stored"""
+
+        return pack_key(DictGrid._get_physical(self, key))
+
+    def _get_logical(self, key):
+        """Returns logical key of the cell that is stored under packed key"""
+
+        return DictGrid._get_logical(self, unpack_key(key))
+
+    def _encode(self, value):
+        """Returns arena handle of string value, other values are wrapped"""
+
+        if StringArena.is_storable(value):
+            return self.arena.add(value)
+
+        return (value,)
+
+    def _decode(self, stored):
+        """Returns value from _encode result stored"""
+
+        if type(stored) is int or type(stored) is long:
+            return self.arena.get(stored)
+
+        elif type(stored) is tuple:
+            return stored[0]
+
+        return stored
+
+    def _discard(self, stored):
+        """Frees the arena bytes of stored"""
+
+        if type(stored) is int or type(stored) is long:
+            self.arena.discard(stored)
+
+    def __getitem__(self, key):
+        return self._decode(DictGrid.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        stored = dict.get(self, self._get_physical(key))
+
+        if stored is None:
+            return default
+
+        return self._decode(stored)
+
+    def _set(self, key, value):
+        """Stores encoded value and indexes key"""
+
+        self._discard(dict.get(self, self._get_physical(key)))
+
+        DictGrid._set(self, key, self._encode(value))
+
+        # Snapshots in other threads may decode handles of the old arena
+        if self.arena.is_compaction_due() and not self._snapshots:
+            self._compact_arena()
+
+    def _pop(self, key, *args):
+        """Removes key from dict and index, returns decoded value"""
+
+        physical_key = self._get_physical(key)
+
+        if not dict.__contains__(self, physical_key):
+            return DictGrid._pop(self, key, *args)
+
+        stored = DictGrid._pop(self, key)
+        value = self._decode(stored)
+        self._discard(stored)
+
+        return value
+
+    def _compact_arena(self):
+        """Copies all referenced strings into a new arena"""
+
+        arena = self.arena
+        self.arena = StringArena()
+
+        for key, stored in dict.iteritems(self):
+            if type(stored) is int or type(stored) is long:
+                dict.__setitem__(self, key, self.arena.add(arena.get(stored)))
+
+    def iteritems(self):
+        return ((self._get_logical(key), self._decode(stored))
+                for key, stored in dict.iteritems(self))
+
+    def itervalues(self):
+        return imap(self._decode, dict.itervalues(self))
+
+    def values(self):
+        return list(self.itervalues())
+
+    def clear(self):
+        DictGrid.clear(self)
+        self.arena = StringArena()
+
+    def __getstate__(self):
+        """Returns state with an empty arena
+
+        Copies re-add the decoded items, which fills the new arena.
+
+        """
+
+        state = DictGrid.__getstate__(self)
+        state["arena"] = StringArena()
+
+        return state
+
+# End of class CompactDictGrid
+
+
+class DiskDictGrid(DictGrid):
+    """DictGrid that keeps cell code in a DiskStore instead of the dict
+
+    Only a bounded cache of pages of the store stays in memory. The store
+    also replaces the chunk index for region queries.
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+
+    """
+
+    def __init__(self, shape):
+        DictGrid.__init__(self, shape)
+
+        self.store = self.chunks = DiskStore(config["disk_cache_pages"])
+
+    def __len__(self):
+        return len(self.store)
+
+    def _has_plain_keys(self):
+        """Returns False because the dict itself is empty"""
+
+        return False
+
+    def __getitem__(self, key):
+        shape = self.shape
+
+        for axis, key_ele in enumerate(key):
+            if shape[axis] <= key_ele or key_ele < -shape[axis]:
+                msg = "Grid index {key} outside grid shape {shape}."
+                msg = msg.format(key=key, shape=shape)
+                raise IndexError(msg)
+
+        return self.store.get(self._get_physical(key), self.default_value)
+
+    def get(self, key, default=None):
+        return self.store.get(self._get_physical(key), default)
+
+    def _set(self, key, value):
+        """Stores value in the store"""
+
+        if self._snapshots:
+            self._preserve(key)
+
+        physical_key = self._get_physical(key)
+
+        occupancy = self._occupancy.get(key[2])
+        if occupancy is not None and physical_key not in self.store:
+            occupancy.add(key[0], key[1])
+
+        self.store.set(physical_key, value)
+
+    def _pop(self, key, *args):
+        """Removes key from the store"""
+
+        if self._snapshots:
+            self._preserve(key)
+
+        physical_key = self._get_physical(key)
+
+        occupancy = self._occupancy.get(key[2])
+        if occupancy is not None and physical_key in self.store:
+            occupancy.remove(key[0], key[1])
+
+        return self.store.pop(physical_key, *args)
+
+    def __contains__(self, key):
+        return self._get_physical(key) in self.store
+
+    has_key = __contains__
+
+    def iterkeys(self):
+        return imap(self._get_logical, self.store.iterkeys())
+
+    __iter__ = iterkeys
+
+    def keys(self):
+        """Returns generator of keys, which are not loaded into memory"""
+
+        return self.iterkeys()
+
+    def iteritems(self):
+        return ((self._get_logical(key), value)
+                for key, value in self.store.iteritems())
+
+    def itervalues(self):
+        return (value for __, value in self.store.iteritems())
+
+    def values(self):
+        return list(self.itervalues())
+
+    def get_bbox(self, tab):
+        """Returns (bottom, right) of the cells in table tab or None if empty
+
+        Tables without row and column maps are inspected in the store.
+
+        Parameters
+        ----------
+        tab: Integer
+        \tTable that is inspected
+
+        """
+
+        if tab not in self.row_maps and tab not in self.col_maps:
+            return self.store.get_bbox(tab)
+
+        bottom = self._get_first_index(tab, 0, 0, INF, reverse=True)
+
+        if bottom is not None:
+            return bottom, self._get_first_index(tab, 1, 0, INF, reverse=True)
+
+    def get_next_filled(self, key, axis, reverse=False):
+        """Returns row or column of next filled cell in line of key or None
+
+        The store is queried instead of building an occupancy.
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tCell, behind which the search starts
+        axis: Integer in (0, 1)
+        \tSearch downwards in the column if 0, right in the row if 1
+        reverse: Bool, defaults to False
+        \tSearch upwards or left if True
+
+        """
+
+        row, col, tab = key
+
+        if axis == 0:
+            index, line, line_map = row, col, self.col_maps.get(tab)
+        else:
+            index, line, line_map = col, row, self.row_maps.get(tab)
+
+        if line_map is not None:
+            line = line_map.get_physical(line)
+
+        if reverse:
+            return self._get_first_index(tab, axis, 0, index - 1, line, True)
+
+        return self._get_first_index(tab, axis, index + 1, INF, line)
+
+    def _get_first_index(self, tab, axis, first, last, line=None,
+                         reverse=False):
+        """Returns first filled logical row or column in a range or None
+
+        Parameters
+        ----------
+        tab: Integer
+        \tTable that is searched
+        axis: Integer in (0, 1)
+        \tRows are searched if 0, columns if 1
+        first: Integer
+        \tFirst logical row or column of the range
+        last: Integer or INF
+        \tLast logical row or column of the range (inclusive)
+        line: Integer, defaults to None
+        \tPhysical column or row, to which the search is restricted
+        reverse: Bool, defaults to False
+        \tReturns the last filled row or column if True
+
+        """
+
+        if first > last:
+            return
+
+        index_map = (self.row_maps if axis == 0 else self.col_maps).get(tab)
+
+        if index_map is None:
+            return self.store.get_first_index(tab, axis, first, last, line,
+                                              reverse)
+
+        ranges = index_map.get_physical_ranges(first, last)
+
+        if len(ranges) > self.max_range_queries:
+            # Many small ranges, e.g. after sorting
+            return self._scan_first_index(tab, axis, first, last, line,
+                                          reverse)
+
+        # Ranges are in logical order
+        if reverse:
+            ranges.reverse()
+
+        for range_first, range_last in ranges:
+            index = self.store.get_first_index(tab, axis, range_first,
+                                               range_last, line, reverse)
+            if index is not None:
+                return index_map.get_logical(index)
+
+    def _scan_first_index(self, tab, axis, first, last, line, reverse):
+        """Returns _get_first_index result from a scan of the keys
+
+        Keys are streamed from the store, i.e. they are not held in memory.
+
+        """
+
+        if line is None:
+            physical_keys = self.store.get_keys(tab)
+        elif axis == 0:
+            physical_keys = self.store.get_keys(tab, left=line, right=line)
+        else:
+            physical_keys = self.store.get_keys(tab, top=line, bottom=line)
+
+        index_map = (self.row_maps if axis == 0 else self.col_maps)[tab]
+        result = None
+
+        for physical_key in physical_keys:
+            index = index_map.get_logical(physical_key[axis])
+
+            if index is None or not first <= index <= last:
+                continue
+
+            if result is None or (index > result if reverse else
+                                  index < result):
+                result = index
+
+        return result
+
+# End of class DiskDictGrid
+
+# -----------------------------------------------------------------------------
+
+
+class DataArray(object):
+    """DataArray provides enhanced grid read/write access.
+
+    Enhancements comprise:
+     * Slicing
+     * Multi-dimensional operations such as insertion and deletion along 1 axis
+     * Undo/redo operations
+
+    This class represents layer 2 of the model.
+
+    Parameters
+    ----------
+    shape: n-tuple of integer
+    \tShape of the grid
+
+    """
+
+    def __init__(self, shape):
+        if config["disk_storage"]:
+            self.dict_grid = DiskDictGrid(shape)
+        elif config["compact_storage"]:
+            self.dict_grid = CompactDictGrid(shape)
+        else:
+            self.dict_grid = DictGrid(shape)
+
+        # Safe mode
+        self.safe_mode = False
+
+    def __eq__(self, other):
+        if not hasattr(other, "dict_grid") or \
+           not hasattr(other, "cell_attributes"):
+            return NotImplemented
+
+        return self.dict_grid == other.dict_grid and \
+            self.cell_attributes == other.cell_attributes
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    # Data is the central content interface for loading / saving data.
+    # It shall be used for loading and saving from and to pys and other files.
+    # It shall be used for loading and saving macros.
+    # It is not used for importinf and exporting data because these operations
+    # are partial to the grid.
+
+    def _get_data(self):
+        """Returns dict of data content.
+
+        Keys
+        ----
+
+        shape: 3-tuple of Integer
+        \tGrid shape
+        grid: Dict of 3-tuples to strings
+        \tCell content
+        attributes: List of 3-tuples
+        \tCell attributes
+        row_heights: Dict of 2-tuples to float
+        \t(row, tab): row_height
+        col_widths: Dict of 2-tuples to float
+        \t(col, tab): col_width
+        macros: String
+        \tMacros from macro list
+
+        """
+
+        data = {}
+
+        data["shape"] = self.shape
+        data["grid"] = {}.update(self.dict_grid)
+        data["attributes"] = [ca for ca in self.cell_attributes]
+        data["row_heights"] = self.row_heights
+        data["col_widths"] = self.col_widths
+        data["macros"] = self.macros
+
+        return data
+
+    def _set_data(self, **kwargs):
+        """Sets data from given parameters
+
+        Old values are deleted.
+        If a paremeter is not given, nothing is changed.
+
+        Parameters
+        ----------
+
+        shape: 3-tuple of Integer
+        \tGrid shape
+        grid: Dict of 3-tuples to strings
+        \tCell content
+        attributes: List of 3-tuples
+        \tCell attributes
+        row_heights: Dict of 2-tuples to float
+        \t(row, tab): row_height
+        col_widths: Dict of 2-tuples to float
+        \t(col, tab): col_width
+        macros: String
+        \tMacros from macro list
+
+        """
+
+        if "shape" in kwargs:
+            self.shape = kwargs["shape"]
+
+        if "grid" in kwargs:
+            self.dict_grid.clear()
+            self.dict_grid.update(kwargs["grid"])
+
+        if "attributes" in kwargs:
+            self.attributes[:] = kwargs["attributes"]
+
+        if "row_heights" in kwargs:
+            self.row_heights = kwargs["row_heights"]
+
+        if "col_widths" in kwargs:
+            self.col_widths = kwargs["col_widths"]
+
+        if "macros" in kwargs:
+            self.macros = kwargs["macros"]
+
+    data = property(_get_data, _set_data)
+
+    def get_snapshot(self):
+        """Returns a DataArraySnapshot of the current content
+
+        The snapshot is taken without copying cells. It keeps its content
+        while the DataArray is edited, e.g. for saving in the background.
+
+        """
+
+        return DataArraySnapshot(self)
+
+    def get_row_height(self, row, tab):
+        """Returns row height"""
+
+        try:
+            return self.row_heights[(row, tab)]
+
+        except KeyError:
+            return config["default_row_height"]
+
+    def get_col_width(self, col, tab):
+        """Returns column width"""
+
+        try:
+            return self.col_widths[(col, tab)]
+
+        except KeyError:
+            return config["default_col_width"]
+
+    def get_rows_height(self, first, last, tab):
+        """Returns sum of the heights of rows first <= row < last"""
+
+        return self.row_heights.get_sum(first, last, tab)
+
+    def get_cols_width(self, first, last, tab):
+        """Returns sum of the widths of cols first <= col < last"""
+
+        return self.col_widths.get_sum(first, last, tab)
+
+    # Row and column attributes mask
+    # Keys have the format (row, table)
+
+    @staticmethod
+    def _get_size_store(sizes, default_value):
+        """Returns sizes if it is a SizeStore else a SizeStore copy of it"""
+
+        if isinstance(sizes, SizeStore):
+            return sizes
+
+        size_store = SizeStore(default_value=default_value)
+        for key, value in sizes.iteritems():
+            size_store._set(key, value)
+
+        return size_store
+
+    def _get_row_heights(self):
+        """Returns row_heights dict"""
+
+        return self.dict_grid.row_heights
+
+    def _set_row_heights(self, row_heights):
+        """Sets row_heights dict, which is converted to a SizeStore"""
+
+        self.dict_grid.row_heights = self._get_size_store(
+            row_heights, config["default_row_height"])
+
+    row_heights = property(_get_row_heights, _set_row_heights)
+
+    def _get_col_widths(self):
+        """Returns col_widths dict"""
+
+        return self.dict_grid.col_widths
+
+    def _set_col_widths(self, col_widths):
+        """Sets col_widths dict, which is converted to a SizeStore"""
+
+        self.dict_grid.col_widths = self._get_size_store(
+            col_widths, config["default_col_width"])
+
+    col_widths = property(_get_col_widths, _set_col_widths)
+
+    # Cell attributes mask
+    def _get_cell_attributes(self):
+        """Returns cell_attributes list"""
+
+        return self.dict_grid.cell_attributes
+
+    def _set_cell_attributes(self, value):
+        """Setter for cell_atributes"""
+
+        # Empty cell_attributes first
+        self.cell_attributes[:] = []
+        self.cell_attributes.extend(value)
+
+    cell_attributes = attributes = \
+        property(_get_cell_attributes, _set_cell_attributes)
+
+    def __iter__(self):
+        """Returns iterator over self.dict_grid"""
+
+        return iter(self.dict_grid)
+
+    def _get_macros(self):
+        """Returns macros string"""
+
+        return self.dict_grid.macros
+
+    def _set_macros(self, macros):
+        """Sets  macros string"""
+
+        self.dict_grid.macros = macros
+
+    macros = property(_get_macros, _set_macros)
+
+    def keys(self):
+        """Returns keys in self.dict_grid"""
+
+        return self.dict_grid.keys()
+
+    def pop(self, key):
+        """Pops dict_grid
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tCell key that shall be popped
+
+        """
+
+        return self.dict_grid.pop(key)
+
+    # Shape mask
+
+    def _get_shape(self):
+        """Returns dict_grid shape"""
+
+        return self.dict_grid.shape
+
+    @undoable
+    def _set_shape(self, shape):
+        """Deletes all cells beyond new shape and sets dict_grid shape
+
+        Parameters
+        ----------
+        shape: 3-tuple of Integer
+        \tTarget shape for grid
+
+        """
+
+        # Delete each cell that is beyond new borders
+
+        old_shape = self.shape
+        deleted_cells = {}
+
+        if any(new_axis < old_axis
+               for new_axis, old_axis in zip(shape, old_shape)):
+            for key in self._get_keys_beyond(shape):
+                deleted_cells[key] = self.pop(key)
+
+        # Set dict_grid shape attribute
+        self.dict_grid.shape = shape
+
+        self._adjust_rowcol(0, 0, 0)
+        self._adjust_cell_attributes(0, 0, 0)
+
+        # Undo actions
+
+        yield "_set_shape"
+
+        self.shape = old_shape
+
+        for key in deleted_cells:
+            self[key] = deleted_cells[key]
+
+    shape = property(_get_shape, _set_shape)
+
+    def get_last_filled_cell(self, table=None):
+        """Returns key for the bottommost rightmost cell with content
+
+        Parameters
+        ----------
+        table: Integer, defaults to None
+        \tLimit search to this table
+
+        """
+
+        maxrow = 0
+        maxcol = 0
+
+        if table is None:
+            tables = self.dict_grid.get_tables()
+        else:
+            tables = [table]
+
+        for tab in tables:
+            bbox = self.dict_grid.get_bbox(tab)
+            if bbox is not None:
+                maxrow = max(bbox[0], maxrow)
+                maxcol = max(bbox[1], maxcol)
+
+        return maxrow, maxcol, table
+
+    def get_next_filled_cell(self, key, axis, reverse=False):
+        """Returns key of next cell with content in row or column of key
+
+        Returns None if there is no such cell.
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tCell, behind which the search starts
+        axis: Integer in (0, 1)
+        \tSearch downwards in the column if 0, right in the row if 1
+        reverse: Bool, defaults to False
+        \tSearch upwards or left if True
+
+        """
+
+        if axis not in (0, 1):
+            raise ValueError("Axis not in (0, 1)")
+
+        index = self.dict_grid.get_next_filled(key, axis, reverse)
+
+        if index is not None:
+            next_key = list(key)
+            next_key[axis] = index
+            return tuple(next_key)
+
+    # Pickle support
+
+    def __getstate__(self):
+        """Returns dict_grid for pickling
+
+        Note that all persistent data is contained in the DictGrid class
+
+        """
+
+        return {"dict_grid": self.dict_grid}
+
+    # Slice support
+
+    def __getitem__(self, key):
+        """Adds slicing access to cell code retrieval
+
+        The cells are returned as a generator of generators, of ... of unicode.
+
+        Parameters
+        ----------
+        key: n-tuple of integer or slice
+        \tKeys of the cell code that is returned
+
+        Note
+        ----
+        Classical Excel type addressing (A$1, ...) may be added here
+
+        """
+
+        for key_ele in key:
+            if is_slice_like(key_ele):
+                # We have something slice-like here
+
+                return self.cell_array_generator(key)
+
+            elif is_string_like(key_ele):
+                # We have something string-like here
+                msg = "Cell string based access not implemented"
+                raise NotImplementedError(msg)
+
+        # key_ele should be a single cell
+
+        return self.dict_grid[key]
+
+    def __setitem__(self, key, value):
+        """Accepts index and slice keys
+
+        Parameters
+        ----------
+        key: 3-tuple of Integer or Slice object
+        \tCell key(s) that shall be set
+        value: Object (should be Unicode or similar)
+        \tCode for cell(s) to be set
+
+        """
+
+        single_keys_per_dim = []
+
+        for axis, key_ele in enumerate(key):
+            if is_slice_like(key_ele):
+                # We have something slice-like here
+
+                length = key[axis]
+                slice_range = xrange(*key_ele.indices(length))
+                single_keys_per_dim.append(slice_range)
+
+            elif is_string_like(key_ele):
+                # We have something string-like here
+
+                raise NotImplementedError
+
+            else:
+                # key_ele is a single cell
+
+                single_keys_per_dim.append((key_ele, ))
+
+        single_keys = product(*single_keys_per_dim)
+
+        for single_key in single_keys:
+            if value:
+                # Never change merged cells
+                merging_cell = \
+                    self.cell_attributes.get_merging_cell(single_key)
+                if merging_cell is None or merging_cell == single_key:
+                    self.dict_grid[single_key] = value
+            else:
+                # Value is empty --> delete cell
+                try:
+                    self.pop(key)
+
+                except (KeyError, TypeError):
+                    pass
+
+    def cell_array_generator(self, key):
+        """Generator traversing cells specified in key
+
+        Parameters
+        ----------
+        key: Iterable of Integer or slice
+        \tThe key specifies the cell keys of the generator
+
+        """
+
+        for i, key_ele in enumerate(key):
+
+            # Get first element of key that is a slice
+            if type(key_ele) is SliceType:
+                slc_keys = xrange(*key_ele.indices(self.dict_grid.shape[i]))
+                key_list = list(key)
+
+                key_list[i] = None
+
+                has_subslice = any(type(ele) is SliceType for ele in key_list)
+
+                for slc_key in slc_keys:
+                    key_list[i] = slc_key
+
+                    if has_subslice:
+                        # If there is a slice left yield generator
+                        yield self.cell_array_generator(key_list)
+
+                    else:
+                        # No slices? Yield value
+                        yield self[tuple(key_list)]
+
+                break
+
+    def _shift_rowcol(self, insertion_point, no_to_insert):
+        """Shifts row and column sizes when a table is inserted or deleted"""
+
+        # Shift row heights
+
+        new_row_heights = {}
+        del_row_heights = []
+
+        for row, tab in self.row_heights:
+            if tab > insertion_point:
+                new_row_heights[(row, tab + no_to_insert)] = \
+                    self.row_heights[(row, tab)]
+                del_row_heights.append((row, tab))
+
+        for row, tab in new_row_heights:
+            self.set_row_height(row, tab, new_row_heights[(row, tab)])
+
+        for row, tab in del_row_heights:
+            if (row, tab) not in new_row_heights:
+                self.set_row_height(row, tab, None)
+
+        # Shift column widths
+
+        new_col_widths = {}
+        del_col_widths = []
+
+        for col, tab in self.col_widths:
+            if tab > insertion_point:
+                new_col_widths[(col, tab + no_to_insert)] = \
+                    self.col_widths[(col, tab)]
+                del_col_widths.append((col, tab))
+
+        for col, tab in new_col_widths:
+            self.set_col_width(col, tab, new_col_widths[(col, tab)])
+
+        for col, tab in del_col_widths:
+            if (col, tab) not in new_col_widths:
+                self.set_col_width(col, tab, None)
+
+    def _adjust_rowcol(self, insertion_point, no_to_insert, axis, tab=None):
+        """Adjusts row and column sizes on insertion/deletion"""
+
+        if axis == 2:
+            self._shift_rowcol(insertion_point, no_to_insert)
+            return
+
+        assert axis in (0, 1)
+
+        cell_sizes = self.col_widths if axis else self.row_heights
+        set_cell_size = self.set_col_width if axis else self.set_row_height
+
+        new_sizes = {}
+        del_sizes = []
+
+        for pos, table in cell_sizes:
+            if pos > insertion_point and (tab is None or tab == table):
+                if 0 <= pos + no_to_insert < self.shape[axis]:
+                    new_sizes[(pos + no_to_insert, table)] = \
+                        cell_sizes[(pos, table)]
+                del_sizes.append((pos, table))
+
+        for pos, table in new_sizes:
+            set_cell_size(pos, table, new_sizes[(pos, table)])
+
+        for pos, table in del_sizes:
+            if (pos, table) not in new_sizes:
+                set_cell_size(pos, table, None)
+
+    def _get_adjusted_merge_area(self, attrs, insertion_point, no_to_insert,
+                                 axis):
+        """Returns updated merge area
+
+        Parameters
+        ----------
+        attrs: Dict
+        \tCell attribute dictionary that shall be adjusted
+        insertion_point: Integer
+        \tPont on axis, before which insertion takes place
+        no_to_insert: Integer >= 0
+        \tNumber of rows/cols/tabs that shall be inserted
+        axis: Integer in range(2)
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col
+
+        """
+
+        assert axis in range(2)
+
+        if "merge_area" not in attrs or attrs["merge_area"] is None:
+            return
+
+        top, left, bottom, right = attrs["merge_area"]
+        selection = Selection([(top, left)], [(bottom, right)], [], [], [])
+
+        selection.insert(insertion_point, no_to_insert, axis)
+
+        __top, __left = selection.block_tl[0]
+        __bottom, __right = selection.block_br[0]
+
+        # Adjust merge area if it is beyond the grid shape
+        rows, cols, tabs = self.shape
+
+        if __top < 0 and __bottom < 0 or __top >= rows and __bottom >= rows or\
+           __left < 0 and __right < 0 or __left >= cols and __right >= cols:
+            return
+
+        if __top < 0:
+            __top = 0
+
+        if __top >= rows:
+            __top = rows - 1
+
+        if __bottom < 0:
+            __bottom = 0
+
+        if __bottom >= rows:
+            __bottom = rows - 1
+
+        if __left < 0:
+            __left = 0
+
+        if __left >= cols:
+            __left = cols - 1
+
+        if __right < 0:
+            __right = 0
+
+        if __right >= cols:
+            __right = cols - 1
+
+        return __top, __left, __bottom, __right
+
+    def _adjust_cell_attributes(self, insertion_point, no_to_insert, axis,
+                                tab=None, cell_attrs=None):
+        """Adjusts cell attributes on insertion/deletion
+
+        Parameters
+        ----------
+        insertion_point: Integer
+        \tPont on axis, before which insertion takes place
+        no_to_insert: Integer >= 0
+        \tNumber of rows/cols/tabs that shall be inserted
+        axis: Integer in range(3)
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        tab: Integer, defaults to None
+        \tIf given then insertion is limited to this tab for axis < 2
+        cell_attrs: List, defaults to []
+        \tIf not empty then the given cell attributes replace the existing ones
+
+        """
+
+        def get_ca_with_updated_ma(attrs, merge_area):
+            """Returns cell attributes with updated merge area"""
+
+            new_attrs = copy(attrs)
+
+            if merge_area is None:
+                try:
+                    new_attrs.pop("merge_area")
+                except KeyError:
+                    pass
+            else:
+                new_attrs["merge_area"] = merge_area
+
+            return new_attrs
+
+        if axis not in range(3):
+            raise ValueError("Axis must be in [0, 1, 2]")
+
+        assert tab is None or tab >= 0
+
+        if cell_attrs is None:
+            cell_attrs = []
+
+        if cell_attrs:
+            self.cell_attributes[:] = cell_attrs
+
+        elif axis < 2:
+            # Adjust selections on given table
+
+            new_cell_attributes = []
+            for selection, table, attrs in self.cell_attributes:
+                if tab is None or tab == table:
+                    selection = copy(selection)
+                    selection.insert(insertion_point, no_to_insert, axis)
+                    # Update merge area if present
+                    merge_area = self._get_adjusted_merge_area(attrs,
+                                                               insertion_point,
+                                                               no_to_insert,
+                                                               axis)
+                    attrs = get_ca_with_updated_ma(attrs, merge_area)
+
+                new_cell_attributes.append((selection, table, attrs))
+
+            # One bulk replacement rebuilds the attribute caches only once
+            if new_cell_attributes:
+                self.cell_attributes[:] = new_cell_attributes
+
+        elif axis == 2:
+            # Adjust tabs
+
+            new_cell_attributes = []
+            is_changed = False
+
+            for selection, table, value in self.cell_attributes:
+                if no_to_insert < 0 and insertion_point <= table:
+                    is_changed = True
+                    if insertion_point > table + no_to_insert:
+                        # Table is deleted
+                        continue
+                    table += no_to_insert
+
+                elif insertion_point < table:
+                    # Insert
+                    is_changed = True
+                    table += no_to_insert
+
+                new_cell_attributes.append((selection, table, value))
+
+            if is_changed:
+                self.cell_attributes[:] = new_cell_attributes
+
+        self.cell_attributes._attr_cache.clear()
+        self.cell_attributes._update_table_cache()
+
+    def _get_keys_from(self, point, axis, tab=None, last=INF):
+        """Returns list of cell keys with point <= key[axis] <= last
+
+        Parameters
         ----------
-        key: 3-tuple of Integer or Slice object
-        \tCell key(s) that shall be set
-        value: Object (should be Unicode or similar)
-        \tCode for cell(s) to be set
+
+        point: Integer
+        \tFirst row/col/tab of the returned keys on axis
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        tab: Integer, defaults to None
+        \tIf given then keys are limited to this tab
+        last: Integer, defaults to INF
+        \tLast row/col/tab of the returned keys on axis
 
         """
 
-        single_keys_per_dim = []
+        dict_grid = self.dict_grid
+
+        if axis == 0:
+            return dict_grid.get_keys(tab, top=point, bottom=last)
+
+        elif axis == 1:
+            return dict_grid.get_keys(tab, left=point, right=last)
+
+        keys = []
+        for table in dict_grid.get_tables():
+            if point <= table <= last and (tab is None or tab == table):
+                keys += dict_grid.get_keys(table)
+
+        return keys
+
+    def _get_keys_beyond(self, shape):
+        """Returns list of cell keys that are outside of shape"""
+
+        dict_grid = self.dict_grid
+        rows, cols, tabs = shape
+
+        keys = []
+        for tab in dict_grid.get_tables():
+            if tab >= tabs:
+                keys += dict_grid.get_keys(tab)
+            else:
+                keys += dict_grid.get_keys(tab, top=rows)
+                keys += dict_grid.get_keys(tab, left=cols, bottom=rows - 1)
+
+        return keys
+
+    def insert(self, insertion_point, no_to_insert, axis, tab=None):
+        """Inserts no_to_insert rows/cols/tabs/... before insertion_point
+
+        Parameters
+        ----------
+
+        insertion_point: Integer
+        \tPont on axis, before which insertion takes place
+        no_to_insert: Integer >= 0
+        \tNumber of rows/cols/tabs that shall be inserted
+        axis: Integer
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
+        tab: Integer, defaults to None
+        \tIf given then insertion is limited to this tab for axis < 2
+
+        """
+
+        if not 0 <= axis <= len(self.shape):
+            raise ValueError("Axis not in grid dimensions")
+
+        if insertion_point > self.shape[axis] or \
+           insertion_point < -self.shape[axis]:
+            raise IndexError("Insertion point not in grid")
+
+        new_keys = {}
+        del_keys = []
+
+        if axis < 2:
+            # Cells that are pushed beyond the grid are deleted. The other
+            # cells are moved by the row or column maps of dict_grid.
+            first_deleted = max(insertion_point + 1,
+                                self.shape[axis] - no_to_insert)
+            del_keys = self._get_keys_from(first_deleted, axis, tab)
+
+        else:
+            for key in self._get_keys_from(insertion_point + 1, axis, tab):
+                new_key = list(key)
+                new_key[axis] += no_to_insert
+                if 0 <= new_key[axis] < self.shape[axis]:
+                    new_keys[tuple(new_key)] = self(key)
+                del_keys.append(key)
+
+        # Now re-insert moved keys
+
+        for key in del_keys:
+            if key not in new_keys and self(key) is not None:
+                self.pop(key)
+
+        if axis < 2:
+            self.dict_grid.insert_axis(insertion_point + 1, no_to_insert,
+                                       axis, tab)
+
+        self._adjust_rowcol(insertion_point, no_to_insert, axis, tab=tab)
+        self._adjust_cell_attributes(insertion_point, no_to_insert, axis, tab)
+
+        for key in new_keys:
+            self.__setitem__(key, new_keys[key])
+
+    def delete(self, deletion_point, no_to_delete, axis, tab=None):
+        """Deletes no_to_delete rows/cols/... starting with deletion_point
+
+        Axis specifies number of dimension, i.e. 0 == row, 1 == col, 2 == tab
+
+        """
+
+        if not 0 <= axis < len(self.shape):
+            raise ValueError("Axis not in grid dimensions")
+
+        if no_to_delete < 0:
+            raise ValueError("Cannot delete negative number of rows/cols/...")
+
+        elif no_to_delete >= self.shape[axis]:
+            raise ValueError("Last row/column/table must not be deleted")
+
+        if deletion_point > self.shape[axis] or \
+           deletion_point <= -self.shape[axis]:
+            raise IndexError("Deletion point not in grid")
+
+        new_keys = {}
+        del_keys = []
+
+        if axis < 2:
+            # Cells behind the deleted rows/cols are moved by the row or
+            # column maps of dict_grid.
+            del_keys = self._get_keys_from(deletion_point, axis, tab,
+                                           deletion_point + no_to_delete - 1)
+
+        else:
+            # Note that the loop goes over a list that copies the dict keys
+            for key in self._get_keys_from(deletion_point, axis, tab):
+                if key[axis] < deletion_point + no_to_delete:
+                    del_keys.append(key)
+
+                else:
+                    new_key = list(key)
+                    new_key[axis] -= no_to_delete
+
+                    new_keys[tuple(new_key)] = self(key)
+                    del_keys.append(key)
+
+        # Now re-insert moved keys
+
+        for key in new_keys:
+            self.__setitem__(key, new_keys[key])
+
+        for key in del_keys:
+            if key not in new_keys and self(key) is not None:
+                self.pop(key)
+
+        if axis < 2:
+            self.dict_grid.delete_axis(deletion_point, no_to_delete, axis,
+                                       tab)
+
+        self._adjust_rowcol(deletion_point, -no_to_delete, axis, tab=tab)
+        self._adjust_cell_attributes(deletion_point, -no_to_delete, axis)
+
+    def permute(self, order, axis, tab):
+        """Reorders rows or cols of table tab without moving cells
+
+        Cell attributes and row heights / column widths are not reordered.
+
+        Parameters
+        ----------
+
+        order: List of Integer
+        \tPermutation, new row/col i gets the cells of old row/col order[i]
+        axis: Integer in (0, 1)
+        \tSpecifies number of dimension, i.e. 0 == row, 1 == col
+        tab: Integer
+        \tTable, in which rows/cols are reordered
+
+        """
+
+        if axis not in (0, 1):
+            raise ValueError("Only rows and columns can be permuted")
+
+        if len(order) > self.shape[axis]:
+            raise IndexError("Permutation longer than grid")
+
+        self.dict_grid.permute_axis(list(order), axis, tab)
+
+    def set_row_height(self, row, tab, height):
+        """Sets row height"""
+
+        try:
+            old_height = self.row_heights.pop((row, tab))
+
+        except KeyError:
+            old_height = None
+
+        if height is not None:
+            self.row_heights[(row, tab)] = float(height)
+
+    def set_col_width(self, col, tab, width):
+        """Sets column width"""
+
+        try:
+            old_width = self.col_widths.pop((col, tab))
+
+        except KeyError:
+            old_width = None
+
+        if width is not None:
+            self.col_widths[(col, tab)] = float(width)
+
+    # Element access via call
+
+    __call__ = __getitem__
+
+# End of class DataArray
+
+
+class DataArraySnapshot(object):
+    """Read-only copy-on-write snapshot of a DataArray
+
+    Cell code, row heights and col widths are StoreSnapshots that diverge
+    from the DataArray as it is edited. Macros and the shape are immutable
+    and the cell attributes list is copied, i.e. the snapshot is taken in
+    time that does not depend on the number of cells.
+
+    The snapshot provides the DataArray interface that is used for
+    saving, e.g. it can be passed to interfaces.pys.Pys.
+
+    Parameters
+    ----------
+    data_array: DataArray
+    \tData array, of which the snapshot is taken
+
+    """
+
+    def __init__(self, data_array):
+        dict_grid = data_array.dict_grid
+
+        self.shape = dict_grid.shape
+
+        self.dict_grid = dict_grid.get_snapshot()
+        self.dict_grid.shape = self.shape
+        self.dict_grid.macros = self.macros = dict_grid.macros
+
+        self.dict_grid.row_heights = self.row_heights = \
+            dict_grid.row_heights.get_snapshot()
+        self.dict_grid.col_widths = self.col_widths = \
+            dict_grid.col_widths.get_snapshot()
+
+        self.dict_grid.cell_attributes = self.cell_attributes = \
+            CellAttributes()
+        list.extend(self.cell_attributes, dict_grid.cell_attributes)
+
+    def __iter__(self):
+        """Returns iterator over the keys of cells with code"""
+
+        return iter(self.dict_grid)
+
+    def __len__(self):
+        return len(self.dict_grid)
+
+    def __call__(self, key):
+        """Returns code of cell key"""
+
+        return self.dict_grid[key]
+
+    def keys(self):
+        """Returns keys of cells with code"""
+
+        return self.dict_grid.keys()
+
+# End of class DataArraySnapshot
+
+# -----------------------------------------------------------------------------
+
+
+def nn(val):
+    """Returns flat numpy arraz without None values"""
+
+    try:
+        return numpy.array(filter(None, val.flat))
+
+    except AttributeError:
+        # Probably no numpy array
+        return numpy.array(filter(None, val))
+
+
+class CodeArray(DataArray):
+    """CodeArray provides objects when accessing cells via __getitem__
+
+    Cell code can be accessed via function call
+
+    This class represents layer 3 of the model.
+
+    """
+
+    # Custom font storage
+    custom_fonts = {}
 
-        for axis, key_ele in enumerate(key):
-            if is_slice_like(key_ele):
-                # We have something slice-like here
+    # Compiled cell code, shared by all cells with identical code
+    code_cache = LRUCache(maxsize=config["code_cache_size"])
 
-                length = key[axis]
-                slice_range = xrange(*key_ele.indices(length))
-                single_keys_per_dim.append(slice_range)
+    # Incremented on changes of the module globals, see _get_namespace
+    globals_version = 0
 
-            elif is_string_like(key_ele):
-                # We have something string-like here
+    # Names of the magic variables that hold the key of the evaluated cell
+    magic_names = ('X', 'Y', 'Z', 'R', 'C', 'T')
 
-                raise NotImplementedError
+    # Interrupts cell and macro evaluations after config["timeout"] s
+    watchdog = Watchdog()
 
-            else:
-                # key_ele is a single cell
+    def __init__(self, shape):
+        DataArray.__init__(self, shape)
 
-                single_keys_per_dim.append((key_ele, ))
+        # Cache for results from __getitem__ calls
+        self.result_cache = MemoryCache(maxbytes=0,
+                                        maxpinned=config["pinned_results"])
 
-        single_keys = product(*single_keys_per_dim)
+        # Results of frozen cells, which are not bounded by a memory budget
+        # because frozen cells must keep their frozen value
+        self.frozen_cache = {}
 
-        for single_key in single_keys:
-            if value:
-                # Never change merged cells
-                merging_cell = \
-                    self.cell_attributes.get_merging_cell(single_key)
-                if merging_cell is None or merging_cell == single_key:
-                    self.dict_grid[single_key] = value
-            else:
-                # Value is empty --> delete cell
-                try:
-                    self.pop(key)
+        # Graph of S[...] read accesses between cells
+        self.dependencies = DependencyGraph()
 
-                except (KeyError, TypeError):
-                    pass
+        # Thread local stack of dependency nodes of the cells that are
+        # currently evaluated, see _eval_stack
+        self._eval_local = threading.local()
 
-    def cell_array_generator(self, key):
-        """Generator traversing cells specified in key
+        # Serializes cell evaluation if cells are evaluated in more than one
+        # thread, e.g. in the GUI thread and in a background thread
+        self.eval_lock = threading.RLock()
 
-        Parameters
-        ----------
-        key: Iterable of Integer or slice
-        \tThe key specifies the cell keys of the generator
+        # Guards result and frozen cache, lazy cell attribute caches and
+        # profiler statistics, which are read from the GUI thread while a
+        # background thread evaluates cells. In contrast to eval_lock, it
+        # is only held for lookups and not during evaluations.
+        self.cache_lock = threading.RLock()
 
-        """
+        self.update_cache_sizes()
 
-        for i, key_ele in enumerate(key):
+        # Incremented when cell results are invalidated by cell changes
+        self._invalidations = 0
 
-            # Get first element of key that is a slice
-            if type(key_ele) is SliceType:
-                slc_keys = xrange(*key_ele.indices(self.dict_grid.shape[i]))
-                key_list = list(key)
+        # EvalProfiler that records cell evaluations if not None
+        self.profiler = None
 
-                key_list[i] = None
+        # Evaluation namespace and globals_version, for which it was built
+        self._namespace = None
+        self._namespace_version = None
 
-                has_subslice = any(type(ele) is SliceType for ele in key_list)
+    def __setitem__(self, key, value):
+        """Sets cell code and invalidates results that depend on it"""
 
-                for slc_key in slc_keys:
-                    key_list[i] = slc_key
+        # Prevent unchanged cells from being recalculated on cursor movement
 
-                    if has_subslice:
-                        # If there is a slice left yield generator
-                        yield self.cell_array_generator(key_list)
+        old_value = self(key)
+        unchanged = value == old_value or (not value and old_value is None)
 
-                    else:
-                        # No slices? Yield value
-                        yield self[tuple(key_list)]
+        DataArray.__setitem__(self, key, value)
 
-                break
+        if not unchanged:
+            is_global = self._is_assignment(old_value) or \
+                self._is_assignment(value)
+            self._invalidate(key, is_global=is_global)
 
-    def _shift_rowcol(self, insertion_point, no_to_insert):
-        """Shifts row and column sizes when a table is inserted or deleted"""
+    def __getitem__(self, key):
+        """Returns _eval_cell"""
 
-        # Shift row heights
+        cache_key = get_cache_key(key)
+        is_range = is_range_key(cache_key)
 
-        new_row_heights = {}
-        del_row_heights = []
+        # Record read access if we are inside of a cell evaluation
+        if self._eval_stack:
+            with self.cache_lock:
+                self.dependencies.add(self._eval_stack[-1], cache_key)
 
-        for row, tab in self.row_heights:
-            if tab > insertion_point:
-                new_row_heights[(row, tab + no_to_insert)] = \
-                    self.row_heights[(row, tab)]
-                del_row_heights.append((row, tab))
+        # Frozen cell handling
+        if not is_range:
+            with self.cache_lock:
+                frozen_res = self.cell_attributes.get(key, "frozen")
 
-        for row, tab in new_row_heights:
-            self.set_row_height(row, tab, new_row_heights[(row, tab)])
+            if frozen_res:
+                try:
+                    with self.cache_lock:
+                        return self.frozen_cache[cache_key]
 
-        for row, tab in del_row_heights:
-            if (row, tab) not in new_row_heights:
-                self.set_row_height(row, tab, None)
+                except KeyError:
+                    # Frozen cache is empty.
+                    # Maybe we have a reload without the frozen cache
+                    with self.eval_lock:
+                        result = self._eval_cell(key, self(key))
+                    with self.cache_lock:
+                        self.frozen_cache[cache_key] = result
+                    return result
 
-        # Shift column widths
+        # Normal cell handling
 
-        new_col_widths = {}
-        del_col_widths = []
+        try:
+            with self.cache_lock:
+                result = self.result_cache[cache_key]
 
-        for col, tab in self.col_widths:
-            if tab > insertion_point:
-                new_col_widths[(col, tab + no_to_insert)] = \
-                    self.col_widths[(col, tab)]
-                del_col_widths.append((col, tab))
+                if self.profiler is not None and not is_range:
+                    self.profiler.add_hit(cache_key)
 
-        for col, tab in new_col_widths:
-            self.set_col_width(col, tab, new_col_widths[(col, tab)])
+            return result
 
-        for col, tab in del_col_widths:
-            if (col, tab) not in new_col_widths:
-                self.set_col_width(col, tab, None)
+        except KeyError:
+            pass
 
-    def _adjust_rowcol(self, insertion_point, no_to_insert, axis, tab=None):
-        """Adjusts row and column sizes on insertion/deletion"""
+        if is_range or self(key) is not None:
+            invalidations = self._invalidations
 
-        if axis == 2:
-            self._shift_rowcol(insertion_point, no_to_insert)
-            return
+            with self.eval_lock:
+                if is_range:
+                    result = self._eval_range(key)
+                else:
+                    result = self._eval_cell(key, self(key))
 
-        assert axis in (0, 1)
+            # Do not cache stale results of cells that have been changed
+            # during the evaluation in another thread. Global assignments
+            # of this thread during the evaluation do not make it stale.
+            with self.cache_lock:
+                assignment_invalidations = getattr(
+                    self._eval_local, "assignment_invalidations", None)
+                if self._invalidations in (invalidations,
+                                           assignment_invalidations):
+                    self.result_cache[cache_key] = result
 
-        cell_sizes = self.col_widths if axis else self.row_heights
-        set_cell_size = self.set_col_width if axis else self.set_row_height
+            return result
 
-        new_sizes = {}
-        del_sizes = []
+    def clear_results(self):
+        """Removes all results from the result cache
 
-        for pos, table in cell_sizes:
-            if pos > insertion_point and (tab is None or tab == table):
-                if 0 <= pos + no_to_insert < self.shape[axis]:
-                    new_sizes[(pos + no_to_insert, table)] = \
-                        cell_sizes[(pos, table)]
-                del_sizes.append((pos, table))
+        Results of evaluations that are running while the cache is cleared
+        are not stored in the cache.
 
-        for pos, table in new_sizes:
-            set_cell_size(pos, table, new_sizes[(pos, table)])
+        """
 
-        for pos, table in del_sizes:
-            if (pos, table) not in new_sizes:
-                set_cell_size(pos, table, None)
+        with self.cache_lock:
+            self._invalidations += 1
+            self.result_cache.clear()
 
-    def _get_adjusted_merge_area(self, attrs, insertion_point, no_to_insert,
-                                 axis):
-        """Returns updated merge area
+    def is_cached(self, key):
+        """Returns True if the result of key is available without evaluation
 
         Parameters
         ----------
-        attrs: Dict
-        \tCell attribute dictionary that shall be adjusted
-        insertion_point: Integer
-        \tPont on axis, before which insertion takes place
-        no_to_insert: Integer >= 0
-        \tNumber of rows/cols/tabs that shall be inserted
-        axis: Integer in range(2)
-        \tSpecifies number of dimension, i.e. 0 == row, 1 == col
+        key: 3-tuple of Integer
+        \tCell key
 
         """
 
-        assert axis in range(2)
-
-        if "merge_area" not in attrs or attrs["merge_area"] is None:
-            return
-
-        top, left, bottom, right = attrs["merge_area"]
-        selection = Selection([(top, left)], [(bottom, right)], [], [], [])
-
-        selection.insert(insertion_point, no_to_insert, axis)
+        if self.safe_mode or self(key) is None:
+            return True
 
-        __top, __left = selection.block_tl[0]
-        __bottom, __right = selection.block_br[0]
+        cache_key = get_cache_key(key)
 
-        # Adjust merge area if it is beyond the grid shape
-        rows, cols, tabs = self.shape
+        with self.cache_lock:
+            if self.cell_attributes.get(key, "button_cell"):
+                return True
 
-        if __top < 0 and __bottom < 0 or __top >= rows and __bottom >= rows or\
-           __left < 0 and __right < 0 or __left >= cols and __right >= cols:
-            return
+            if self.cell_attributes.get(key, "frozen"):
+                return cache_key in self.frozen_cache
 
-        if __top < 0:
-            __top = 0
+            return cache_key in self.result_cache
 
-        if __top >= rows:
-            __top = rows - 1
+    # Cache handling
 
-        if __bottom < 0:
-            __bottom = 0
+    def update_cache_sizes(self):
+        """Sets memory budget of result cache from config"""
 
-        if __bottom >= rows:
-            __bottom = rows - 1
+        with self.cache_lock:
+            self.result_cache.resize(config["result_cache_size"] * 2 ** 20)
 
-        if __left < 0:
-            __left = 0
+    def get_cache_stats(self):
+        """Returns dict with statistics of the result cache
 
-        if __left >= cols:
-            __left = cols - 1
+        The statistics contain number of entries, estimated size in bytes,
+        memory budget in bytes, hits, misses and evictions.
 
-        if __right < 0:
-            __right = 0
+        """
 
-        if __right >= cols:
-            __right = cols - 1
+        with self.cache_lock:
+            return {
+                "result_cache": self.result_cache.get_stats(),
+            }
 
-        return __top, __left, __bottom, __right
+    def values(self, key, dtype=None):
+        """Returns results of the cells in key as numpy array
 
-    def _adjust_cell_attributes(self, insertion_point, no_to_insert, axis,
-                                tab=None, cell_attrs=None):
-        """Adjusts cell attributes on insertion/deletion
+        Example: S.values(numpy.s_[:10, 0, 0], dtype="float64")
 
         Parameters
         ----------
-        insertion_point: Integer
-        \tPont on axis, before which insertion takes place
-        no_to_insert: Integer >= 0
-        \tNumber of rows/cols/tabs that shall be inserted
-        axis: Integer in range(3)
-        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
-        tab: Integer, defaults to None
-        \tIf given then insertion is limited to this tab for axis < 2
-        cell_attrs: List, defaults to []
-        \tIf not empty then the given cell attributes replace the existing ones
+        key: 3-tuple of Integer or slice
+        \tKey of the cell range
+        dtype: numpy dtype, defaults to None
+        \tdtype of the returned array, None infers dtype from the results
 
         """
 
-        def replace_cell_attributes_table(index, new_table):
-            """Replaces table in cell_attributes item"""
-
-            ca = list(list.__getitem__(self.cell_attributes, index))
-            ca[1] = new_table
-            self.cell_attributes.__setitem__(index, tuple(ca))
-
-        def get_ca_with_updated_ma(attrs, merge_area):
-            """Returns cell attributes with updated merge area"""
+        return numpy.asarray(self[key], dtype=dtype)
 
-            new_attrs = copy(attrs)
+    # Bulk range evaluation
 
-            if merge_area is None:
-                try:
-                    new_attrs.pop("merge_area")
-                except KeyError:
-                    pass
-            else:
-                new_attrs["merge_area"] = merge_area
+    def _get_range_dtype(self, results):
+        """Returns numpy dtype for results of a cell range
 
-            return new_attrs
+        Results that are all bool, all integer within int64 bounds or all
+        integer or float yield bool, int64 or float64 respectively.
+        All other results, e.g. if there are empty cells, yield object.
 
-        if axis not in range(3):
-            raise ValueError("Axis must be in [0, 1, 2]")
+        Parameters
+        ----------
+        results: List
+        \tCell results
 
-        assert tab is None or tab >= 0
+        """
 
-        if cell_attrs is None:
-            cell_attrs = []
+        kinds = set()
 
-        if cell_attrs:
-            self.cell_attributes[:] = cell_attrs
+        for result in results:
+            if isinstance(result, (bool, numpy.bool_)):
+                kinds.add("bool")
 
-        elif axis < 2:
-            # Adjust selections on given table
+            elif isinstance(result, (int, long, numpy.integer)):
+                if not -2 ** 63 <= result < 2 ** 63:
+                    return "O"
+                kinds.add("int64")
 
-            ca_updates = {}
-            for i, (selection, table, attrs) in enumerate(
-                                                    self.cell_attributes):
-                selection = copy(selection)
-                if tab is None or tab == table:
-                    selection.insert(insertion_point, no_to_insert, axis)
-                    # Update merge area if present
-                    merge_area = self._get_adjusted_merge_area(attrs,
-                                                               insertion_point,
-                                                               no_to_insert,
-                                                               axis)
-                    new_attrs = get_ca_with_updated_ma(attrs, merge_area)
+            elif isinstance(result, (float, numpy.floating)):
+                kinds.add("float64")
 
-                    ca_updates[i] = selection, table, new_attrs
+            else:
+                return "O"
 
-            for idx in ca_updates:
-                self.cell_attributes[idx] = ca_updates[idx]
+        if len(kinds) == 1:
+            return kinds.pop()
 
-        elif axis == 2:
-            # Adjust tabs
+        elif kinds == set(["int64", "float64"]):
+            return "float64"
 
-            pop_indices = []
+        return "O"
 
-            for i, cell_attribute in enumerate(self.cell_attributes):
-                selection, table, value = cell_attribute
+    def _make_nested_range_list(self, results, shape):
+        """Returns nested list of shape from flat list of results"""
 
-                if no_to_insert < 0 and insertion_point <= table:
-                    if insertion_point > table + no_to_insert:
-                        # Delete later
-                        pop_indices.append(i)
-                    else:
-                        replace_cell_attributes_table(i, table + no_to_insert)
+        if len(shape) < 2:
+            return results
 
-                elif insertion_point < table:
-                    # Insert
-                    replace_cell_attributes_table(i, table + no_to_insert)
+        step = len(results) / shape[0] if shape[0] else 0
 
-            for i in pop_indices[::-1]:
-                self.cell_attributes.pop(i)
+        return [self._make_nested_range_list(results[i * step:(i + 1) * step],
+                                             shape[1:])
+                for i in xrange(shape[0])]
 
-        self.cell_attributes._attr_cache.clear()
-        self.cell_attributes._update_table_cache()
+    def _eval_range(self, key):
+        """Returns numpy array of the results of the cells in the slice key
 
-    def insert(self, insertion_point, no_to_insert, axis, tab=None):
-        """Inserts no_to_insert rows/cols/tabs/... before insertion_point
+        Cached results are fetched in one pass. Only cache misses are
+        evaluated. The dtype of the array is inferred by _get_range_dtype.
 
         Parameters
         ----------
-
-        insertion_point: Integer
-        \tPont on axis, before which insertion takes place
-        no_to_insert: Integer >= 0
-        \tNumber of rows/cols/tabs that shall be inserted
-        axis: Integer
-        \tSpecifies number of dimension, i.e. 0 == row, 1 == col, ...
-        tab: Integer, defaults to None
-        \tIf given then insertion is limited to this tab for axis < 2
+        key: 3-tuple of Integer or slice
+        \tKey that contains at least one slice
 
         """
 
-        if not 0 <= axis <= len(self.shape):
-            raise ValueError("Axis not in grid dimensions")
-
-        if insertion_point > self.shape[axis] or \
-           insertion_point < -self.shape[axis]:
-            raise IndexError("Insertion point not in grid")
-
-        new_keys = {}
-        del_keys = []
-
-        for key in self.dict_grid.keys():
-            if key[axis] > insertion_point and (tab is None or tab == key[2]):
-                new_key = list(key)
-                new_key[axis] += no_to_insert
-                if 0 <= new_key[axis] < self.shape[axis]:
-                    new_keys[tuple(new_key)] = self(key)
-                del_keys.append(key)
-
-        # Now re-insert moved keys
-
-        for key in del_keys:
-            if key not in new_keys and self(key) is not None:
-                self.pop(key)
+        if self.safe_mode:
+            return self(key)
 
-        self._adjust_rowcol(insertion_point, no_to_insert, axis, tab=tab)
-        self._adjust_cell_attributes(insertion_point, no_to_insert, axis, tab)
+        node = get_cache_key(key)
 
-        for key in new_keys:
-            self.__setitem__(key, new_keys[key])
+        axis_keys = []
+        shape = []
 
-    def delete(self, deletion_point, no_to_delete, axis, tab=None):
-        """Deletes no_to_delete rows/cols/... starting with deletion_point
+        for axis, key_ele in enumerate(key):
+            if type(key_ele) is SliceType:
+                axis_key = xrange(*key_ele.indices(self.shape[axis]))
+                shape.append(len(axis_key))
 
-        Axis specifies number of dimension, i.e. 0 == row, 1 == col, 2 == tab
+            else:
+                axis_key = (key_ele,)
 
-        """
+            axis_keys.append(axis_key)
 
-        if not 0 <= axis < len(self.shape):
-            raise ValueError("Axis not in grid dimensions")
+        with self.cache_lock:
+            self.dependencies.remove_precedents(node)
+        self._eval_stack.append(node)
 
-        if no_to_delete < 0:
-            raise ValueError("Cannot delete negative number of rows/cols/...")
+        frozen_cache = self.frozen_cache
+        result_cache = self.result_cache
+        results = []
 
-        elif no_to_delete >= self.shape[axis]:
-            raise ValueError("Last row/column/table must not be deleted")
+        try:
+            for cell_key in product(*axis_keys):
+                with self.cache_lock:
+                    if cell_key in frozen_cache:
+                        result = frozen_cache[cell_key]
+                        is_hit = True
 
-        if deletion_point > self.shape[axis] or \
-           deletion_point <= -self.shape[axis]:
-            raise IndexError("Deletion point not in grid")
+                    elif cell_key in result_cache:
+                        result = result_cache[cell_key]
+                        is_hit = True
 
-        new_keys = {}
-        del_keys = []
+                    else:
+                        is_hit = False
 
-        # Note that the loop goes over a list that copies all dict keys
-        for key in self.dict_grid.keys():
-            if tab is None or tab == key[2]:
-                if deletion_point <= key[axis] < deletion_point + no_to_delete:
-                    del_keys.append(key)
+                    if is_hit:
+                        self.dependencies.add(node, cell_key)
 
-                elif key[axis] >= deletion_point + no_to_delete:
-                    new_key = list(key)
-                    new_key[axis] -= no_to_delete
+                if not is_hit:
+                    # Cache miss, __getitem__ records the dependency
+                    results.append(self[cell_key])
+                    continue
 
-                    new_keys[tuple(new_key)] = self(key)
-                    del_keys.append(key)
+                results.append(result)
 
-        # Now re-insert moved keys
+        finally:
+            self._eval_stack.pop()
 
-        for key in new_keys:
-            self.__setitem__(key, new_keys[key])
+        dtype = self._get_range_dtype(results)
 
-        for key in del_keys:
-            if key not in new_keys and self(key) is not None:
-                self.pop(key)
+        if dtype == "O":
+            return numpy.array(self._make_nested_range_list(results, shape),
+                               dtype="O")
 
-        self._adjust_rowcol(deletion_point, -no_to_delete, axis, tab=tab)
-        self._adjust_cell_attributes(deletion_point, -no_to_delete, axis)
+        return numpy.array(results, dtype=dtype).reshape(shape)
 
-    def set_row_height(self, row, tab, height):
-        """Sets row height"""
+    # Dependency tracking
+
+    def _get_eval_stack(self):
+        """Returns stack of evaluated dependency nodes of the current thread"""
 
         try:
-            old_height = self.row_heights.pop((row, tab))
+            return self._eval_local.stack
 
-        except KeyError:
-            old_height = None
+        except AttributeError:
+            self._eval_local.stack = []
+            return self._eval_local.stack
 
-        if height is not None:
-            self.row_heights[(row, tab)] = float(height)
+    _eval_stack = property(_get_eval_stack)
 
-    def set_col_width(self, col, tab, width):
-        """Sets column width"""
+    def _get_cell_nodes(self, nodes, get_neighbors):
+        """Returns set of cell keys from nodes, in which slices are resolved
 
-        try:
-            old_width = self.col_widths.pop((col, tab))
+        Parameters
+        ----------
+        nodes: Iterable of nodes
+        \tNodes of the dependency graph
+        get_neighbors: Function
+        \tReturns the nodes that replace a slice node
 
-        except KeyError:
-            old_width = None
+        """
 
-        if width is not None:
-            self.col_widths[(col, tab)] = float(width)
+        cell_nodes = set()
+        visited = set()
+        stack = list(nodes)
+
+        while stack:
+            node = stack.pop()
+            if is_range_key(node):
+                # Slice node
+                if node not in visited:
+                    visited.add(node)
+                    stack.extend(get_neighbors(node))
+            else:
+                cell_nodes.add(node)
 
-    # Element access via call
+        return cell_nodes
 
-    __call__ = __getitem__
+    def precedents(self, key):
+        """Returns set of cell keys that have been read by the cell key
 
-# End of class DataArray
+        The keys are taken from the most recent evaluation of the cell.
+        Cells that are accessed via slices are included.
 
-# -----------------------------------------------------------------------------
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of the cell, for which the precedents are returned
 
+        """
 
-class CodeArray(DataArray):
-    """CodeArray provides objects when accessing cells via __getitem__
+        get_precedents = self.dependencies.get_precedents
 
-    Cell code can be accessed via function call
+        return self._get_cell_nodes(get_precedents(key), get_precedents)
 
-    This class represents layer 3 of the model.
+    def dependents(self, key):
+        """Returns set of cell keys that have read the cell key
 
-    """
+        Only cells that directly access key, e.g. via S[key] or via a
+        slice that contains key, are returned.
 
-    # Cache for results from __getitem__ calls
-    result_cache = {}
+        Parameters
+        ----------
+        key: 3-tuple of Integer
+        \tKey of the cell, for which the dependents are returned
 
-    # Cache for frozen objects
-    frozen_cache = {}
+        """
 
-    # Custom font storage
-    custom_fonts = {}
+        get_dependents = self.dependencies.get_dependents
 
-    def __setitem__(self, key, value):
-        """Sets cell code and resets result cache"""
+        return self._get_cell_nodes(get_dependents(key), get_dependents)
 
-        # Prevent unchanged cells from being recalculated on cursor movement
+    def _is_assignment(self, code):
+        """Returns True if code is cell code that assigns a global
 
-        repr_key = repr(key)
+        Parameters
+        ----------
+        code: Object
+        \tCell code, may be None or a non-string object
 
-        unchanged = (repr_key in self.result_cache and
-                     value == self(key)) or \
-                    ((value is None or value == "") and
-                     repr_key not in self.result_cache)
+        """
 
-        DataArray.__setitem__(self, key, value)
+        # Cheap check first, so that most cells are not compiled here
+        if not is_string_like(code) or "=" not in code:
+            return False
 
-        if not unchanged:
-            # Reset result cache
-            self.result_cache = {}
+        return self._get_compiled_code(code)[0] is not None
 
-    def __getitem__(self, key):
-        """Returns _eval_cell"""
+    def _invalidate(self, key, is_global=False):
+        """Removes results of key and its transitive dependents from cache
 
-        # Frozen cell handling
-        if all(type(k) is not SliceType for k in key):
-            frozen_res = self.cell_attributes[key]["frozen"]
-            if frozen_res:
-                if repr(key) in self.frozen_cache:
-                    return self.frozen_cache[repr(key)]
-                else:
-                    # Frozen cache is empty.
-                    # Maybe we have a reload without the frozen cache
-                    result = self._eval_cell(key, self(key))
-                    self.frozen_cache[repr(key)] = result
-                    return result
+        Parameters
+        ----------
+        key: 3-tuple of Integer or slice
+        \tKey of the cell that has been changed
+        is_global: Bool, defaults to False
+        \tIf True then the old or new code of key assigns a global
 
-        # Normal cell handling
+        """
 
-        if repr(key) in self.result_cache:
-            return self.result_cache[repr(key)]
+        with self.cache_lock:
+            self._invalidations += 1
 
-        elif self(key) is not None:
-            result = self._eval_cell(key, self(key))
-            self.result_cache[repr(key)] = result
+            if is_global or any(type(k) is SliceType for k in key):
+                # Slice assignment may affect any cell. Cells that use a
+                # global are not recorded in the dependency graph.
+                self.clear_results()
+                return
 
-            return result
+            nodes = self.dependencies.get_transitive_dependents(key)
+            nodes.add(key)
+
+            for node in nodes:
+                self.result_cache.pop(node, None)
 
     def _make_nested_list(self, gen):
         """Makes nested list from generator for creating numpy.array"""
@@ -1211,6 +3512,97 @@ class CodeArray(DataArray):
 
         return -1
 
+    def _get_compiled_code(self, code):
+        """Returns tuple of assignment target, code object and error
+
+        The assignment target is None if code is no assignment.
+        If code cannot be compiled then the code object is None and
+        error contains the exception that becomes the cell result.
+
+        Results are stored in the LRU code_cache, which is shared by all cells
+        so that identical code is parsed and compiled only once.
+
+        Parameters
+        ----------
+        code: String
+        \tCell code
+
+        """
+
+        try:
+            return self.code_cache[code]
+
+        except KeyError:
+            pass
+
+        try:
+            module = ast.parse(code)
+            assignment_target_end = self._get_assignment_target_end(module)
+
+        except ValueError, err:
+            assignment_target_error = ValueError(err)
+
+        except AttributeError, err:
+            # Attribute Error includes RunTimeError
+            assignment_target_error = AttributeError(err)
+
+        except Exception, err:
+            assignment_target_error = Exception(err)
+
+        else:
+            assignment_target_error = None
+
+        if assignment_target_error is not None:
+            compiled_code = None, None, assignment_target_error
+
+        else:
+            if assignment_target_end != -1:
+                glob_var = code[:assignment_target_end]
+                expression = code.split("=", 1)[1]
+                expression = expression.strip()
+
+            else:
+                glob_var = None
+                expression = code
+
+            try:
+                code_object = compile(expression, "<string>", "eval")
+
+                if self._has_nested_magic_names(code_object):
+                    # Nested scopes look up the magic variables as globals.
+                    # They are bound as closure variables of a wrapper.
+                    magic_args = ", ".join(self.magic_names)
+                    expression = "(lambda {0}: (\n{1}\n))({0})".format(
+                        magic_args, expression)
+                    code_object = compile(expression, "<string>", "eval")
+
+                compiled_code = glob_var, code_object, None
+
+            except Exception, err:
+                compiled_code = glob_var, None, Exception(err)
+
+        self.code_cache[code] = compiled_code
+
+        return compiled_code
+
+    def _has_nested_magic_names(self, code_object):
+        """Returns True if nested scopes of code_object use magic variables
+
+        Parameters
+        ----------
+        code_object: Code object
+        \tCompiled cell code
+
+        """
+
+        for const in code_object.co_consts:
+            if type(const) is CodeType and \
+               (set(const.co_names).intersection(self.magic_names) or
+                    self._has_nested_magic_names(const)):
+                return True
+
+        return False
+
     def _get_updated_environment(self, env_dict=None):
         """Returns globals environment with 'magic' variable
 
@@ -1229,26 +3621,93 @@ class CodeArray(DataArray):
 
         return env
 
+    def _get_namespace(self):
+        """Returns persistent evaluation namespace of the code array
+
+        The namespace is built from the module globals and the cell helper
+        variables. It is rebuilt only if globals_version has changed,
+        i. e. after macro execution, global assignments or module reloads.
+
+        """
+
+        if self._namespace is None or \
+           self._namespace_version != CodeArray.globals_version:
+            env_dict = self._get_namespace_helpers()
+
+            self._namespace = self._get_updated_environment(env_dict=env_dict)
+            self._namespace_version = CodeArray.globals_version
+
+        return self._namespace
+
+    def _get_namespace_helpers(self):
+        """Returns dict of cell helper variables of the namespace"""
+
+        return {'bz2': bz2, 'base64': base64, 'charts': charts, 'nn': nn,
+                'S': self, 'vlcpanel_factory': vlcpanel_factory}
+
+    def _set_global(self, glob_var, value):
+        """Sets module global glob_var from a global assignment cell
+
+        The persistent namespace of the code array is updated in place.
+        Namespaces of other code arrays are rebuilt on their next use.
+
+        Parameters
+        ----------
+        glob_var: String
+        \tName of the global variable
+        value: Object
+        \tValue that is assigned to glob_var
+
+        """
+
+        globals()[glob_var] = value
+
+        # Delete result cache because assignment changes results
+        with self.cache_lock:
+            self.clear_results()
+            self._eval_local.assignment_invalidations = self._invalidations
+
+        is_current = self._namespace is not None and \
+            self._namespace_version == CodeArray.globals_version
+
+        CodeArray.globals_version += 1
+
+        # Helper variables such as S shadow module globals in the namespace
+        if is_current and glob_var not in self._get_namespace_helpers():
+            self._namespace[glob_var] = value
+            self._namespace_version = CodeArray.globals_version
+
     def _eval_cell(self, key, code):
-        """Evaluates one cell and returns its result"""
+        """Evaluates one cell and returns its result
 
-        # Flatten helper function
-        def nn(val):
-            """Returns flat numpy arraz without None values"""
-            try:
-                return numpy.array(filter(None, val.flat))
+        The keys that are accessed during evaluation are recorded as
+        precedents of key in the dependency graph. If a profiler is set then
+        the evaluation time is recorded.
 
-            except AttributeError:
-                # Probably no numpy array
-                return numpy.array(filter(None, val))
+        """
 
-        # Set up environment for evaluation
+        node = get_cache_key(key)
 
-        env_dict = {'X': key[0], 'Y': key[1], 'Z': key[2], 'bz2': bz2,
-                    'base64': base64, 'charts': charts, 'nn': nn,
-                    'R': key[0], 'C': key[1], 'T': key[2], 'S': self,
-                    'vlcpanel_factory': vlcpanel_factory}
-        env = self._get_updated_environment(env_dict=env_dict)
+        with self.cache_lock:
+            self.dependencies.remove_precedents(node)
+        self._eval_stack.append(node)
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
+        try:
+            return self._eval_code(key, code)
+
+        finally:
+            self._eval_stack.pop()
+
+            if profiler is not None:
+                with self.cache_lock:
+                    profiler.stop(node)
+
+    def _eval_code(self, key, code):
+        """Evaluates code of one cell in its environment and returns result"""
 
         #_old_code = self(key)
 
@@ -1269,50 +3728,29 @@ class CodeArray(DataArray):
 
         # If only 1 term in front of the "=" --> global
 
-        try:
-            assignment_target_error = None
-            module = ast.parse(code)
-            assignment_target_end = self._get_assignment_target_end(module)
-
-        except ValueError, err:
-            assignment_target_error = ValueError(err)
-
-        except AttributeError, err:
-            # Attribute Error includes RunTimeError
-            assignment_target_error = AttributeError(err)
-
-        except Exception, err:
-            assignment_target_error = Exception(err)
-
-        if assignment_target_error is None and assignment_target_end != -1:
-            glob_var = code[:assignment_target_end]
-            expression = code.split("=", 1)[1]
-            expression = expression.strip()
+        glob_var, code_object, error = self._get_compiled_code(code)
 
-            # Delete result cache because assignment changes results
-            self.result_cache.clear()
+        if error is not None:
+            result = error
 
         else:
-            glob_var = None
-            expression = code
 
-        if assignment_target_error is not None:
-            result = assignment_target_error
+            # Set up environment for evaluation
+            # The magic variables X, Y, Z, R, C, T are passed as locals, so
+            # that the namespace, which is shared by cells that are read via
+            # S, stays untouched. See _get_compiled_code for nested scopes.
 
-        else:
+            env = self._get_namespace()
+            magic_vars = dict(zip(self.magic_names, tuple(key[:3]) * 2))
 
             try:
-                import signal
+                # Cells that are read via S share the budget of this cell
+                with self.watchdog.budget(config["timeout"]):
+                    result = eval(code_object, env, magic_vars)
 
-                signal.signal(signal.SIGALRM, self.handler)
-                signal.alarm(config["timeout"])
-
-            except:
-                # No POSIX system
-                pass
-
-            try:
-                result = eval(expression, env, {})
+            except EvaluationTimeout:
+                result = RuntimeError(
+                    "Timeout after {} s.".format(config["timeout"]))
 
             except AttributeError, err:
                 # Attribute Error includes RunTimeError
@@ -1324,18 +3762,11 @@ class CodeArray(DataArray):
             except Exception, err:
                 result = Exception(err)
 
-            finally:
-                try:
-                    signal.alarm(0)
-                except:
-                    # No POSIX system
-                    pass
-
         # Change back cell value for evaluation from other cells
         #self.dict_grid[key] = _old_code
 
         if glob_var is not None:
-            globals().update({glob_var: result})
+            self._set_global(glob_var, result)
 
         return result
 
@@ -1349,14 +3780,81 @@ class CodeArray(DataArray):
 
         """
 
-        try:
-            self.result_cache.pop(repr(key))
-
-        except KeyError:
-            pass
+        self._invalidate(key, is_global=self._is_assignment(self(key)))
+        with self.cache_lock:
+            self.dependencies.remove_precedents(key)
 
         return DataArray.pop(self, key)
 
+    @undoable
+    def _invalidate_all(self):
+        """Removes all results and dependencies after cells have been moved
+
+        Results are removed on do, redo and undo. Structural edits call
+        this before and after moving cells, so that results are removed
+        after the cells have been moved in both directions.
+
+        """
+
+        with self.cache_lock:
+            self.clear_results()
+            self.dependencies.clear()
+
+        yield "_invalidate_all"
+
+        # Undo actions
+
+        with self.cache_lock:
+            self.clear_results()
+            self.dependencies.clear()
+
+    def insert(self, insertion_point, no_to_insert, axis, tab=None):
+        """Inserts rows/cols/tabs and invalidates all results
+
+        See DataArray.insert for the parameters.
+
+        """
+
+        self._invalidate_all()
+        DataArray.insert(self, insertion_point, no_to_insert, axis, tab)
+        self._invalidate_all()
+
+    def delete(self, deletion_point, no_to_delete, axis, tab=None):
+        """Deletes rows/cols/tabs and invalidates all results
+
+        See DataArray.delete for the parameters.
+
+        """
+
+        self._invalidate_all()
+        DataArray.delete(self, deletion_point, no_to_delete, axis, tab)
+        self._invalidate_all()
+
+    def permute(self, order, axis, tab):
+        """Reorders rows/cols and invalidates all results
+
+        See DataArray.permute for the parameters.
+
+        """
+
+        self._invalidate_all()
+        DataArray.permute(self, order, axis, tab)
+        self._invalidate_all()
+
+    def recalculate_all(self):
+        """Evaluates all cells in worker processes and fills the result cache
+
+        The number of worker processes is taken from the config.
+        See recalculation.recalculate for details.
+
+        """
+
+        from src.model.recalculation import recalculate
+
+        # One watchdog batch for all cells that are evaluated here
+        with self.watchdog.batch():
+            recalculate(self, config["recalculation_processes"])
+
     def reload_modules(self):
         """Reloads modules that are available in cells"""
 
@@ -1367,6 +3865,8 @@ class CodeArray(DataArray):
         for module in modules:
             reload(module)
 
+        CodeArray.globals_version += 1
+
     def clear_globals(self):
         """Clears all newly assigned globals"""
 
@@ -1377,12 +3877,23 @@ class CodeArray(DataArray):
                      '__file__', 'charts', 'sys', 'is_slice_like', '__name__',
                      'copy', 'imap', 'wx', 'ifilter', 'Selection', 'DictGrid',
                      'numpy', 'CodeArray', 'DataArray', 'datetime',
-                     'vlcpanel_factory']
+                     'vlcpanel_factory', 'DependencyGraph', 'LRUCache',
+                     'MemoryCache', 'get_cache_key', 'is_range_key', 'nn',
+                     'threading', 'EvaluationTimeout', 'Watchdog',
+                     'SelectionIndex', 'get_bounds', 'MutableMapping',
+                     'AttributeView', 'ChunkIndex', 'INF',
+                     'AxisMap', 'Occupancy', 'CompactDictGrid',
+                     'PackedChunkIndex', 'StringArena', 'pack_key',
+                     'unpack_key', 'DiskDictGrid', 'DiskStore',
+                     'StoreSnapshot', 'DataArraySnapshot', 'weakref',
+                     'SizeStore', 'SizeIndex', 'CodeType']
 
         for key in globals().keys():
             if key not in base_keys:
                 globals().pop(key)
 
+        CodeArray.globals_version += 1
+
     def get_globals(self):
         """Returns globals dict"""
 
@@ -1414,22 +3925,8 @@ class CodeArray(DataArray):
         sys.stderr = code_err
 
         try:
-            import signal
-
-            signal.signal(signal.SIGALRM, self.handler)
-            signal.alarm(config["timeout"])
-
-        except:
-            # No POSIX system
-            pass
-
-        try:
-            exec(self.macros, globals())
-            try:
-                signal.alarm(0)
-            except:
-                # No POSIX system
-                pass
+            with self.watchdog.budget(config["timeout"]):
+                exec(self.macros, globals())
 
         except Exception:
             # Print exception
@@ -1450,11 +3947,15 @@ class CodeArray(DataArray):
         code_out.close()
         code_err.close()
 
-        # Reset result cache
-        self.result_cache.clear()
+        with self.cache_lock:
+            # Reset result cache
+            self.clear_results()
+
+            # Reset frozen cache
+            self.frozen_cache.clear()
 
-        # Reset frozen cache
-        self.frozen_cache.clear()
+        # Macros may have changed globals
+        CodeArray.globals_version += 1
 
         return results, errs
 
@@ -1576,7 +4077,4 @@ class CodeArray(DataArray):
                 # re errors are cryptical: sre_constants,...
                 pass
 
-    def handler(self, signum, frame):
-        raise RuntimeError("Timeout after {} s.".format(config["timeout"]))
-
 # End of class CodeArray
@@ -0,0 +1,422 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+"""
+recalculation
+=============
+
+Parallel recalculation of all cells of a code array
+
+Cells are partitioned into groups that do not read each other according to
+the dependency graph. The groups are evaluated in worker processes. Each
+worker is a new Python interpreter, i. e. it does not inherit the state of
+the GUI process. It evaluates cells in its own code array, which is created
+from a snapshot of the code and of the assigned globals of the main code
+array.
+
+Provides
+--------
+
+ * get_independent_groups: Partitions keys into independent groups
+ * recalculate: Evaluates all cells of a code array in worker processes
+
+"""
+
+import cPickle as pickle
+import multiprocessing
+import os
+import subprocess
+import sys
+
+import src
+from src.lib.caches import is_range_key
+
+# Directory, from which the src package is imported by worker processes
+_IMPORT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(src.__file__)))
+
+
+def _get_worker_command():
+    """Returns command line that starts a worker process"""
+
+    return [sys.executable, "-c",
+            "from src.model.recalculation import run_worker; run_worker()"]
+
+
+def run_worker():
+    """Main function of a worker process
+
+    Reads a pickled (snapshot, keys) tuple from stdin, evaluates the keys and
+    writes the pickled list of results from _evaluate_keys to stdout.
+
+    """
+
+    if sys.platform == "win32":
+        import msvcrt
+        msvcrt.setmode(sys.stdin.fileno(), os.O_BINARY)
+        msvcrt.setmode(sys.stdout.fileno(), os.O_BINARY)
+
+    # Cells may print, so results are written to a duplicate of stdout
+    output = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+
+    snapshot, keys = pickle.load(sys.stdin)
+
+    # The config requires an app, no window is created
+    import wx
+    __ = wx.App(False)
+
+    code_array = _get_worker_code_array(snapshot)
+
+    pickle.dump(_evaluate_keys(code_array, keys), output,
+                pickle.HIGHEST_PROTOCOL)
+    output.close()
+
+
+def _get_worker_code_array(snapshot):
+    """Returns code array of a worker process from a snapshot
+
+    Macros are not executed because they may have side effects. Globals
+    are set to the values that have been assigned in the main process.
+
+    Parameters
+    ----------
+    snapshot: Dict
+    \tSnapshot of the main code array from get_snapshot
+
+    """
+
+    from src.model.model import CodeArray
+
+    code_array = CodeArray(snapshot["shape"])
+    code_array.dict_grid.update(snapshot["grid"])
+    code_array.cell_attributes = snapshot["cell_attributes"]
+
+    for glob_var, value in snapshot["globals"]:
+        code_array._set_global(glob_var, value)
+
+    return code_array
+
+
+def _get_edges(code_array, key):
+    """Returns list of (node, precedents) for key and its slice precedents"""
+
+    edges = []
+    visited = set()
+    stack = [key]
+
+    while stack:
+        node = stack.pop()
+        if node not in visited:
+            visited.add(node)
+            precedents = code_array.dependencies.get_precedents(node)
+            edges.append((node, precedents))
+            stack.extend(filter(is_range_key, precedents))
+
+    return edges
+
+
+def _evaluate_keys(code_array, keys):
+    """Evaluates keys in the code array of a worker process
+
+    Returns list of (key, pickled result, edges) tuples.
+    The pickled result is None if the result cannot be pickled.
+
+    """
+
+    results = []
+
+    with code_array.watchdog.batch():
+        for key in keys:
+            result = code_array[key]
+
+            try:
+                pickled_result = pickle.dumps(result,
+                                              pickle.HIGHEST_PROTOCOL)
+
+            except Exception:
+                # E.g. wx.Bitmap or matplotlib figures
+                pickled_result = None
+
+            edges = _get_edges(code_array, key)
+
+            results.append((key, pickled_result, edges))
+
+    return results
+
+
+def get_snapshot(code_array, assigned_globals):
+    """Returns picklable snapshot of the code array for worker processes
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCode array, of which the snapshot is taken
+    assigned_globals: List of (String, Object) tuples
+    \tNames and values of the globals that the assignment cells have set
+
+    """
+
+    return {
+        "shape": code_array.shape,
+        "grid": dict(code_array.dict_grid.iteritems()),
+        "cell_attributes": list(code_array.cell_attributes),
+        "globals": assigned_globals,
+    }
+
+
+def get_independent_groups(keys, dependencies, no_groups):
+    """Returns list of at most no_groups lists of keys
+
+    Keys that are connected in the dependency graph, directly or via
+    slices, end up in the same group. Groups are balanced by size.
+
+    Parameters
+    ----------
+    keys: Iterable of 3-tuples of Integer
+    \tKeys of cells that are partitioned
+    dependencies: DependencyGraph
+    \tGraph of read accesses between cells
+    no_groups: Integer
+    \tMaximum number of groups
+
+    """
+
+    keys = list(keys)
+    keyset = set(keys)
+
+    # Union find over keys
+    parents = dict((key, key) for key in keys)
+
+    def find(key):
+        root = key
+        while parents[root] != root:
+            root = parents[root]
+        while parents[key] != root:
+            parents[key], key = root, parents[key]
+        return root
+
+    for key in keys:
+        visited = set()
+        stack = list(dependencies.get_precedents(key))
+        while stack:
+            node = stack.pop()
+            if node in visited:
+                continue
+            visited.add(node)
+            if is_range_key(node):
+                # Slice node
+                stack.extend(dependencies.get_precedents(node))
+            elif node in keyset:
+                parents[find(node)] = find(key)
+
+    components = {}
+    for key in keys:
+        components.setdefault(find(key), []).append(key)
+
+    groups = [[] for _ in xrange(max(1, min(no_groups, len(components))))]
+
+    # Largest components first into the currently smallest group
+    for component in sorted(components.itervalues(), key=len, reverse=True):
+        min(groups, key=len).extend(sorted(component))
+
+    return [group for group in groups if group]
+
+
+def _start_workers(payloads):
+    """Starts one worker process per payload and returns the processes
+
+    All processes are started before the payloads are sent, so that the
+    interpreters start up in parallel.
+
+    """
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [_IMPORT_PATH] + filter(None, [os.environ.get("PYTHONPATH")]))
+
+    # Windows does not support close_fds together with redirection
+    workers = [subprocess.Popen(_get_worker_command(), stdin=subprocess.PIPE,
+                                stdout=subprocess.PIPE, env=env,
+                                close_fds=os.name == "posix")
+               for __ in payloads]
+
+    for worker, payload in zip(workers, payloads):
+        try:
+            worker.stdin.write(payload)
+            worker.stdin.close()
+
+        except (IOError, OSError):
+            # The worker has terminated, which is detected on reading
+            pass
+
+    return workers
+
+
+def _read_results(worker):
+    """Returns results of worker process or None if the worker has failed"""
+
+    try:
+        return pickle.load(worker.stdout)
+
+    except Exception:
+        # E.g. EOFError if the worker has terminated with an error
+        return
+
+    finally:
+        worker.stdout.close()
+        worker.wait()
+
+
+def is_graph_complete(code_array, keys):
+    """Returns True if the dependency graph contains the reads of all keys
+
+    The reads of a cell are recorded when it is evaluated. Reads of cells
+    that have a cached result are up to date because cells that are
+    changed, and their dependents, are removed from the result cache.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCode array, of which the result cache and dependencies are checked
+    keys: Iterable of 3-tuples of Integer
+    \tKeys of cells that are partitioned
+
+    """
+
+    is_cached = code_array.is_cached
+
+    return all(is_cached(key) for key in keys)
+
+
+def recalculate(code_array, processes=None):
+    """Evaluates all cells with code and fills the result cache
+
+    Frozen cells and button cells are not evaluated. Cells that assign
+    globals are evaluated first in the main process. Their values are
+    passed to the workers. Results that cannot be pickled are evaluated in
+    the main process.
+
+    Cells are evaluated serially if no worker process can be started, if
+    the code array has macros, whose side effects must not be repeated in
+    each worker, if an assigned global cannot be pickled or if the reads of
+    a cell are unknown, e.g. on the first recalculation.
+
+    Parameters
+    ----------
+    code_array: CodeArray
+    \tCode array, of which all cells are recalculated
+    processes: Integer, defaults to None
+    \tNumber of worker processes, None or 0 for number of CPUs
+
+    """
+
+    if code_array.safe_mode:
+        return
+
+    if not processes:
+        processes = multiprocessing.cpu_count()
+
+    keys = []
+    assignments = []
+
+    for key in sorted(code_array.keys()):
+        cell_attributes = code_array.cell_attributes
+        if cell_attributes.get(key, "frozen") or \
+           cell_attributes.get(key, "button_cell"):
+            continue
+
+        glob_var, __, __ = code_array._get_compiled_code(code_array(key))
+        if glob_var is None:
+            keys.append(key)
+        else:
+            assignments.append((key, glob_var))
+
+    # Reads are recorded in the dependency graph on evaluation, so the
+    # completeness has to be checked before the results are removed
+    is_parallel = processes > 1 and len(keys) > 1 and \
+        not code_array.macros.strip() and is_graph_complete(code_array, keys)
+
+    # Groups are computed before they are removed with the results
+    if is_parallel:
+        groups = get_independent_groups(keys, code_array.dependencies,
+                                        processes)
+
+    code_array.clear_results()
+
+    assigned_globals = [(glob_var, code_array[key])
+                        for key, glob_var in assignments]
+
+    if not is_parallel:
+        for key in keys:
+            code_array[key]
+        return
+
+    try:
+        snapshot = get_snapshot(code_array, assigned_globals)
+        payloads = [pickle.dumps((snapshot, group), pickle.HIGHEST_PROTOCOL)
+                    for group in groups]
+
+    except Exception:
+        # An assigned global cannot be pickled
+        for key in keys:
+            code_array[key]
+        return
+
+    try:
+        workers = _start_workers(payloads)
+
+    except OSError:
+        # No worker process can be started on this system
+        for key in keys:
+            code_array[key]
+        return
+
+    # Results are not stored if cells are changed in the meantime
+    invalidations = code_array._invalidations
+
+    serial_keys = []
+
+    for worker, group in zip(workers, groups):
+        results = _read_results(worker)
+
+        if results is None:
+            serial_keys.extend(group)
+            continue
+
+        for key, pickled_result, edges in results:
+            if pickled_result is None:
+                serial_keys.append(key)
+                result = None
+            else:
+                result = pickle.loads(pickled_result)
+
+            with code_array.cache_lock:
+                for node, precedents in edges:
+                    code_array.dependencies.remove_precedents(node)
+                    for precedent in precedents:
+                        code_array.dependencies.add(node, precedent)
+
+                if pickled_result is not None and \
+                   invalidations == code_array._invalidations:
+                    code_array.result_cache[key] = result
+
+    for key in serial_keys:
+        code_array[key]
@@ -31,9 +31,12 @@ Unit tests for model.py
 import ast
 from copy import deepcopy
 import fractions  ## Yes, it is required
+from itertools import product
 import math  ## Yes, it is required
 import os
+import random
 import sys
+import threading
 
 import py.test as pytest
 import numpy
@@ -46,12 +49,16 @@ sys.path.insert(0, TESTPATH)
 sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
 sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
 
+from src.config import config
 from src.lib.testlib import params, pytest_generate_tests, undotest_model
 
 from src.model.model import KeyValueStore, CellAttributes, DictGrid
-from src.model.model import DataArray, CodeArray
+from src.model.model import DataArray, CodeArray, CompactDictGrid
+from src.model.model import DiskDictGrid
+from src.lib.compact_storage import StringArena
 
 from src.lib.selection import Selection
+from src.lib.undo import group as undo_group
 from src.lib.undo import stack as undo_stack
 
 
@@ -73,6 +80,33 @@ class TestKeyValueStore(object):
 
         assert self.k_v_store[key] == 7
 
+    def test_snapshot(self):
+        """Snapshots keep their content while the store changes"""
+
+        self.k_v_store[(1, 0)] = 10
+        self.k_v_store[(2, 0)] = 20
+
+        snapshot = self.k_v_store.get_snapshot()
+
+        self.k_v_store[(1, 0)] = 11
+        self.k_v_store[(1, 0)] = 12
+        self.k_v_store.pop((2, 0))
+        self.k_v_store[(3, 0)] = 30
+
+        assert snapshot[(1, 0)] == 10
+        assert snapshot[(3, 0)] is None
+        assert (2, 0) in snapshot and (3, 0) not in snapshot
+        assert sorted(snapshot.items()) == [((1, 0), 10), ((2, 0), 20)]
+
+        self.k_v_store.clear()
+        assert snapshot.data is not None
+        assert sorted(snapshot) == [(1, 0), (2, 0)]
+        assert not self.k_v_store._snapshots
+
+        del snapshot
+        self.k_v_store.get_snapshot()
+        assert not self.k_v_store._snapshots
+
 
 class TestCellAttributes(object):
     """Unit tests for CellAttributes"""
@@ -108,6 +142,237 @@ class TestCellAttributes(object):
         assert self.cell_attr[32, 53, 0]["testattr"] == 2
         assert self.cell_attr[2, 2, 0]["testattr"] == 3
 
+    def test_invalidate(self):
+        """Appending attributes only invalidates cells in its bounding box"""
+
+        selection_1 = Selection([(2, 2)], [(4, 5)], [], [], [])
+        selection_2 = Selection([], [], [], [], [(3, 3)])
+
+        self.cell_attr.append((selection_1, 0, {"testattr": 1}))
+
+        outside = self.cell_attr[0, 0, 0]
+        other_table = self.cell_attr[3, 3, 1]
+        assert self.cell_attr[3, 3, 0]["testattr"] == 1
+
+        self.cell_attr.append((selection_2, 0, {"testattr": 2}))
+
+        assert self.cell_attr[3, 3, 0]["testattr"] == 2
+        assert self.cell_attr[2, 2, 0]["testattr"] == 1
+        assert self.cell_attr[0, 0, 0].record is outside.record
+        assert self.cell_attr[3, 3, 1].record is other_table.record
+
+        undo_stack().undo()
+
+        assert self.cell_attr[3, 3, 0]["testattr"] == 1
+
+        self.cell_attr[0] = (selection_2, 1, {"testattr": 3})
+
+        assert "testattr" not in self.cell_attr[2, 2, 0]
+        assert self.cell_attr[3, 3, 1]["testattr"] == 3
+
+    def test_invalidate_chunks(self):
+        """Invalidation only visits the cache chunks of the selection"""
+
+        self.cell_attr.append((Selection([], [], [], [], [(0, 0)]), 0,
+                               {"testattr": 1}))
+
+        for row in xrange(0, 2000, 10):
+            self.cell_attr[row, 0, 0]
+
+        chunks = self.cell_attr._attr_cache[0]
+        far_chunk = chunks[self.cell_attr._get_chunk_key(1990, 0)]
+
+        self.cell_attr.append((Selection([(0, 0)], [(300, 0)], [], [], []),
+                               0, {"testattr": 2}))
+
+        assert chunks[self.cell_attr._get_chunk_key(1990, 0)] is far_chunk
+        assert self.cell_attr._get_chunk_key(0, 0) not in chunks
+        assert (310, 0) in chunks[self.cell_attr._get_chunk_key(310, 0)]
+        assert (300, 0) not in chunks[self.cell_attr._get_chunk_key(300, 0)]
+        assert self.cell_attr[300, 0, 0]["testattr"] == 2
+        assert "testattr" not in self.cell_attr[310, 0, 0]
+
+    def test_threads(self):
+        """Attributes may be read in one thread while another appends"""
+
+        import threading
+
+        def read():
+            for row in xrange(3000):
+                self.cell_attr.get((row % 300, 0, 0), "testattr")
+                self.cell_attr.get_merge_area((row % 300, 0, 0))
+
+        thread = threading.Thread(target=read)
+        thread.start()
+
+        for row in xrange(300):
+            self.cell_attr.append((Selection([], [], [], [], [(row, 0)]), 0,
+                                   {"testattr": row}))
+
+        thread.join()
+
+        assert self.cell_attr[299, 0, 0]["testattr"] == 299
+        assert self.cell_attr.get((150, 0, 0), "testattr") == 150
+
+    def test_deepcopy(self):
+        """Deep copies have their own lock"""
+
+        self.cell_attr.append((Selection([], [], [], [], [(1, 0)]), 0,
+                               {"testattr": 1}))
+
+        cell_attr = deepcopy(self.cell_attr)
+
+        assert cell_attr._lock is not self.cell_attr._lock
+        assert cell_attr[1, 0, 0]["testattr"] == 1
+
+    def test_get_compacted(self):
+        """Compaction keeps the resolved attributes of all cells"""
+
+        rnd = random.Random(3)
+
+        attr_values = [{"bgcolor": 1}, {"bgcolor": 2}, {"pointsize": 12},
+                       {"bgcolor": 1, "pointsize": 8}, {"angle": 90.0}]
+
+        for __ in xrange(200):
+            top, left = rnd.randint(0, 8), rnd.randint(0, 8)
+            choice = rnd.randint(0, 3)
+            if choice == 0:
+                selection = Selection([], [], [], [], [(top, left)])
+            elif choice == 1:
+                selection = Selection([(top, left)],
+                                      [(top + rnd.randint(0, 4),
+                                        left + rnd.randint(0, 4))], [], [], [])
+            elif choice == 2:
+                selection = Selection([], [], [top], [], [])
+            else:
+                selection = Selection([], [], [], [left], [])
+
+            self.cell_attr.append((selection, rnd.randint(0, 1),
+                                   dict(rnd.choice(attr_values))))
+
+        keys = [(row, col, tab) for row in xrange(15) for col in xrange(15)
+                for tab in xrange(2)]
+        attrs = [dict(self.cell_attr[key]) for key in keys]
+
+        compacted = self.cell_attr.get_compacted()
+        assert len(compacted) < len(self.cell_attr)
+
+        self.cell_attr.compact()
+        assert len(self.cell_attr) == len(compacted)
+        assert [self.cell_attr[key] for key in keys] == attrs
+
+        undo_stack().undo()
+        assert len(self.cell_attr) == 200
+        assert [self.cell_attr[key] for key in keys] == attrs
+
+    def test_get_compacted_merge(self):
+        """Subsequent entries are coalesced and merged"""
+
+        selection_1 = Selection([], [], [], [], [(1, 1)])
+        selection_2 = Selection([(2, 2)], [(3, 3)], [], [], [])
+
+        self.cell_attr.append((selection_1, 0, {"bgcolor": 1}))
+        self.cell_attr.append((selection_1, 0, {"pointsize": 8}))
+        self.cell_attr.append((selection_2, 1, {"angle": 90.0}))
+        self.cell_attr.append((selection_2, 0, {"bgcolor": 1,
+                                                "pointsize": 8}))
+
+        compacted = self.cell_attr.get_compacted()
+
+        assert compacted == [
+            (Selection([(2, 2)], [(3, 3)], [], [], [(1, 1)]), 0,
+             {"bgcolor": 1, "pointsize": 8}),
+            (selection_2, 1, {"angle": 90.0}),
+        ]
+
+        # Attribute dicts of self are not changed
+        assert self.cell_attr[1, 1, 0]["pointsize"] == 8
+        assert list.__getitem__(self.cell_attr, 0)[2] == {"bgcolor": 1}
+
+    def test_is_compaction_due(self):
+        """Unit test for is_compaction_due"""
+
+        assert not self.cell_attr.is_compaction_due()
+
+    def test_shared_records(self):
+        """Cells with identical attributes share one record"""
+
+        selection_1 = Selection([(0, 0)], [(99, 99)], [], [], [])
+        selection_2 = Selection([], [], [], [], [(5, 5)])
+
+        self.cell_attr.append((selection_1, 0, {"bgcolor": 1}))
+        self.cell_attr.append((selection_2, 1, {"bgcolor": 1}))
+
+        attrs_1 = self.cell_attr[3, 4, 0]
+        attrs_2 = self.cell_attr[98, 1, 0]
+        attrs_3 = self.cell_attr[5, 5, 1]
+
+        assert attrs_1.record is attrs_2.record is attrs_3.record
+        assert self.cell_attr[200, 0, 0].record is \
+            self.cell_attr[0, 0, 1].record
+
+        # Copy on write
+        attrs_1["bgcolor"] = 2
+        assert attrs_1["bgcolor"] == 2
+        assert attrs_2["bgcolor"] == 1
+        assert self.cell_attr[3, 4, 0]["bgcolor"] == 1
+        assert attrs_2 == attrs_2.copy()
+
+    def test_get(self):
+        """get returns the same values as __getitem__"""
+
+        selection_1 = Selection([(2, 2)], [(4, 5)], [55], [55, 66], [(34, 56)])
+        selection_2 = Selection([], [], [], [], [(32, 53), (34, 56)])
+        selection_3 = Selection([], [], [], [], [(3, 3)])
+
+        self.cell_attr.append((selection_1, 0, {"frozen": True}))
+        self.cell_attr.append((selection_2, 0, {"frozen": False,
+                                                "bgcolor": 3}))
+
+        keys = [(2, 2, 0), (34, 56, 0), (32, 53, 0), (0, 0, 0), (3, 3, 0),
+                (3, 3, 1)]
+
+        for attr_key in "frozen", "bgcolor", "button_cell":
+            assert [self.cell_attr.get(key, attr_key) for key in keys] == \
+                [self.cell_attr[key][attr_key] for key in keys]
+
+        # Layers are updated on append and undo
+        self.cell_attr.get((3, 3, 0), "frozen")
+        self.cell_attr.append((selection_3, 0, {"frozen": False}))
+        assert self.cell_attr.get((3, 3, 0), "frozen") is False
+
+        undo_stack().undo()
+        assert self.cell_attr.get((3, 3, 0), "frozen") is True
+
+    def test_get_merge_area(self):
+        """Unit test for get_merge_area"""
+
+        selection_1 = Selection([(2, 2)], [(5, 5)], [], [], [])
+        selection_2 = Selection([(3, 3)], [(4, 4)], [], [], [])
+
+        self.cell_attr.append((selection_1, 0, {"merge_area": (2, 2, 5, 5)}))
+
+        assert self.cell_attr.get_merge_area((2, 2, 0)) == (2, 2, 5, 5)
+        assert self.cell_attr.get_merge_area((5, 5, 0)) == (2, 2, 5, 5)
+        assert self.cell_attr.get_merge_area((6, 5, 0)) is None
+        assert self.cell_attr.get_merge_area((2, 2, 1)) is None
+
+        # Unmerge part of the area
+        self.cell_attr.append((selection_2, 0, {"merge_area": None}))
+
+        assert self.cell_attr.get_merge_area((3, 3, 0)) is None
+        assert self.cell_attr.get_merge_area((2, 2, 0)) == (2, 2, 5, 5)
+
+        undo_stack().undo()
+        assert self.cell_attr.get_merge_area((3, 3, 0)) == (2, 2, 5, 5)
+
+        # Unbounded selections fall back to the attribute layer
+        self.cell_attr.append((Selection([], [], [7], [], []), 0,
+                               {"merge_area": (7, 0, 7, 3)}))
+
+        assert self.cell_attr.get_merge_area((7, 100, 0)) == (7, 0, 7, 3)
+        assert self.cell_attr.get_merge_area((2, 2, 0)) == (2, 2, 5, 5)
+
     def test_get_merging_cell(self):
         """Test get_merging_cell"""
 
@@ -146,6 +411,280 @@ class TestDictGrid(object):
         self.dict_grid[(2, 4, 5)] = "Test"
         assert self.dict_grid[(2, 4, 5)] == "Test"
 
+    def test_chunks(self):
+        """Chunk index follows changes, undo and redo of the grid"""
+
+        def is_indexed():
+            return sorted(self.dict_grid.get_keys()) == \
+                sorted(self.dict_grid.keys())
+
+        self.dict_grid[(2, 4, 5)] = "Test"
+        self.dict_grid[(90, 80, 5)] = "1"
+        self.dict_grid.pop((2, 4, 5))
+        assert self.dict_grid.get_keys(5) == [(90, 80, 5)]
+        assert is_indexed()
+
+        undo_stack().undo()
+        assert is_indexed()
+        assert self.dict_grid.get_keys(5, bottom=10) == [(2, 4, 5)]
+
+        undo_stack().redo()
+        assert is_indexed()
+
+        self.dict_grid.update({(1, 1, 1): "2"})
+        assert self.dict_grid.get_tables() == [1, 5]
+
+        self.dict_grid.clear()
+        assert self.dict_grid.get_keys() == []
+
+    param_test_snapshot = [
+        {'grid_class': DictGrid},
+        {'grid_class': CompactDictGrid},
+        {'grid_class': DiskDictGrid},
+    ]
+
+    @params(param_test_snapshot)
+    def test_snapshot(self, grid_class):
+        """Snapshots survive cell changes, undo and row insertion"""
+
+        dict_grid = grid_class((100, 100, 100))
+        dict_grid[(1, 2, 3)] = "a"
+        dict_grid[(5, 2, 3)] = "b"
+
+        snapshot = dict_grid.get_snapshot()
+        content = {(1, 2, 3): "a", (5, 2, 3): "b"}
+
+        dict_grid[(1, 2, 3)] = "c"
+        dict_grid.pop((5, 2, 3))
+        undo_stack().undo()
+        dict_grid[(0, 0, 0)] = "d"
+
+        assert dict(snapshot.items()) == content
+        assert snapshot.data is None
+
+        dict_grid.insert_axis(0, 4, 0)
+        assert dict_grid.get((5, 2, 3)) == "c"
+        assert dict(snapshot.items()) == content
+        assert snapshot[(1, 2, 3)] == "a"
+
+    def test_snapshot_thread(self):
+        """Snapshots are consistent while another thread edits the grid"""
+
+        for row in xrange(100):
+            self.dict_grid[(row, 0, 0)] = str(row)
+
+        snapshot = self.dict_grid.get_snapshot()
+        content = dict(self.dict_grid.iteritems())
+        results = []
+
+        def read():
+            for __ in xrange(50):
+                results.append(dict(snapshot.items()) == content)
+                results.append(snapshot[(7, 0, 0)] == "7")
+
+        thread = threading.Thread(target=read)
+        thread.start()
+
+        for i in xrange(2000):
+            self.dict_grid[(i % 99, 0, 0)] = str(-i)
+            if i % 3:
+                self.dict_grid.pop((i % 80, 0, 0), None)
+
+        thread.join()
+
+        assert all(results)
+
+
+class TestCompactDictGrid(object):
+    """Unit tests for CompactDictGrid"""
+
+    def setup_method(self, method):
+        """Creates empty CompactDictGrid"""
+
+        self.dict_grid = CompactDictGrid((100000, 100, 3))
+
+    def test_setitem_pop(self):
+        """Values round-trip and changes can be undone"""
+
+        self.dict_grid[(2, 4, 1)] = u"'\xe4'"
+        self.dict_grid[(3, 4, 1)] = "1"
+        self.dict_grid[(3, 4, 1)] = "2"
+        self.dict_grid[(5, 5, 1)] = None
+
+        assert self.dict_grid[(2, 4, 1)] == u"'\xe4'"
+        assert self.dict_grid[(3, 4, 1)] == "2"
+        assert self.dict_grid[(9, 9, 1)] is None
+        assert self.dict_grid.get((9, 9, 1), "default") == "default"
+        assert (5, 5, 1) in self.dict_grid
+
+        assert self.dict_grid.pop((2, 4, 1)) == u"'\xe4'"
+        assert (2, 4, 1) not in self.dict_grid
+
+        undo_stack().undo()
+        undo_stack().undo()
+        assert self.dict_grid[(2, 4, 1)] == u"'\xe4'"
+        assert self.dict_grid[(3, 4, 1)] == "2"
+
+        undo_stack().undo()
+        assert self.dict_grid[(3, 4, 1)] == "1"
+
+        assert sorted(self.dict_grid.keys()) == [(2, 4, 1), (3, 4, 1)]
+        assert self.dict_grid.get_keys(1, 3) == [(3, 4, 1)]
+
+    def test_insert_delete(self):
+        """Packed keys follow row and column maps"""
+
+        self.dict_grid[(2, 4, 1)] = "1"
+        self.dict_grid.insert_axis(0, 3, 0, 1)
+        self.dict_grid.delete_axis(1, 2, 1, 1)
+
+        assert self.dict_grid.items() == [((5, 2, 1), "1")]
+        assert self.dict_grid == {(5, 2, 1): "1"}
+
+    def test_compaction(self):
+        """Overwritten code is dropped from the arena"""
+
+        for i in xrange(200):
+            self.dict_grid[(0, 0, 0)] = "x" * 1000 + str(i)
+
+        assert len(self.dict_grid.arena) < 100000
+        assert self.dict_grid[(0, 0, 0)] == "x" * 1000 + "199"
+
+    def test_copy(self):
+        """Deep copies store their code in a new arena"""
+
+        self.dict_grid[(1, 1, 1)] = "Test"
+        self.dict_grid[(2, 1, 1)] = 3
+
+        dict_grid = deepcopy(self.dict_grid)
+
+        assert dict_grid == self.dict_grid
+        assert len(dict_grid.arena) == len("Test")
+
+    def test_memory(self):
+        """Compact storage needs less memory than DictGrid"""
+
+        def get_size(dict_grid):
+            """Returns bytes of dict, keys, values, arena and index"""
+
+            objs = [dict_grid, getattr(dict_grid, "arena", None),
+                    getattr(dict_grid, "arena", StringArena()).data]
+            for key, value in dict.iteritems(dict_grid):
+                objs += [key, value]
+                if type(key) is tuple:
+                    objs += key
+            for chunks in dict_grid.chunks.tables.itervalues():
+                objs.append(chunks)
+                objs += chunks.itervalues()
+
+            return sum(sys.getsizeof(obj)
+                       for obj in dict((id(obj), obj) for obj in objs
+                                       if obj is not None).itervalues())
+
+        dict_grid = DictGrid(self.dict_grid.shape)
+
+        for i in xrange(20000):
+            key = i * 3, i % 90, 0
+            code = "{} + {}".format(i, i % 7)
+            dict.__setitem__(dict_grid, key, code)
+            dict_grid.chunks.add(key)
+            self.dict_grid._set(key, code)
+
+        assert self.dict_grid == dict_grid
+        assert get_size(self.dict_grid) < 0.7 * get_size(dict_grid)
+
+
+class TestDiskDictGrid(object):
+    """Unit tests for DiskDictGrid"""
+
+    def setup_method(self, method):
+        """Creates empty DiskDictGrid"""
+
+        self.dict_grid = DiskDictGrid((100000, 100, 3))
+
+    def test_setitem_pop(self):
+        """Cells are stored outside the dict and changes can be undone"""
+
+        self.dict_grid[(2, 4, 1)] = u"'\xe4'"
+        self.dict_grid[(3, 4, 1)] = "1"
+        self.dict_grid[(3, 4, 1)] = "2"
+
+        assert dict.__len__(self.dict_grid) == 0
+        assert len(self.dict_grid) == 2
+        assert self.dict_grid[(3, 4, 1)] == "2"
+        assert self.dict_grid[(9, 9, 1)] is None
+
+        assert self.dict_grid.pop((2, 4, 1)) == u"'\xe4'"
+        assert (2, 4, 1) not in self.dict_grid
+
+        undo_stack().undo()
+        undo_stack().undo()
+        assert self.dict_grid == {(2, 4, 1): u"'\xe4'", (3, 4, 1): "1"}
+        assert self.dict_grid.get_keys(1, 3) == [(3, 4, 1)]
+        assert self.dict_grid.get_bbox(1) == (3, 4)
+
+    def test_insert_delete(self):
+        """Stored keys follow row and column maps"""
+
+        self.dict_grid[(2, 4, 1)] = "1"
+        self.dict_grid.insert_axis(0, 3, 0, 1)
+        self.dict_grid.delete_axis(1, 2, 1, 1)
+
+        assert self.dict_grid.items() == [((5, 2, 1), "1")]
+        assert self.dict_grid.get_keys(1, 5, 2, 5, 2) == [(5, 2, 1)]
+        assert self.dict_grid.get_bbox(1) == (5, 2)
+
+    def test_get_next_filled(self):
+        """Store queries match the occupancy of a DictGrid"""
+
+        dict_grid = DictGrid((100000, 100, 3))
+
+        for key in [(2, 4, 1), (7, 4, 1), (7, 9, 1), (30, 1, 1), (0, 0, 0)]:
+            dict_grid[key] = self.dict_grid[key] = "1"
+
+        def check():
+            for grid in dict_grid, self.dict_grid:
+                grid._occupancy.clear()
+
+            assert self.dict_grid.get_bbox(1) == dict_grid.get_bbox(1)
+
+            for row, col in product(xrange(0, 40, 3), xrange(0, 12, 2)):
+                for axis, reverse in product((0, 1), (False, True)):
+                    key = row, col, 1
+                    assert self.dict_grid.get_next_filled(
+                        key, axis, reverse) == \
+                        dict_grid.get_next_filled(key, axis, reverse)
+
+        check()
+
+        for grid in dict_grid, self.dict_grid:
+            grid.insert_axis(5, 3, 0, 1)
+            grid.insert_axis(2, 1, 1, 1)
+
+        check()
+
+        # More row ranges than range queries are scanned
+        order = range(40)[::-1] + range(40, 100000)
+        for grid in dict_grid, self.dict_grid:
+            grid.permute_axis(order, 0, 1)
+
+        check()
+
+        assert not self.dict_grid._occupancy
+
+    def test_bounded_cache(self):
+        """Only cache_pages pages stay in memory while scrolling"""
+
+        for row in xrange(0, 100000, 7):
+            self.dict_grid[(row, 3, 0)] = str(row)
+
+        for row in xrange(0, 100000, 11):
+            self.dict_grid.get((row, 3, 0))
+
+        store = self.dict_grid.store
+        assert len(store.pages) <= store.cache_pages
+        assert self.dict_grid[(99995, 3, 0)] == "99995"
+
 
 class TestDataArray(object):
     """Unit tests for DataArray"""
@@ -215,6 +754,28 @@ class TestDataArray(object):
 
         assert self.data_array.get_last_filled_cell(table)[:2] == res
 
+    def test_get_next_filled_cell(self):
+        """Unit test for get_next_filled_cell"""
+
+        self.data_array[2, 3, 0] = "1"
+        self.data_array[2, 9, 0] = "2"
+        self.data_array[8, 3, 0] = "3"
+
+        assert self.data_array.get_next_filled_cell((0, 3, 0), 0) == (2, 3, 0)
+        assert self.data_array.get_next_filled_cell((2, 3, 0), 1) == (2, 9, 0)
+        assert self.data_array.get_next_filled_cell((8, 3, 0), 0) is None
+
+        self.data_array.pop((2, 9, 0))
+        assert self.data_array.get_next_filled_cell((2, 3, 0), 1) is None
+
+        self.data_array.insert(0, 1, 0, 0)
+        assert self.data_array.get_next_filled_cell((9, 3, 0), 0,
+                                                    reverse=True) == (3, 3, 0)
+        assert self.data_array.get_last_filled_cell(0) == (9, 3, 0)
+
+        undo_stack().undo()
+        assert self.data_array.get_last_filled_cell(0) == (8, 3, 0)
+
     def test_getstate(self):
         """Unit test for __getstate__ (pickle support)"""
 
@@ -360,6 +921,37 @@ class TestDataArray(object):
             for key in val:
                 assert self.data_array.cell_attributes[target][key] == val[key]
 
+    def test_adjust_cell_attributes_cost(self):
+        """Insertion rebuilds attribute caches once for many entries"""
+
+        cell_attributes = self.data_array.cell_attributes
+        for i in xrange(4000):
+            selection = Selection([], [], [], [], [(i % 90, i % 80)])
+            cell_attributes.append((selection, i % 3, {"angle": float(i)}))
+
+        calls = []
+
+        def count(method):
+            """Returns method wrapper that counts calls"""
+
+            def wrapper(*args):
+                calls.append(method.__name__)
+                return method(*args)
+
+            return wrapper
+
+        cell_attributes._update_table = count(cell_attributes._update_table)
+        cell_attributes._update_table_cache = \
+            count(cell_attributes._update_table_cache)
+
+        self.data_array.insert(1, 1, 0)
+
+        assert "_update_table" not in calls
+        assert calls.count("_update_table_cache") <= 2
+        assert cell_attributes[(40, 79, 0)]["angle"] == 3999.0
+        assert cell_attributes[(39, 78, 2)]["angle"] == 3998.0
+        assert cell_attributes[(0, 0, 0)]["angle"] == 3600.0
+
     param_test_insert = [
         {
             "data": {(2, 3, 0): "42"},
@@ -426,6 +1018,39 @@ class TestDataArray(object):
         for key in res:
             assert self.data_array[key] == res[key]
 
+    def test_insert_delete_maps(self):
+        """Rows and cols are inserted and deleted without moving cells"""
+
+        self.data_array[2, 3, 4] = "42"
+        self.data_array[99, 0, 4] = "dropped"
+        self.data_array[5, 5, 1] = "1"
+
+        self.data_array.insert(0, 2, 0, 4)
+        assert dict(self.data_array.dict_grid.iteritems()) == \
+            {(4, 3, 4): "42", (5, 5, 1): "1"}
+        assert dict.keys(self.data_array.dict_grid).count((2, 3, 4)) == 1
+
+        self.data_array.delete(0, 3, 1)
+        assert self.data_array[4, 0, 4] == "42"
+        assert self.data_array.dict_grid.get_keys(4, 3, 0, 5, 0) == \
+            [(4, 0, 4)]
+        assert self.data_array.get_last_filled_cell(1)[:2] == (5, 2)
+
+    @undotest_model
+    def test_permute(self):
+        """Unit test for permute"""
+
+        self.data_array[0, 0, 0] = "0"
+        self.data_array[1, 0, 0] = "1"
+        self.data_array[1, 1, 1] = "other table"
+
+        self.data_array.permute([2, 1, 0], 0, 0)
+
+        assert self.data_array[2, 0, 0] == "0"
+        assert self.data_array[1, 0, 0] == "1"
+        assert self.data_array[0, 0, 0] is None
+        assert self.data_array[1, 1, 1] == "other table"
+
     def test_delete_error(self):
         """Tests delete operation error"""
 
@@ -437,6 +1062,30 @@ class TestDataArray(object):
         except ValueError:
             pass
 
+    def test_get_snapshot(self):
+        """Unit test for get_snapshot"""
+
+        self.data_array[(1, 2, 3)] = "42"
+        self.data_array.macros = u"a = 1"
+        self.data_array.row_heights[(4, 3)] = 30.0
+        selection = Selection([], [], [], [], [(1, 2)])
+        self.data_array.cell_attributes.append((selection, 3, {"angle": 90}))
+
+        snapshot = self.data_array.get_snapshot()
+
+        self.data_array[(1, 2, 3)] = "0"
+        self.data_array.macros = u""
+        self.data_array.row_heights[(4, 3)] = 10.0
+        self.data_array.cell_attributes.append((selection, 3, {"angle": 0}))
+        self.data_array.insert(0, 5, 1, 3)
+
+        assert list(snapshot) == [(1, 2, 3)]
+        assert snapshot((1, 2, 3)) == "42"
+        assert snapshot.dict_grid.macros == u"a = 1"
+        assert snapshot.dict_grid.row_heights[(4, 3)] == 30.0
+        assert snapshot.cell_attributes[(1, 2, 3)]["angle"] == 90
+        assert snapshot.shape == (100, 100, 100)
+
     def test_set_row_height(self):
         """Unit test for set_row_height"""
 
@@ -449,6 +1098,38 @@ class TestDataArray(object):
         self.data_array.set_col_width(7, 1, 22.345)
         assert self.data_array.col_widths[7, 1] == 22.345
 
+    def test_get_rows_height(self):
+        """Row height sums follow sizes, undo and row insertion"""
+
+        default = config["default_row_height"]
+
+        def get_res(first, last):
+            """Returns sum of get_row_height results"""
+
+            return sum(self.data_array.get_row_height(row, 1)
+                       for row in xrange(first, last))
+
+        self.data_array.set_row_height(3, 1, 50)
+        self.data_array.set_row_height(5, 1, 10)
+        self.data_array.set_row_height(5, 2, 100)
+
+        assert self.data_array.get_rows_height(0, 10, 1) == get_res(0, 10)
+        assert self.data_array.get_rows_height(4, 6, 1) == default + 10
+        assert self.data_array.get_rows_height(0, 10, 0) == 10 * default
+
+        undo_stack().undo()
+        self.data_array.insert(1, 2, 0)
+        assert self.data_array.row_heights[7, 1] == 10
+        assert self.data_array.get_rows_height(0, 10, 1) == get_res(0, 10)
+        assert self.data_array.get_rows_height(7, 8, 2) == default
+
+        self.data_array.set_col_width(2, 1, 7)
+        assert self.data_array.get_cols_width(0, 3, 1) == \
+            2 * config["default_col_width"] + 7
+
+        self.data_array.row_heights = {(1, 1): 1.0}
+        assert self.data_array.get_rows_height(0, 2, 1) == default + 1
+
 
 class TestCodeArray(object):
     """Unit tests for CodeArray"""
@@ -530,6 +1211,302 @@ class TestCodeArray(object):
 
         assert filled_grid[1, 0, 0] == sum(numpy.arange(0, 10, 0.1))
 
+    def test_dependencies(self):
+        """Unit test for precedents and dependents"""
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+        self.code_array[2, 0, 0] = "sum(S[0:2, 0, 0])"
+
+        assert self.code_array[2, 0, 0] == 3
+
+        assert self.code_array.precedents((1, 0, 0)) == set([(0, 0, 0)])
+        assert self.code_array.precedents((2, 0, 0)) == \
+            set([(0, 0, 0), (1, 0, 0)])
+        assert self.code_array.dependents((0, 0, 0)) == \
+            set([(1, 0, 0), (2, 0, 0)])
+        assert self.code_array.dependents((2, 0, 0)) == set()
+
+    def test_incremental_invalidation(self):
+        """Changing a cell only invalidates its transitive dependents"""
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+        self.code_array[2, 0, 0] = "S[1, 0, 0] + 1"
+        self.code_array[0, 1, 0] = "'independent'"
+
+        assert self.code_array[2, 0, 0] == 3
+        assert self.code_array[0, 1, 0] == 'independent'
+
+        self.code_array[0, 0, 0] = "10"
+
+        result_cache = self.code_array.result_cache
+        assert (1, 0, 0) not in result_cache
+        assert (2, 0, 0) not in result_cache
+        assert (0, 1, 0) in result_cache
+
+        assert self.code_array[2, 0, 0] == 12
+
+        # Slices are invalidated when a contained cell changes
+        assert list(self.code_array[0:2, 0, 0]) == [10, 11]
+        self.code_array[0, 0, 0] = "20"
+        assert list(self.code_array[0:2, 0, 0]) == [20, 21]
+
+    def test_insert_undo_invalidation(self):
+        """Undo and redo of inserts invalidate moved results"""
+
+        undo_stack().clear()
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+        self.code_array[2, 0, 0] = "X"
+
+        with undo_group("Insert rows"):
+            self.code_array.insert(0, 1, 0)
+
+        assert self.code_array[3, 0, 0] == 3
+        assert self.code_array[2, 0, 0] == 2
+
+        undo_stack().undo()
+
+        assert self.code_array[3, 0, 0] is None
+        assert self.code_array[2, 0, 0] == 2
+        assert self.code_array[1, 0, 0] == 2
+        assert self.code_array.dependents((0, 0, 0)) == set([(1, 0, 0)])
+
+        undo_stack().redo()
+
+        assert self.code_array[3, 0, 0] == 3
+        assert self.code_array[2, 0, 0] == 2
+        assert self.code_array((1, 0, 0)) is None
+
+    def test_global_invalidation(self):
+        """Changing a global assignment cell invalidates all results"""
+
+        self.code_array[0, 0, 0] = "a = 5"
+        self.code_array[1, 0, 0] = "'independent'"
+        self.code_array[0, 0, 0]
+        self.code_array[2, 0, 0] = "a + 1"
+
+        assert self.code_array[1, 0, 0] == 'independent'
+        assert self.code_array[2, 0, 0] == 6
+
+        self.code_array[0, 0, 0] = "a = 7"
+
+        assert (2, 0, 0) not in self.code_array.result_cache
+        assert (1, 0, 0) not in self.code_array.result_cache
+
+        self.code_array[0, 0, 0]
+        assert self.code_array[2, 0, 0] == 8
+
+        self.code_array[2, 0, 0]
+        self.code_array.pop((0, 0, 0))
+        assert (2, 0, 0) not in self.code_array.result_cache
+
+    param_eval_range = [
+        {'codes': ["1", "2", "3"], 'dtype': "int64", 'res': [1, 2, 3]},
+        {'codes': ["1", "2.5", "3"], 'dtype': "float64", 'res': [1, 2.5, 3]},
+        {'codes': ["True", "False", "True"], 'dtype': "bool",
+         'res': [True, False, True]},
+        {'codes': ["1", "True", "3"], 'dtype': "O", 'res': [1, True, 3]},
+        {'codes': ["1", None, "3"], 'dtype': "O", 'res': [1, None, 3]},
+        {'codes': ["1", "'a'", "3"], 'dtype': "O", 'res': [1, 'a', 3]},
+        {'codes': ["1", "2 ** 64", "3"], 'dtype': "O", 'res': [1, 2 ** 64, 3]},
+    ]
+
+    @params(param_eval_range)
+    def test_eval_range(self, codes, dtype, res):
+        """Unit test for _eval_range"""
+
+        for row, code in enumerate(codes):
+            self.code_array[row, 0, 0] = code
+
+        # Cache some results before the bulk evaluation
+        self.code_array[0, 0, 0]
+
+        result = self.code_array[0:3, 0, 0]
+
+        assert result.dtype == numpy.dtype(dtype)
+        assert list(result) == res
+
+    def test_eval_range_shape(self):
+        """Unit test for _eval_range with more than one slice"""
+
+        for row in xrange(3):
+            for col in xrange(2):
+                self.code_array[row, col, 0] = repr(row * col)
+
+        result = self.code_array[:3, :2, 0]
+
+        assert result.dtype == numpy.int64
+        assert result.shape == (3, 2)
+        assert result.tolist() == [[0, 0], [0, 1], [0, 2]]
+
+        self.code_array[0, 0, 0] = "None"
+        result = self.code_array[:3, :2, 0]
+
+        assert result.dtype == object
+        assert result.tolist() == [[None, 0], [0, 1], [0, 2]]
+
+    def test_values(self):
+        """Unit test for values"""
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "2"
+        self.code_array[2, 0, 0] = "S.values(numpy.s_[:2, 0, 0], float)"
+
+        result = self.code_array[2, 0, 0]
+
+        assert result.dtype == numpy.float64
+        assert list(result) == [1.0, 2.0]
+        assert self.code_array.values((slice(0, 2), 0, 0)).dtype == \
+            numpy.int64
+
+    def test_is_cached(self):
+        """Unit test for is_cached"""
+
+        self.code_array[0, 0, 0] = "1"
+
+        assert not self.code_array.is_cached((0, 0, 0))
+        assert self.code_array.is_cached((1, 0, 0))
+
+        self.code_array[0, 0, 0]
+
+        assert self.code_array.is_cached((0, 0, 0))
+
+    def test_is_cached_over_budget(self):
+        """Results that exceed the result cache budget are pinned"""
+
+        self.code_array.result_cache.resize(0)
+        self.code_array[0, 0, 0] = "range(1000)"
+        self.code_array[0, 0, 0]
+
+        assert self.code_array.result_cache.bytes == 0
+        assert self.code_array.is_cached((0, 0, 0))
+
+    def test_frozen_not_evicted(self):
+        """Frozen results are kept regardless of the result cache budget"""
+
+        self.code_array.result_cache.resize(0)
+        self.code_array[0, 0, 0] = "range(1000)"
+        self.code_array.cell_attributes.append(
+            (Selection([], [], [], [], [(0, 0)]), 0, {"frozen": True}))
+
+        result = self.code_array[0, 0, 0]
+        self.code_array[1, 0, 0] = "range(1000)"
+        self.code_array[1, 0, 0]
+
+        assert self.code_array.frozen_cache[(0, 0, 0)] is result
+
+    def test_eval_in_thread(self):
+        """Cells can be evaluated in another thread"""
+
+        import threading
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+
+        thread = threading.Thread(target=self.code_array.__getitem__,
+                                  args=((1, 0, 0),))
+        thread.start()
+        thread.join()
+
+        assert self.code_array.is_cached((1, 0, 0))
+        assert self.code_array[1, 0, 0] == 2
+        assert self.code_array.precedents((1, 0, 0)) == set([(0, 0, 0)])
+
+    def test_stale_result(self):
+        """Results of cells that change during evaluation are not cached"""
+
+        code_array = self.code_array
+
+        code_array.macros = "def change():\n    S[1, 0, 0] = '3'\n    return 2"
+        code_array.execute_macros()
+
+        code_array[0, 0, 0] = "change()"
+
+        assert code_array[0, 0, 0] == 2
+        assert not code_array.is_cached((0, 0, 0))
+
+    def test_clear_results(self):
+        """Results of evaluations during clear_results are not cached"""
+
+        code_array = self.code_array
+
+        code_array.macros = "def clear():\n    S.clear_results()\n    return 2"
+        code_array.execute_macros()
+
+        code_array[0, 0, 0] = "1"
+        code_array[1, 0, 0] = "clear()"
+
+        assert code_array[0, 0, 0] == 1
+        assert code_array[1, 0, 0] == 2
+        assert not code_array.is_cached((0, 0, 0))
+        assert not code_array.is_cached((1, 0, 0))
+
+    def test_global_assignment_cached(self):
+        """Global assignment cells cache their own result"""
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "cached_global = 3"
+
+        assert self.code_array[0, 0, 0] == 1
+        assert self.code_array[1, 0, 0] == 3
+        assert self.code_array.is_cached((1, 0, 0))
+        assert not self.code_array.is_cached((0, 0, 0))
+
+    def test_profiler(self):
+        """Evaluations and cache hits are recorded if profiler is set"""
+
+        from src.lib.profiler import EvalProfiler
+
+        self.code_array.profiler = EvalProfiler()
+
+        self.code_array[0, 0, 0] = "1"
+        self.code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+
+        self.code_array[1, 0, 0]
+        self.code_array[1, 0, 0]
+
+        stats = self.code_array.profiler.stats
+
+        # hits, misses
+        assert stats[(0, 0, 0)][:2] == [0, 1]
+        assert stats[(1, 0, 0)][:2] == [1, 1]
+
+    def test_timeout(self):
+        """Cells that exceed the timeout return a RuntimeError"""
+
+        timeout = config["timeout"]
+        config["timeout"] = repr(0.05)
+
+        try:
+            self.code_array[0, 0, 0] = "sum(1 for _ in iter(int, 1))"
+            self.code_array[1, 0, 0] = "S[0, 0, 0]"
+
+            result = self.code_array[1, 0, 0]
+
+        finally:
+            config["timeout"] = repr(timeout)
+
+        assert isinstance(result, RuntimeError)
+        assert "Timeout" in str(result)
+
+    def test_get_cache_stats(self):
+        """Unit test for get_cache_stats"""
+
+        self.code_array[0, 0, 0] = "numpy.zeros(1000)"
+
+        self.code_array[0, 0, 0]
+        self.code_array[0, 0, 0]
+
+        stats = self.code_array.get_cache_stats()["result_cache"]
+
+        assert stats["entries"] == 1
+        assert stats["bytes"] >= 8000
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
     def test_make_nested_list(self):
         """Unit test for _make_nested_list"""
 
@@ -585,6 +1562,32 @@ class TestCodeArray(object):
         self.code_array[key] = code
         assert self.code_array._eval_cell(key, code) == res
 
+    def test_get_compiled_code(self):
+        """Unit test for _get_compiled_code"""
+
+        code_cache = self.code_array.code_cache
+        code_cache.clear()
+
+        glob_var, code_object, error = \
+            self.code_array._get_compiled_code("a = 2 + 3")
+
+        assert glob_var == "a"
+        assert eval(code_object) == 5
+        assert error is None
+        assert code_cache.misses == 1
+
+        # Identical code from another cell is taken from the cache
+        assert self.code_array._get_compiled_code("a = 2 + 3")[1] is \
+            code_object
+        assert code_cache.hits == 1
+
+        glob_var, code_object, error = \
+            self.code_array._get_compiled_code("import os")
+
+        assert glob_var is None
+        assert code_object is None
+        assert isinstance(error, Exception)
+
     def test_execute_macros(self):
         """Unit test for execute_macros"""
 
@@ -593,6 +1596,51 @@ class TestCodeArray(object):
         assert self.code_array._eval_cell((0, 0, 0), "a") == 5
         assert self.code_array._eval_cell((0, 0, 0), "f(2)") == 4
 
+    def test_get_namespace(self):
+        """Namespace is built once and rebuilt on changes of the globals"""
+
+        namespace = self.code_array._get_namespace()
+
+        assert namespace["S"] is self.code_array
+        assert self.code_array._get_namespace() is namespace
+
+        self.code_array.macros = "b = 7"
+        self.code_array.execute_macros()
+
+        namespace = self.code_array._get_namespace()
+        assert namespace["b"] == 7
+
+        namespace = self.code_array._get_namespace()
+
+        # Global assignments update the namespace in place
+        self.code_array[0, 0, 0] = "c = 3"
+        assert self.code_array[0, 0, 0] == 3
+        assert self.code_array._get_namespace() is namespace
+        assert namespace["c"] == 3
+
+    def test_magic_variables(self):
+        """Magic variables are per cell and do not change the namespace"""
+
+        self.code_array[1, 2, 0] = "(X, Y, Z)"
+        self.code_array[3, 4, 1] = "[(X, Y, Z), S[1, 2, 0], (R, C, T)]"
+
+        assert self.code_array[3, 4, 1] == \
+            [(3, 4, 1), (1, 2, 0), (3, 4, 1)]
+
+        # Generator expressions see the magic variables
+        self.code_array[5, 0, 0] = "list(X + i for i in xrange(2))"
+        assert self.code_array[5, 0, 0] == [5, 6]
+
+        self.code_array[6, 0, 0] = "(lambda: [Y + j for j in (1, 2)])()" \
+            " # comment"
+        assert self.code_array[6, 0, 0] == [1, 2]
+
+        # Lambdas keep the magic variables of their cell
+        self.code_array[7, 0, 0] = "lambda: (X, T)"
+        assert self.code_array[7, 0, 0]() == (7, 0)
+
+        assert "X" not in self.code_array._get_namespace()
+
     def test_sorted_keys(self):
         """Unit test for _sorted_keys"""
 
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright Martin Manns
+# Distributed under the terms of the GNU General Public License
+
+# --------------------------------------------------------------------
+# pyspread is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# pyspread is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with pyspread.  If not, see <http://www.gnu.org/licenses/>.
+# --------------------------------------------------------------------
+
+
+"""
+test_recalculation
+==================
+
+Unit tests for recalculation.py
+
+"""
+
+import os
+import sys
+
+import wx
+app = wx.App()
+
+TESTPATH = os.sep.join(os.path.realpath(__file__).split(os.sep)[:-1]) + os.sep
+sys.path.insert(0, TESTPATH)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 3)
+sys.path.insert(0, TESTPATH + (os.sep + os.pardir) * 2)
+
+from src.lib.dependencies import DependencyGraph
+from src.model.model import CodeArray
+from src.model.recalculation import get_independent_groups
+from src.model.recalculation import is_graph_complete, recalculate
+
+
+def test_get_independent_groups():
+    """Unit test for get_independent_groups"""
+
+    dependencies = DependencyGraph()
+    dependencies.add((1, 0, 0), (0, 0, 0))
+    dependencies.add((3, 0, 0), ((2, 3, None), 0, 0))
+    dependencies.add(((2, 3, None), 0, 0), (2, 0, 0))
+
+    keys = [(i, 0, 0) for i in xrange(5)]
+
+    groups = get_independent_groups(keys, dependencies, 10)
+
+    assert sorted(map(sorted, groups)) == \
+        [[(0, 0, 0), (1, 0, 0)], [(2, 0, 0), (3, 0, 0)], [(4, 0, 0)]]
+
+    groups = get_independent_groups(keys, dependencies, 2)
+
+    assert len(groups) == 2
+    assert sorted(sum(groups, [])) == keys
+
+
+def test_recalculate():
+    """Unit test for recalculate"""
+
+    code_array = CodeArray((100, 10, 3))
+
+    code_array[0, 0, 0] = "2"
+    code_array[1, 0, 0] = "S[0, 0, 0] + 1"
+    code_array[2, 0, 0] = "21 * 2"
+    code_array[3, 0, 0] = "sum(S[:2, 0, 0])"
+    code_array[4, 0, 0] = "a = 5"
+    code_array[5, 0, 0] = "a + 1"
+    # Generators cannot be pickled
+    code_array[6, 0, 0] = "(i for i in xrange(3))"
+
+    # The reads of the cells are unknown, so they are evaluated serially
+    assert not is_graph_complete(code_array, [(1, 0, 0), (3, 0, 0)])
+
+    recalculate(code_array, processes=2)
+
+    assert is_graph_complete(code_array, [(1, 0, 0), (3, 0, 0)])
+
+    # Evaluation in worker processes
+    recalculate(code_array, processes=2)
+
+    assert code_array.result_cache[1, 0, 0] == 3
+    assert code_array.result_cache[2, 0, 0] == 42
+    assert code_array.result_cache[3, 0, 0] == 5
+    assert code_array.result_cache[5, 0, 0] == 6
+    assert list(code_array.result_cache[6, 0, 0]) == [0, 1, 2]
+
+    # Dependencies are merged from the workers
+    assert code_array.dependents((0, 0, 0)) == set([(1, 0, 0), (3, 0, 0)])
+    assert code_array.precedents((3, 0, 0)) == set([(0, 0, 0), (1, 0, 0)])
+
+    # Serial fallback
+    recalculate(code_array, processes=1)
+    assert code_array.result_cache[2, 0, 0] == 42
+
+
+def test_recalculate_macros():
+    """Cells are evaluated serially if there are macros"""
+
+    code_array = CodeArray((100, 10, 3))
+    code_array.macros = "calls = []\ndef f(x):\n    calls.append(x)\n" + \
+        "    return x * 2"
+    code_array.execute_macros()
+
+    code_array[0, 0, 0] = "f(21)"
+    code_array[1, 0, 0] = "f(1)"
+
+    recalculate(code_array, processes=2)
+    recalculate(code_array, processes=2)
+
+    assert code_array.result_cache[0, 0, 0] == 42
+
+    # Each cell has called f once per recalculation in this process
+    code_array[2, 0, 0] = "len(calls)"
+    assert code_array[2, 0, 0] == 4